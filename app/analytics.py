@@ -0,0 +1,264 @@
+import argparse
+import json
+import multiprocessing
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from itertools import repeat
+from pathlib import Path
+
+import numpy as np
+from sqlalchemy import text
+
+from app.auth import now_utc
+from app.db import DB_PATH, SessionLocal, engine
+from app.fx import load_rates
+from app.portfolio_utils import SUPPORTED_CURRENCIES
+
+ANALYTICS_CHUNK_SIZE = int(os.environ.get("PORTFOLIO_ANALYTICS_CHUNK_SIZE", "50000"))
+ANALYTICS_WORKERS = int(os.environ.get("PORTFOLIO_ANALYTICS_WORKERS", str(min(4, os.cpu_count() or 1))))
+# More ranges than workers, so one heavy range does not leave the others idle.
+RANGES_PER_WORKER = 4
+HHI_BINS = 20
+DIMENSIONS = ("ticker", "category", "currency", "risk_level", "sentiment", "strategy")
+HOLDINGS_SCAN = (
+    "SELECT user_id, name_key, category, currency, risk_level, sentiment, strategy, "
+    "quantity, total_cost, current_price FROM holdings WHERE user_id BETWEEN :first AND :last"
+)
+
+
+class KeyTotals:
+    """Holding count, value and cost per distinct value of one column, summed chunk by chunk.
+
+    Grows with the number of distinct keys, not with the holdings seen.
+    """
+
+    def __init__(self):
+        self.index: dict[str, int] = {}
+        self.holdings = np.zeros(0, dtype=np.int64)
+        self.value = np.zeros(0, dtype=np.float64)
+        self.cost = np.zeros(0, dtype=np.float64)
+
+    def encode(self, keys) -> np.ndarray:
+        index = self.index
+        return np.fromiter((index.setdefault(key or "", len(index)) for key in keys), dtype=np.intp, count=len(keys))
+
+    def _grow(self, size: int) -> None:
+        if size > len(self.holdings):
+            capacity = max(size, 2 * len(self.holdings))
+            self.holdings = np.pad(self.holdings, (0, capacity - len(self.holdings)))
+            self.value = np.pad(self.value, (0, capacity - len(self.value)))
+            self.cost = np.pad(self.cost, (0, capacity - len(self.cost)))
+
+    def add(self, codes: np.ndarray, value: np.ndarray, cost: np.ndarray, priced: np.ndarray) -> None:
+        size = len(self.index)
+        self._grow(size)
+        self.holdings[:size] += np.bincount(codes, minlength=size)
+        self.value[:size] += np.bincount(codes[priced], weights=value[priced], minlength=size)
+        self.cost[:size] += np.bincount(codes[priced], weights=cost[priced], minlength=size)
+
+    def merge(self, other: "KeyTotals") -> None:
+        size = len(other.index)
+        codes = self.encode(list(other.index))
+        self._grow(len(self.index))
+        # Each key appears once in ``codes``, so fancy-index addition is exact.
+        self.holdings[codes] += other.holdings[:size]
+        self.value[codes] += other.value[:size]
+        self.cost[codes] += other.cost[:size]
+
+    def columns(self, prefix: str) -> dict[str, np.ndarray]:
+        """Largest exposure first."""
+        size = len(self.index)
+        order = np.argsort(-self.value[:size], kind="stable")
+        return {
+            f"{prefix}.key": np.array(list(self.index), dtype=np.str_)[order] if size else np.array([], dtype=np.str_),
+            f"{prefix}.holdings": self.holdings[:size][order],
+            f"{prefix}.value": self.value[:size][order],
+            f"{prefix}.cost": self.cost[:size][order],
+        }
+
+
+class UserTotals:
+    """Per-user sums over ``first..last`` for concentration: HHI = sum(v^2) / sum(v)^2."""
+
+    def __init__(self, first: int, last: int):
+        self.first = first
+        span = last - first + 1
+        self.holdings = np.zeros(span, dtype=np.int64)
+        self.value = np.zeros(span, dtype=np.float64)
+        self.value_squared = np.zeros(span, dtype=np.float64)
+
+    def add(self, user_ids: np.ndarray, value: np.ndarray, priced: np.ndarray) -> None:
+        offsets = user_ids - self.first
+        low, high = int(offsets.min()), int(offsets.max())
+        window = slice(low, high + 1)
+        local = offsets - low
+        self.holdings[window] += np.bincount(local, minlength=high - low + 1)
+        self.value[window] += np.bincount(local[priced], weights=value[priced], minlength=high - low + 1)
+        self.value_squared[window] += np.bincount(
+            local[priced], weights=value[priced] ** 2, minlength=high - low + 1
+        )
+
+    def columns(self) -> dict[str, np.ndarray]:
+        present = np.flatnonzero(self.holdings)
+        value = self.value[present]
+        with np.errstate(divide="ignore", invalid="ignore"):
+            hhi = np.where(value > 0, self.value_squared[present] / value**2, np.nan)
+        return {
+            "users.id": present + self.first,
+            "users.holdings": self.holdings[present],
+            "users.value": value,
+            "users.hhi": hhi,
+        }
+
+
+class RangeReport:
+    def __init__(self, first: int, last: int):
+        self.first, self.last = first, last
+        self.totals = {dimension: KeyTotals() for dimension in DIMENSIONS}
+        self.users = UserTotals(first, last)
+        self.holdings = 0
+        self.unpriced = 0
+
+
+def aggregate_range(first: int, last: int, to_base: dict[str, float], chunk_size: int) -> RangeReport:
+    """Stream the holdings of users ``first..last`` in chunks and fold them into totals.
+
+    Holdings without a current price count at cost; holdings in a currency without an FX
+    rate are counted but left out of every value.
+    """
+    report = RangeReport(first, last)
+    currency_totals = report.totals["currency"]
+    rates = np.zeros(0, dtype=np.float64)
+    with engine.connect() as conn:
+        result = conn.execute(text(HOLDINGS_SCAN), {"first": first, "last": last})
+        # sqlite3 cursors fetch lazily, so only one chunk of rows is held at a time.
+        for rows in result.partitions(chunk_size):
+            (
+                user_id, name_key, category, currency, risk_level, sentiment, strategy,
+                quantity, total_cost, current_price,
+            ) = zip(*rows)
+            count = len(rows)
+            currency_codes = currency_totals.encode(currency)
+            if len(currency_totals.index) > len(rates):
+                rates = np.array([to_base.get(code, np.nan) for code in currency_totals.index])
+            quantity = np.fromiter(quantity, dtype=np.float64, count=count)
+            cost_local = np.fromiter(total_cost, dtype=np.float64, count=count)
+            # None becomes NaN.
+            price = np.array(current_price, dtype=np.float64)
+            rate = rates[currency_codes]
+            value = np.where(np.isnan(price), cost_local, quantity * price) * rate
+            cost = cost_local * rate
+            priced = ~np.isnan(rate)
+
+            for dimension, keys in (
+                ("ticker", name_key),
+                ("category", category),
+                ("risk_level", risk_level),
+                ("sentiment", sentiment),
+                ("strategy", strategy),
+            ):
+                totals = report.totals[dimension]
+                totals.add(totals.encode(keys), value, cost, priced)
+            currency_totals.add(currency_codes, value, cost, priced)
+            report.users.add(np.fromiter(user_id, dtype=np.int64, count=count), value, priced)
+            report.holdings += count
+            report.unpriced += count - int(priced.sum())
+    return report
+
+
+def user_ranges(parts: int) -> list[tuple[int, int]]:
+    """Split user ids into up to ``parts`` contiguous ranges with similar holding counts."""
+    with engine.connect() as conn:
+        rows = conn.execute(text("SELECT user_id, count(*) FROM holdings GROUP BY user_id ORDER BY user_id")).all()
+    if not rows:
+        return []
+    user_ids = np.array([user_id for user_id, _ in rows], dtype=np.int64)
+    cumulative = np.cumsum([count for _, count in rows])
+    cuts = np.searchsorted(cumulative, cumulative[-1] * np.arange(1, parts) / parts, side="left")
+    starts = np.unique(np.concatenate(([0], cuts + 1)))
+    starts = starts[starts < len(user_ids)]
+    ends = np.append(starts[1:] - 1, len(user_ids) - 1)
+    return [(int(user_ids[start]), int(user_ids[end])) for start, end in zip(starts, ends)]
+
+
+def fold(report: RangeReport, totals: dict[str, KeyTotals], user_columns: list, holdings: int, unpriced: int):
+    for dimension, dimension_totals in report.totals.items():
+        totals[dimension].merge(dimension_totals)
+    user_columns.append(report.users.columns())
+    return holdings + report.holdings, unpriced + report.unpriced
+
+
+def build_report(base_currency: str, workers: int, chunk_size: int) -> tuple[dict[str, np.ndarray], dict]:
+    with SessionLocal() as db:
+        rates = load_rates(db)
+    base_rate = rates.get(base_currency)
+    if base_rate is None:
+        raise SystemExit(f"No FX rate for {base_currency}; import one with python -m app.fx.")
+    to_base = {currency: rate / base_rate for currency, rate in rates.items()}
+    ranges = user_ranges(max(1, workers) * RANGES_PER_WORKER)
+
+    totals = {dimension: KeyTotals() for dimension in DIMENSIONS}
+    user_columns: list[dict[str, np.ndarray]] = []
+    holdings = unpriced = 0
+    if workers > 1 and len(ranges) > 1:
+        # Spawned, so no worker inherits the parent's pooled SQLite connections.
+        context = multiprocessing.get_context("spawn")
+        with ProcessPoolExecutor(max_workers=workers, mp_context=context) as pool:
+            firsts, lasts = zip(*ranges)
+            for report in pool.map(aggregate_range, firsts, lasts, repeat(to_base), repeat(chunk_size)):
+                holdings, unpriced = fold(report, totals, user_columns, holdings, unpriced)
+    else:
+        for first, last in ranges:
+            report = aggregate_range(first, last, to_base, chunk_size)
+            holdings, unpriced = fold(report, totals, user_columns, holdings, unpriced)
+
+    columns: dict[str, np.ndarray] = {}
+    for dimension, dimension_totals in totals.items():
+        columns.update(dimension_totals.columns(dimension))
+    for name in ("users.id", "users.holdings", "users.value", "users.hhi"):
+        parts = [part[name] for part in user_columns]
+        columns[name] = np.concatenate(parts) if parts else np.array([])
+    hhi = columns["users.hhi"]
+    columns["hhi.histogram"] = np.histogram(hhi[~np.isnan(hhi)], bins=HHI_BINS, range=(0.0, 1.0))[0]
+    columns["hhi.edges"] = np.linspace(0.0, 1.0, HHI_BINS + 1)
+    meta = {
+        "generatedAt": now_utc().isoformat(),
+        "database": str(DB_PATH),
+        "baseCurrency": base_currency,
+        "holdings": holdings,
+        "users": int(len(columns["users.id"])),
+        "unpricedHoldings": unpriced,
+        "missingRates": sorted(set(totals["currency"].index) - set(rates)),
+        "totalValue": float(columns["users.value"].sum()) if holdings else 0.0,
+    }
+    columns["meta"] = np.array(json.dumps(meta))
+    return columns, meta
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Firm-wide exposure and concentration report across all users.")
+    parser.add_argument("command", choices=["report"])
+    parser.add_argument("--output", type=Path, help="report file (default: analytics-<date>.npz next to the database)")
+    parser.add_argument("--base", default="USD", choices=sorted(SUPPORTED_CURRENCIES), help="currency for values")
+    parser.add_argument("--workers", type=int, default=ANALYTICS_WORKERS, help="processes, each taking user id ranges")
+    parser.add_argument("--chunk-size", type=int, default=ANALYTICS_CHUNK_SIZE, help="rows fetched per chunk")
+    args = parser.parse_args()
+
+    from app.main import startup
+
+    startup()
+    started = time.perf_counter()
+    columns, meta = build_report(args.base, args.workers, args.chunk_size)
+    output = args.output or DB_PATH.with_name(f"analytics-{now_utc():%Y%m%d}.npz")
+    np.savez_compressed(output, **columns)
+    print(
+        f"{meta['holdings']} holdings of {meta['users']} users, {meta['totalValue']:,.2f} {args.base} "
+        f"({meta['unpricedHoldings']} without an FX rate) in {time.perf_counter() - started:.1f}s -> {output}"
+    )
+    for name, value in zip(columns["ticker.key"][:5], columns["ticker.value"][:5]):
+        print(f"  {name:<24} {value:,.2f} {args.base}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,201 @@
+import argparse
+import gzip
+import hashlib
+import json
+import mimetypes
+import os
+import re
+import shutil
+import threading
+from pathlib import Path
+
+from fastapi import Request, Response
+from fastapi.responses import FileResponse
+from starlette.datastructures import Headers
+from starlette.staticfiles import NotModifiedResponse, StaticFiles
+
+try:
+    import brotli
+except ImportError:  # Optional: without it only gzip variants are written and served.
+    brotli = None
+
+BASE_DIR = Path(__file__).resolve().parent.parent
+STATIC_DIR = BASE_DIR / "static"
+DIST_DIR = STATIC_DIR / "dist"
+SOURCE_INDEX = BASE_DIR / "index.html"
+MANIFEST_NAME = "manifest.json"
+IMMUTABLE_CACHE_CONTROL = "public, max-age=31536000, immutable"
+INDEX_CACHE_CONTROL = "no-cache"
+# In order of preference.
+ENCODINGS = (("br", ".br"), ("gzip", ".gz"))
+# Smaller files are not worth compressing.
+MIN_COMPRESS_BYTES = 256
+FINGERPRINT_LENGTH = 12
+
+
+def accepted_encodings(header: str) -> set[str]:
+    accepted = set()
+    for part in header.split(","):
+        coding, _, params = part.strip().partition(";")
+        if params.strip().replace(" ", "") in ("q=0", "q=0.0", "q=0.00", "q=0.000"):
+            continue
+        accepted.add(coding.strip().lower())
+    return accepted
+
+
+def compressed_variants(data: bytes) -> dict[str, bytes]:
+    if len(data) < MIN_COMPRESS_BYTES:
+        return {}
+    variants = {"gzip": gzip.compress(data, compresslevel=9, mtime=0)}
+    if brotli is not None:
+        variants["br"] = brotli.compress(data, quality=11)
+    return variants
+
+
+def build(static_dir: Path = STATIC_DIR, dist_dir: Path = DIST_DIR, index_path: Path = SOURCE_INDEX) -> dict[str, str]:
+    """Write fingerprinted copies of the static files, their compressed variants and a
+    rewritten ``index.html`` to ``dist_dir``; return the name -> fingerprinted name map.
+    """
+    staging = dist_dir.with_name(f"{dist_dir.name}.tmp")
+    shutil.rmtree(staging, ignore_errors=True)
+    staging.mkdir(parents=True)
+    manifest = {}
+    for source in sorted(static_dir.rglob("*")):
+        if not source.is_file() or dist_dir in source.parents or staging in source.parents:
+            continue
+        relative = source.relative_to(static_dir)
+        data = source.read_bytes()
+        digest = hashlib.sha256(data).hexdigest()[:FINGERPRINT_LENGTH]
+        fingerprinted = relative.with_name(f"{relative.stem}.{digest}{relative.suffix}")
+        write_with_variants(staging / fingerprinted, data)
+        manifest[relative.as_posix()] = fingerprinted.as_posix()
+
+    index = index_path.read_text(encoding="utf-8")
+    for name, fingerprinted in manifest.items():
+        index = re.sub(rf'(["\'])/static/{re.escape(name)}\1', rf"\1/static/dist/{fingerprinted}\1", index)
+    write_with_variants(staging / "index.html", index.encode("utf-8"))
+    (staging / MANIFEST_NAME).write_text(json.dumps(manifest, indent=2) + "\n", encoding="utf-8")
+
+    previous = dist_dir.with_name(f"{dist_dir.name}.old")
+    shutil.rmtree(previous, ignore_errors=True)
+    if dist_dir.exists():
+        dist_dir.rename(previous)
+    staging.rename(dist_dir)
+    shutil.rmtree(previous, ignore_errors=True)
+    return manifest
+
+
+def write_with_variants(path: Path, data: bytes) -> None:
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_bytes(data)
+    variants = compressed_variants(data)
+    for coding, suffix in ENCODINGS:
+        variant = variants.get(coding)
+        if variant is not None and len(variant) < len(data):
+            path.with_name(path.name + suffix).write_bytes(variant)
+
+
+class PrecompressedStaticFiles(StaticFiles):
+    """Serves the build, picking a ``.br``/``.gz`` sibling when the client accepts it.
+
+    Only the fingerprinted names listed in the manifest are cached as immutable; anything
+    else in the directory, such as ``index.html`` and the manifest, is revalidated.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._manifest_key: tuple | None = None
+        self._fingerprinted: frozenset[str] = frozenset()
+        self._lock = threading.Lock()
+
+    def fingerprinted(self) -> frozenset[str]:
+        """Fingerprinted names of the current build, re-read when a rebuild replaces the manifest."""
+        path = Path(self.directory) / MANIFEST_NAME
+        try:
+            stat_result = path.stat()
+        except FileNotFoundError:
+            return frozenset()
+        key = (stat_result.st_ino, stat_result.st_mtime_ns, stat_result.st_size)
+        with self._lock:
+            if key != self._manifest_key:
+                manifest = json.loads(path.read_text(encoding="utf-8"))
+                self._manifest_key, self._fingerprinted = key, frozenset(manifest.values())
+            return self._fingerprinted
+
+    def file_response(self, full_path, stat_result, scope, status_code: int = 200) -> Response:
+        request_headers = Headers(scope=scope)
+        accepted = accepted_encodings(request_headers.get("accept-encoding", ""))
+        media_type = mimetypes.guess_type(str(full_path))[0] or "text/plain"
+        name = Path(os.path.relpath(full_path, self.directory)).as_posix()
+        cache_control = IMMUTABLE_CACHE_CONTROL if name in self.fingerprinted() else INDEX_CACHE_CONTROL
+        headers = {"Cache-Control": cache_control, "Vary": "Accept-Encoding"}
+        for coding, suffix in ENCODINGS:
+            variant = f"{full_path}{suffix}"
+            if coding in accepted and os.path.isfile(variant):
+                full_path, stat_result = variant, os.stat(variant)
+                headers["Content-Encoding"] = coding
+                break
+        response = FileResponse(
+            full_path, status_code=status_code, stat_result=stat_result, media_type=media_type, headers=headers
+        )
+        if self.is_not_modified(response.headers, request_headers):
+            return NotModifiedResponse(response.headers)
+        return response
+
+
+class IndexDocument:
+    """``index.html`` held in memory with a content ETag and compressed variants.
+
+    The built copy in ``static/dist`` is preferred; it is re-read whenever its mtime
+    changes, so a rebuild takes effect without a restart.
+    """
+
+    def __init__(self, built: Path, source: Path):
+        self.built = built
+        self.source = source
+        self._key: tuple | None = None
+        self._variants: dict[str, tuple[bytes, str]] = {}
+        self._lock = threading.Lock()
+
+    def _load(self) -> dict[str, tuple[bytes, str]]:
+        path = self.built if self.built.is_file() else self.source
+        stat_result = path.stat()
+        key = (path, stat_result.st_mtime_ns, stat_result.st_size)
+        with self._lock:
+            if key != self._key:
+                data = path.read_bytes()
+                digest = hashlib.sha256(data).hexdigest()[:16]
+                variants = {"identity": (data, f'"{digest}"')}
+                for coding, body in compressed_variants(data).items():
+                    variants[coding] = (body, f'"{digest}-{coding}"')
+                self._key, self._variants = key, variants
+            return self._variants
+
+    def response(self, request: Request) -> Response:
+        variants = self._load()
+        accepted = accepted_encodings(request.headers.get("accept-encoding", ""))
+        coding = next((coding for coding, _ in ENCODINGS if coding in accepted and coding in variants), "identity")
+        body, etag = variants[coding]
+        headers = {"ETag": etag, "Cache-Control": INDEX_CACHE_CONTROL, "Vary": "Accept-Encoding"}
+        if coding != "identity":
+            headers["Content-Encoding"] = coding
+        if_none_match = request.headers.get("if-none-match", "")
+        if etag in (tag.strip().removeprefix("W/") for tag in if_none_match.split(",")) or if_none_match.strip() == "*":
+            return Response(status_code=304, headers=headers)
+        return Response(body, media_type="text/html", headers=headers)
+
+
+index_document = IndexDocument(DIST_DIR / "index.html", SOURCE_INDEX)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Fingerprint and precompress static assets.")
+    parser.add_argument("command", choices=["build"])
+    parser.parse_args()
+    manifest = build()
+    variants = "gzip and brotli" if brotli is not None else "gzip (install brotli for .br files)"
+    print(f"Built {len(manifest)} assets with {variants} variants into {DIST_DIR}.")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,36 +1,28 @@
-import hashlib
+import os
 import secrets
 from datetime import datetime, timedelta, timezone
 from typing import Optional
 
 from fastapi import APIRouter, Depends, HTTPException, Request, status
-from sqlalchemy import select
+from sqlalchemy import delete, select
 
-from app.db import get_db
-from app.models import Session, User
+from app.db import SessionLocal, get_async_db
+from app.models import Session, StreamTicket, User
+from app.passwords import hash_password, hashing_pool, needs_rehash, verify_password
 from app.schemas import AuthPayload
+from app.session_cache import session_cache
+from app.tasks import periodic
 
 SESSION_TTL_DAYS = 7
+SESSION_SWEEP_INTERVAL_SECONDS = float(os.environ.get("PORTFOLIO_SESSION_SWEEP_INTERVAL", "300"))
+# Admin endpoints are disabled unless a token is configured.
+ADMIN_TOKEN = os.environ.get("PORTFOLIO_ADMIN_TOKEN", "")
+ADMIN_TOKEN_HEADER = "X-Admin-Token"
 MIN_PASSWORD_LENGTH = 6
 
 router = APIRouter()
 
 
-def hash_password(password: str) -> str:
-    salt = secrets.token_hex(16)
-    hashed = hashlib.pbkdf2_hmac("sha256", password.encode(), salt.encode(), 100_000)
-    return f"{salt}${hashed.hex()}"
-
-
-def verify_password(password: str, stored: str) -> bool:
-    try:
-        salt, hashed = stored.split("$", 1)
-    except ValueError:
-        return False
-    new_hash = hashlib.pbkdf2_hmac("sha256", password.encode(), salt.encode(), 100_000)
-    return secrets.compare_digest(new_hash.hex(), hashed)
-
-
 def now_utc() -> datetime:
     return datetime.now(timezone.utc)
 
@@ -51,85 +43,105 @@ def extract_token(request: Request) -> str:
     return auth_header.replace("Bearer ", "").strip()
 
 
-def cleanup_expired_sessions(db) -> None:
-    now = now_utc()
-    all_sessions = db.execute(select(Session)).scalars().all()
-    expired_sessions = [s for s in all_sessions if as_utc(s.expires_at) < now]
-    for session_row in expired_sessions:
-        db.delete(session_row)
-    if expired_sessions:
-        db.commit()
+def require_admin(request: Request) -> None:
+    token = request.headers.get(ADMIN_TOKEN_HEADER, "")
+    if not ADMIN_TOKEN or not secrets.compare_digest(token.encode(), ADMIN_TOKEN.encode()):
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Admin access required.")
+
+
+def cleanup_expired_sessions(db) -> int:
+    result = db.execute(delete(Session).where(Session.expires_at < now_utc()))
+    db.execute(delete(StreamTicket).where(StreamTicket.expires_at < now_utc()))
+    db.commit()
+    return result.rowcount
+
+
+@periodic(SESSION_SWEEP_INTERVAL_SECONDS)
+def sweep_expired_sessions() -> None:
+    with SessionLocal() as db:
+        cleanup_expired_sessions(db)
 
 
-def create_session(db, user: User) -> str:
-    cleanup_expired_sessions(db)
+async def create_session(db, user: User) -> str:
     token = secrets.token_urlsafe(32)
     expires_at = now_utc() + timedelta(days=SESSION_TTL_DAYS)
     session = Session(user_id=user.id, token=token, expires_at=expires_at, created_at=now_utc())
     db.add(session)
-    db.commit()
+    await db.commit()
     return token
 
 
-def get_user_by_session(db, token: str) -> Optional[User]:
-    session_row = db.execute(select(Session).where(Session.token == token)).scalar_one_or_none()
-    if not session_row:
+async def get_user_by_session(db, token: str) -> Optional[User]:
+    user = session_cache.get(token)
+    if user:
+        return user
+    row = (await db.execute(
+        select(User, Session.expires_at)
+        .join(Session, Session.user_id == User.id)
+        .where(Session.token == token)
+    )).one_or_none()
+    if not row:
         return None
-    if as_utc(session_row.expires_at) < now_utc():
-        db.delete(session_row)
-        db.commit()
+    user, expires_at = row
+    expires_at = as_utc(expires_at)
+    if expires_at < now_utc():
+        await db.execute(delete(Session).where(Session.token == token))
+        await db.commit()
         return None
-    return session_row.user
+    session_cache.put(token, user, expires_at)
+    return user
 
 
-def require_user(request: Request, db=Depends(get_db)) -> User:
+async def require_user(request: Request, db=Depends(get_async_db)) -> User:
     token = extract_token(request)
     if not token:
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Missing token")
-    user = get_user_by_session(db, token)
+    user = await get_user_by_session(db, token)
     if not user:
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid token")
     return user
 
 
 @router.post("/api/register")
-def register(payload: AuthPayload, db=Depends(get_db)):
+async def register(payload: AuthPayload, db=Depends(get_async_db)):
     if len(payload.password) < MIN_PASSWORD_LENGTH:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail=f"Password must be at least {MIN_PASSWORD_LENGTH} characters.",
         )
     email = normalize_email(payload.email)
-    existing = db.execute(select(User).where(User.email == email)).scalar_one_or_none()
+    existing = (await db.execute(select(User).where(User.email == email))).scalar_one_or_none()
     if existing:
         raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail="Email already registered.")
-    user = User(email=email, password_hash=hash_password(payload.password), created_at=now_utc())
+    password_hash = await hashing_pool.run(hash_password, payload.password)
+    user = User(email=email, password_hash=password_hash, created_at=now_utc())
     db.add(user)
-    db.commit()
+    await db.commit()
     return {"message": "registered"}
 
 
 @router.post("/api/login")
-def login(payload: AuthPayload, db=Depends(get_db)):
+async def login(payload: AuthPayload, db=Depends(get_async_db)):
     email = normalize_email(payload.email)
-    user = db.execute(select(User).where(User.email == email)).scalar_one_or_none()
-    if not user or not verify_password(payload.password, user.password_hash):
+    user = (await db.execute(select(User).where(User.email == email))).scalar_one_or_none()
+    if not user or not await hashing_pool.run(verify_password, payload.password, user.password_hash):
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid credentials.")
-    token = create_session(db, user)
+    if needs_rehash(user.password_hash):
+        user.password_hash = await hashing_pool.run(hash_password, payload.password)
+    token = await create_session(db, user)
     return {"token": token, "email": email}
 
 
 @router.get("/api/profile")
-def profile(user: User = Depends(require_user)):
+async def profile(user: User = Depends(require_user)):
     return {"email": user.email}
 
 
 @router.post("/api/logout")
-def logout(request: Request, user: User = Depends(require_user), db=Depends(get_db)):
+async def logout(request: Request, user: User = Depends(require_user), db=Depends(get_async_db)):
     token = extract_token(request)
     if token:
-        session_row = db.execute(select(Session).where(Session.token == token)).scalar_one_or_none()
-        if session_row:
-            db.delete(session_row)
-            db.commit()
+        await db.execute(delete(Session).where(Session.token == token))
+        await db.commit()
+        session_cache.invalidate(token)
     return {"message": "logged out"}
@@ -0,0 +1,233 @@
+import argparse
+import gzip
+import logging
+import os
+import shutil
+import sqlite3
+import threading
+import time
+from collections.abc import Callable
+from contextlib import closing
+from pathlib import Path
+
+from fastapi import APIRouter, Depends, HTTPException, Query, status
+from fastapi.responses import JSONResponse
+
+from app.auth import now_utc, require_admin
+from app.db import DB_PATH
+from app.schemas import BackupStatus
+from app.tasks import LeaderLock
+
+BACKUP_DIR = Path(os.environ.get("PORTFOLIO_BACKUP_DIR", DB_PATH.parent / "backups"))
+# Pages copied per step; SQLite holds a read lock on the source only while a step runs.
+BACKUP_PAGES_PER_STEP = int(os.environ.get("PORTFOLIO_BACKUP_PAGES_PER_STEP", "256"))
+BACKUP_STEP_PAUSE_SECONDS = float(os.environ.get("PORTFOLIO_BACKUP_STEP_PAUSE_MS", "10")) / 1000
+# A write through another connection makes the next step start over; after this many
+# restarts the rest is copied in one step instead of chasing the writers forever.
+BACKUP_MAX_RESTARTS = int(os.environ.get("PORTFOLIO_BACKUP_MAX_RESTARTS", "3"))
+BACKUP_BUSY_TIMEOUT_SECONDS = 30
+BACKUP_STATUS_PATH = DB_PATH.with_name(f"{DB_PATH.name}.backup.json")
+BACKUP_LOCK_PATH = DB_PATH.with_name(f"{DB_PATH.name}.backup.lock")
+# Progress is written to the status file at most this often.
+STATUS_WRITE_INTERVAL_SECONDS = 0.25
+COPY_CHUNK_BYTES = 1 << 20
+
+logger = logging.getLogger(__name__)
+
+router = APIRouter()
+
+
+class TooManyRestarts(Exception):
+    pass
+
+
+def write_status(backup_status: BackupStatus) -> None:
+    # Any worker may be asked for the status, so it lives next to the database.
+    staging = BACKUP_STATUS_PATH.with_name(f"{BACKUP_STATUS_PATH.name}.tmp")
+    staging.write_text(backup_status.model_dump_json(), encoding="utf-8")
+    os.replace(staging, BACKUP_STATUS_PATH)
+
+
+def read_status() -> BackupStatus:
+    try:
+        return BackupStatus.model_validate_json(BACKUP_STATUS_PATH.read_text(encoding="utf-8"))
+    except FileNotFoundError:
+        return BackupStatus(state="idle")
+
+
+def copy_pages(
+    target: Path, pages: int, pause: float, max_restarts: int, progress: Callable[[int, int, int], None]
+) -> int:
+    """Copy the live database into ``target`` with SQLite's online backup API.
+
+    Sleeps ``pause`` between steps so writers get the database to themselves, and
+    returns how many times concurrent writes made the copy start over.
+    """
+    restarts, last_remaining, chasing = 0, None, True
+
+    def on_step(_status: int, remaining: int, total: int) -> None:
+        nonlocal restarts, last_remaining
+        if last_remaining is not None and remaining >= last_remaining:
+            restarts += 1
+            if chasing and restarts > max_restarts:
+                raise TooManyRestarts
+        last_remaining = remaining
+        progress(remaining, total, restarts)
+        if remaining:
+            time.sleep(pause)
+
+    with closing(sqlite3.connect(DB_PATH, timeout=BACKUP_BUSY_TIMEOUT_SECONDS)) as source, closing(
+        sqlite3.connect(target)
+    ) as destination:
+        try:
+            source.backup(destination, pages=pages, progress=on_step)
+        except TooManyRestarts:
+            logger.warning("Backup restarted %d times under concurrent writes; copying the rest in one step.", restarts)
+            chasing, last_remaining = False, None
+            source.backup(destination, pages=-1, progress=on_step)
+        # The copy inherits the source's WAL mode; make it a self-contained file.
+        destination.execute("PRAGMA journal_mode = DELETE")
+    return restarts
+
+
+def check_integrity(path: Path) -> str:
+    with closing(sqlite3.connect(path)) as conn:
+        return "; ".join(row[0] for row in conn.execute("PRAGMA integrity_check"))
+
+
+def compress_file(path: Path) -> Path:
+    compressed = path.with_name(f"{path.name}.gz")
+    staging = compressed.with_name(f"{compressed.name}.tmp")
+    with path.open("rb") as source, gzip.open(staging, "wb", compresslevel=6) as target:
+        shutil.copyfileobj(source, target, COPY_CHUNK_BYTES)
+    os.replace(staging, compressed)
+    path.unlink()
+    return compressed
+
+
+def default_backup_path() -> Path:
+    return BACKUP_DIR / f"{DB_PATH.stem}-{now_utc().strftime('%Y%m%d-%H%M%S')}.db"
+
+
+def run_backup(
+    path: Path,
+    compress: bool = False,
+    pages: int = BACKUP_PAGES_PER_STEP,
+    pause: float = BACKUP_STEP_PAUSE_SECONDS,
+    max_restarts: int = BACKUP_MAX_RESTARTS,
+    on_progress: Callable[[BackupStatus], None] | None = None,
+) -> BackupStatus:
+    """Back up the database to ``path`` (plus ``.gz`` when compressing), verify the
+    copy with ``PRAGMA integrity_check`` and record progress in the status file.
+
+    The caller holds the backup lock.
+    """
+    backup_status = BackupStatus(state="running", path=str(path), startedAt=now_utc())
+    write_status(backup_status)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    staging = path.with_name(f"{path.name}.tmp")
+    last_write = 0.0
+
+    def progress(remaining: int, total: int, restarts: int) -> None:
+        nonlocal last_write
+        backup_status.remainingPages, backup_status.totalPages, backup_status.restarts = remaining, total, restarts
+        if on_progress is not None:
+            on_progress(backup_status)
+        if time.monotonic() - last_write >= STATUS_WRITE_INTERVAL_SECONDS:
+            last_write = time.monotonic()
+            write_status(backup_status)
+
+    try:
+        staging.unlink(missing_ok=True)
+        copy_pages(staging, pages, pause, max_restarts, progress)
+        backup_status.integrity = check_integrity(staging)
+        if backup_status.integrity != "ok":
+            raise RuntimeError(f"Backup failed integrity check: {backup_status.integrity}")
+        os.replace(staging, path)
+        if compress:
+            path = compress_file(path)
+        backup_status.state, backup_status.path = "done", str(path)
+        backup_status.bytes = path.stat().st_size
+    except Exception as exc:
+        staging.unlink(missing_ok=True)
+        backup_status.state, backup_status.error = "failed", str(exc)
+        raise
+    finally:
+        backup_status.finishedAt = now_utc()
+        write_status(backup_status)
+    return backup_status
+
+
+def backup_in_background(lock: LeaderLock, path: Path, compress: bool) -> None:
+    try:
+        run_backup(path, compress)
+    except Exception:
+        logger.exception("Backup to %s failed", path)
+    finally:
+        lock.release()
+
+
+@router.post("/api/admin/backup", response_model=BackupStatus, dependencies=[Depends(require_admin)])
+async def start_backup(compress: bool = Query(default=False)):
+    """Start a backup in this worker's background; poll ``GET /api/admin/backup`` for progress."""
+    lock = LeaderLock(BACKUP_LOCK_PATH)
+    if not lock.try_acquire():
+        raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail="A backup is already running.")
+    path = default_backup_path()
+    # Written before responding, so a poll right after this request never sees the previous run.
+    backup_status = BackupStatus(state="running", path=str(path), startedAt=now_utc())
+    write_status(backup_status)
+    threading.Thread(target=backup_in_background, args=(lock, path, compress), daemon=True).start()
+    return JSONResponse(backup_status.model_dump(mode="json"), status_code=status.HTTP_202_ACCEPTED)
+
+
+@router.get("/api/admin/backup", response_model=BackupStatus, dependencies=[Depends(require_admin)])
+async def get_backup_status():
+    current = read_status()
+    if current.state == "running":
+        lock = LeaderLock(BACKUP_LOCK_PATH)
+        if lock.try_acquire():
+            # Nobody holds the lock, so the worker running it exited mid-copy.
+            lock.release()
+            current.state, current.error = "failed", "Interrupted before completion."
+    return current
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Back up the database without blocking writers.")
+    parser.add_argument("command", choices=["backup"])
+    parser.add_argument("--output", type=Path, help=f"backup file (default: a timestamped file in {BACKUP_DIR})")
+    parser.add_argument("--compress", action="store_true", help="gzip the verified copy")
+    parser.add_argument("--pages", type=int, default=BACKUP_PAGES_PER_STEP, help="pages copied per step")
+    parser.add_argument(
+        "--pause-ms", type=float, default=BACKUP_STEP_PAUSE_SECONDS * 1000, help="pause between steps"
+    )
+    args = parser.parse_args()
+
+    lock = LeaderLock(BACKUP_LOCK_PATH)
+    if not lock.try_acquire():
+        raise SystemExit("A backup is already running.")
+
+    def report(current: BackupStatus) -> None:
+        if current.totalPages:
+            done = current.totalPages - current.remainingPages
+            print(f"\r{done}/{current.totalPages} pages ({done * 100 // current.totalPages}%)", end="", flush=True)
+
+    started = time.perf_counter()
+    try:
+        result = run_backup(
+            args.output or default_backup_path(), args.compress, args.pages, args.pause_ms / 1000, on_progress=report
+        )
+    except Exception as exc:
+        raise SystemExit(f"\nBackup failed: {exc}")
+    finally:
+        lock.release()
+    restarts = f", restarted {result.restarts} times" if result.restarts else ""
+    print(
+        f"\nBacked up {result.totalPages} pages to {result.path} ({result.bytes} bytes) in "
+        f"{time.perf_counter() - started:.1f}s{restarts}; integrity {result.integrity}."
+    )
+
+
+if __name__ == "__main__":
+    main()
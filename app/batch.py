@@ -0,0 +1,116 @@
+import hashlib
+import os
+from datetime import timedelta
+
+from fastapi import APIRouter, Depends, Header, HTTPException, Response, status
+from fastapi.responses import JSONResponse
+from sqlalchemy import delete, select
+from sqlalchemy.exc import IntegrityError
+
+from app.auth import now_utc, require_user
+from app.db import SessionLocal, get_async_db
+from app.models import IdempotencyKey, User
+from app.portfolio import add_holding, delete_holding, holding_document, holding_row, update_holding
+from app.schemas import BatchOperation, BatchPayload, BatchResponse
+from app.tasks import periodic
+
+MAX_BATCH_OPERATIONS = 500
+MAX_IDEMPOTENCY_KEY_LENGTH = 255
+IDEMPOTENCY_TTL_SECONDS = float(os.environ.get("PORTFOLIO_IDEMPOTENCY_TTL", "86400"))
+IDEMPOTENCY_SWEEP_INTERVAL_SECONDS = 3600
+REPLAYED_HEADER = "Idempotent-Replayed"
+
+router = APIRouter()
+
+
+async def apply_operation(db, user_id: int, operation: BatchOperation) -> dict:
+    """Run one operation in its own savepoint; a failed operation writes nothing and reports its error."""
+    try:
+        async with db.begin_nested():
+            if operation.op != "add" and operation.id is None:
+                raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Missing holding id.")
+            if operation.op == "delete":
+                await delete_holding(db, user_id, operation.id)
+                return {"status": status.HTTP_200_OK, "holding": None, "detail": None}
+            if operation.payload is None:
+                raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Missing payload.")
+            if operation.op == "add":
+                holding = await add_holding(db, user_id, operation.payload)
+            else:
+                holding = await update_holding(db, user_id, operation.id, operation.payload)
+    except HTTPException as exc:
+        return {"status": exc.status_code, "holding": None, "detail": exc.detail}
+    except IntegrityError:
+        return {"status": status.HTTP_409_CONFLICT, "holding": None, "detail": "Holding name already exists."}
+    return {"status": status.HTTP_200_OK, "holding": holding_document(holding_row(holding)), "detail": None}
+
+
+async def stored_response(db, user_id: int, key: str, request_hash: str) -> Response | None:
+    stored = (await db.execute(
+        select(IdempotencyKey.request_hash, IdempotencyKey.response_body).where(
+            IdempotencyKey.user_id == user_id, IdempotencyKey.key == key
+        )
+    )).one_or_none()
+    if stored is None:
+        return None
+    if stored.request_hash != request_hash:
+        raise HTTPException(
+            status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+            detail="Idempotency key was already used for a different request.",
+        )
+    return Response(stored.response_body, media_type="application/json", headers={REPLAYED_HEADER: "true"})
+
+
+@router.post("/api/portfolio/batch", response_model=BatchResponse)
+async def portfolio_batch(
+    payload: BatchPayload,
+    idempotency_key: str | None = Header(default=None, alias="Idempotency-Key"),
+    user: User = Depends(require_user),
+    db=Depends(get_async_db),
+):
+    """Apply the operations in order and commit them together with one fsync.
+
+    Each result carries its own status; operations that fail are skipped without
+    affecting the others. With an ``Idempotency-Key`` the response is stored in the
+    same transaction and replayed verbatim for retries.
+    """
+    if len(payload.operations) > MAX_BATCH_OPERATIONS:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Too many operations.")
+    if idempotency_key is not None and not 0 < len(idempotency_key) <= MAX_IDEMPOTENCY_KEY_LENGTH:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid idempotency key.")
+    request_hash = hashlib.sha256(payload.model_dump_json().encode()).hexdigest()
+    if idempotency_key and (replay := await stored_response(db, user.id, idempotency_key, request_hash)):
+        return replay
+
+    # pysqlite only opens a transaction at the first write, so the first savepoint would
+    # otherwise be the outermost transaction and its release would commit on its own.
+    await (await db.connection()).exec_driver_sql("BEGIN IMMEDIATE")
+    results = [await apply_operation(db, user.id, operation) for operation in payload.operations]
+    response = JSONResponse({"results": results})
+    if idempotency_key:
+        db.add(
+            IdempotencyKey(
+                user_id=user.id,
+                key=idempotency_key,
+                request_hash=request_hash,
+                response_body=response.body.decode(),
+                created_at=now_utc(),
+            )
+        )
+    try:
+        await db.commit()
+    except IntegrityError:
+        await db.rollback()
+        # A concurrent retry with the same key committed first.
+        if idempotency_key and (replay := await stored_response(db, user.id, idempotency_key, request_hash)):
+            return replay
+        raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail="Holding name already exists.")
+    return response
+
+
+@periodic(IDEMPOTENCY_SWEEP_INTERVAL_SECONDS)
+def sweep_idempotency_keys() -> None:
+    cutoff = now_utc() - timedelta(seconds=IDEMPOTENCY_TTL_SECONDS)
+    with SessionLocal() as db:
+        db.execute(delete(IdempotencyKey).where(IdempotencyKey.created_at < cutoff))
+        db.commit()
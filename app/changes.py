@@ -0,0 +1,345 @@
+import asyncio
+import json
+import logging
+import os
+import secrets
+import signal
+import threading
+import time
+from datetime import timedelta
+
+from fastapi import APIRouter, Depends, Header, HTTPException, Query, Request, status
+from fastapi.responses import StreamingResponse
+from sqlalchemy import delete, func, select, text
+
+from app.auth import as_utc, extract_token, get_user_by_session, now_utc, require_user
+from app.db import AsyncSessionLocal, SessionLocal, get_async_db
+from app.models import Holding, HoldingChange, Session, StreamTicket
+from app.portfolio import HOLDING_COLUMNS, holding_document
+from app.schemas import StreamTicketResponse
+from app.session_cache import session_cache
+from app.tasks import periodic
+
+CHANGE_POLL_INTERVAL_SECONDS = float(os.environ.get("PORTFOLIO_CHANGE_POLL_INTERVAL", "0.5"))
+CHANGE_LOG_RETENTION_SECONDS = float(os.environ.get("PORTFOLIO_CHANGE_LOG_RETENTION", "3600"))
+CHANGE_BATCH_SIZE = 5000
+STREAM_KEEPALIVE_SECONDS = 15
+STREAM_RETRY_MS = 3000
+# Long enough to open the stream right after asking for the ticket, and no longer.
+STREAM_TICKET_TTL_SECONDS = 30
+# Open streams look at the shared logout generation this often and re-check their
+# session at least every keepalive, so a logout anywhere ends them promptly.
+STREAM_SESSION_POLL_SECONDS = 1.0
+# A subscriber this far behind is sent a reset instead of every queued delta.
+SUBSCRIBER_QUEUE_SIZE = 1000
+
+RESET_EVENT = "event: reset\ndata: {}\n\n"
+# Queued to every subscriber when the worker shuts down.
+CLOSE_STREAM = None
+
+logger = logging.getLogger(__name__)
+
+router = APIRouter()
+
+
+def render_event(change_id: int, data: dict, event: str = "holding") -> str:
+    body = json.dumps(data, ensure_ascii=False, allow_nan=False, separators=(",", ":"))
+    return f"event: {event}\nid: {change_id}\ndata: {body}\n\n"
+
+
+async def change_events(db, changes) -> list[tuple[int, str]]:
+    """Render ``(user_id, event)`` pairs for a run of changes, one per holding.
+
+    Several changes to the same holding collapse into one event carrying its current
+    row, keyed by the last change id so a resumed stream never skips it.
+    """
+    latest: dict[int, tuple[int, int, str]] = {}
+    created: set[int] = set()
+    for change in changes:
+        latest[change.holding_id] = (change.id, change.user_id, change.kind)
+        if change.kind == "created":
+            created.add(change.holding_id)
+        elif change.kind == "deleted":
+            created.discard(change.holding_id)
+    live_ids = [holding_id for holding_id, (_, _, kind) in latest.items() if kind != "deleted"]
+    rows = {}
+    if live_ids:
+        result = await db.execute(select(*HOLDING_COLUMNS).where(Holding.id.in_(live_ids)))
+        rows = {row.id: row for row in result}
+
+    events = []
+    for holding_id, (change_id, user_id, kind) in sorted(latest.items(), key=lambda item: item[1][0]):
+        if kind == "deleted":
+            data = {"type": "deleted", "id": holding_id}
+        elif holding_id in rows:
+            data = {
+                "type": "created" if holding_id in created else "updated",
+                "holding": holding_document(rows[holding_id]),
+            }
+        else:
+            # Deleted since; its own change follows.
+            continue
+        events.append((user_id, render_event(change_id, data)))
+    return events
+
+
+class ChangeFeed:
+    """Tails ``holding_changes`` once per worker and fans deltas out to local streams.
+
+    Every worker polls the shared log from its own cursor, so a mutation handled by one
+    worker reaches subscribers connected to any other.
+    """
+
+    def __init__(self):
+        self.cursor = 0
+        self._subscribers: dict[int, set[asyncio.Queue]] = {}
+        self._task: asyncio.Task | None = None
+        self.closing = False
+
+    def subscribe(self, user_id: int) -> asyncio.Queue:
+        queue: asyncio.Queue = asyncio.Queue(SUBSCRIBER_QUEUE_SIZE)
+        self._subscribers.setdefault(user_id, set()).add(queue)
+        return queue
+
+    def unsubscribe(self, user_id: int, queue: asyncio.Queue) -> None:
+        queues = self._subscribers.get(user_id)
+        if queues is not None:
+            queues.discard(queue)
+            if not queues:
+                del self._subscribers[user_id]
+
+    def publish(self, user_id: int, event: str | None) -> None:
+        for queue in self._subscribers.get(user_id, ()):
+            try:
+                queue.put_nowait(event)
+            except asyncio.QueueFull:
+                while not queue.empty():
+                    queue.get_nowait()
+                queue.put_nowait(RESET_EVENT if event is not CLOSE_STREAM else CLOSE_STREAM)
+
+    def close_streams(self) -> None:
+        self.closing = True
+        for user_id in list(self._subscribers):
+            self.publish(user_id, CLOSE_STREAM)
+
+    def close_streams_on_exit(self) -> None:
+        """End open streams as soon as the server is told to exit.
+
+        Uvicorn waits for in-flight responses before it runs shutdown handlers, so a
+        stream left open would hold the worker until it is killed. Its signal handler
+        stays in place and runs after ours.
+        """
+        if threading.current_thread() is not threading.main_thread():
+            return
+        loop = asyncio.get_running_loop()
+        for signum in (signal.SIGINT, signal.SIGTERM):
+            previous = signal.getsignal(signum)
+            if not callable(previous):
+                continue
+
+            def handle_exit(signum, frame, previous=previous):
+                loop.call_soon_threadsafe(self.close_streams)
+                previous(signum, frame)
+
+            signal.signal(signum, handle_exit)
+
+    async def poll(self) -> None:
+        async with AsyncSessionLocal() as db:
+            if not self._subscribers:
+                self.cursor = await db.scalar(select(func.max(HoldingChange.id))) or self.cursor
+                return
+            while True:
+                changes = (await db.execute(
+                    select(HoldingChange)
+                    .where(HoldingChange.id > self.cursor)
+                    .order_by(HoldingChange.id)
+                    .limit(CHANGE_BATCH_SIZE)
+                )).scalars().all()
+                if not changes:
+                    return
+                self.cursor = changes[-1].id
+                watched = [change for change in changes if change.user_id in self._subscribers]
+                for user_id, event in await change_events(db, watched):
+                    self.publish(user_id, event)
+                if len(changes) < CHANGE_BATCH_SIZE:
+                    return
+
+    async def _run(self) -> None:
+        while True:
+            try:
+                await self.poll()
+            except Exception:
+                logger.exception("Change feed poll failed")
+            await asyncio.sleep(CHANGE_POLL_INTERVAL_SECONDS)
+
+    async def start(self) -> None:
+        async with AsyncSessionLocal() as db:
+            self.cursor = await db.scalar(select(func.max(HoldingChange.id))) or 0
+        self._task = asyncio.create_task(self._run())
+        self.close_streams_on_exit()
+
+    async def stop(self) -> None:
+        self.close_streams()
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+
+change_feed = ChangeFeed()
+
+
+async def missed_events(user_id: int, after: int, up_to: int) -> list[str] | None:
+    """Events for changes in ``(after, up_to]``, or ``None`` if some were already pruned."""
+    async with AsyncSessionLocal() as db:
+        oldest = await db.scalar(select(func.min(HoldingChange.id)))
+        if oldest is None:
+            sequence = await db.scalar(
+                text("SELECT seq FROM sqlite_sequence WHERE name = 'holding_changes'")
+            )
+            oldest = (sequence or 0) + 1
+        if after + 1 < oldest:
+            return None
+        changes = (await db.execute(
+            select(HoldingChange)
+            .where(
+                HoldingChange.user_id == user_id,
+                HoldingChange.id > after,
+                HoldingChange.id <= up_to,
+            )
+            .order_by(HoldingChange.id)
+        )).scalars().all()
+        return [event for _, event in await change_events(db, changes)]
+
+
+async def session_is_valid(token: str) -> bool:
+    async with AsyncSessionLocal() as db:
+        return await get_user_by_session(db, token) is not None
+
+
+async def event_stream(
+    token: str, user_id: int, queue: asyncio.Queue, last_event_id: int | None, cursor: int, expires_in: float
+):
+    try:
+        yield f"retry: {STREAM_RETRY_MS}\n\n"
+        if last_event_id is not None and last_event_id < cursor:
+            missed = await missed_events(user_id, last_event_id, cursor)
+            if missed is None:
+                yield RESET_EVENT
+            else:
+                for event in missed:
+                    yield event
+        yield render_event(max(cursor, last_event_id or 0), {}, event="ready")
+        generation = session_cache.generation.read()
+        checked = sent = time.monotonic()
+        expires_at = checked + expires_in
+        while True:
+            try:
+                event = await asyncio.wait_for(queue.get(), STREAM_SESSION_POLL_SECONDS)
+            except asyncio.TimeoutError:
+                event = ""
+            if event is CLOSE_STREAM:
+                return
+            now = time.monotonic()
+            if now >= expires_at:
+                return
+            # A logout in any worker bumps the generation.
+            current = session_cache.generation.read()
+            if current != generation or now - checked >= STREAM_KEEPALIVE_SECONDS:
+                generation, checked = current, now
+                if not await session_is_valid(token):
+                    return
+            if event:
+                yield event
+                sent = now
+            elif now - sent >= STREAM_KEEPALIVE_SECONDS:
+                yield ": keepalive\n\n"
+                sent = now
+    finally:
+        change_feed.unsubscribe(user_id, queue)
+
+
+@router.post("/api/portfolio/stream/ticket", response_model=StreamTicketResponse)
+async def create_stream_ticket(request: Request, user=Depends(require_user), db=Depends(get_async_db)):
+    ticket = secrets.token_urlsafe(32)
+    expires_at = now_utc() + timedelta(seconds=STREAM_TICKET_TTL_SECONDS)
+    db.add(StreamTicket(ticket=ticket, session_token=extract_token(request), expires_at=expires_at))
+    await db.commit()
+    return {"ticket": ticket, "expiresAt": expires_at}
+
+
+async def redeem_stream_ticket(ticket: str) -> str | None:
+    """The session token behind ``ticket``, which is deleted so it cannot be used again."""
+    async with AsyncSessionLocal() as db:
+        row = (await db.execute(
+            delete(StreamTicket)
+            .where(StreamTicket.ticket == ticket)
+            .returning(StreamTicket.session_token, StreamTicket.expires_at)
+        )).one_or_none()
+        await db.commit()
+    if row is None or as_utc(row.expires_at) < now_utc():
+        return None
+    return row.session_token
+
+
+@router.get("/api/portfolio/stream")
+async def portfolio_stream(
+    request: Request,
+    ticket: str | None = Query(default=None),
+    resume_from: str | None = Query(default=None, alias="lastEventId"),
+    last_event_id: str | None = Header(default=None, alias="Last-Event-ID"),
+):
+    """Server-sent holding deltas for the current user.
+
+    ``EventSource`` cannot set headers, so browsers authenticate with a ``?ticket=``
+    from ``POST /api/portfolio/stream/ticket``; it works once, so they reconnect with a
+    new ticket and pass the last id seen as ``?lastEventId=``. Other clients may send
+    the ``Authorization`` header and rely on ``Last-Event-ID``. A ``reset`` event means
+    changes were missed and the client should reload the full list. The stream ends
+    when its session is logged out or expires, and when the worker shuts down.
+    """
+    if ticket:
+        token = await redeem_stream_ticket(ticket)
+        if not token:
+            raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid or expired ticket")
+    else:
+        token = extract_token(request)
+    if not token:
+        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Missing token")
+    async with AsyncSessionLocal() as db:
+        user = await get_user_by_session(db, token)
+        expires_at = await db.scalar(select(Session.expires_at).where(Session.token == token))
+    if not user or expires_at is None:
+        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid token")
+    if change_feed.closing:
+        raise HTTPException(status_code=status.HTTP_503_SERVICE_UNAVAILABLE, detail="Shutting down.")
+    last_event_id = last_event_id or resume_from
+    resume_after = int(last_event_id) if last_event_id and last_event_id.isdigit() else None
+    # Subscribing and reading the cursor without awaiting in between means the queue
+    # receives exactly the changes after ``cursor``; earlier ones are replayed above.
+    queue = change_feed.subscribe(user.id)
+    return StreamingResponse(
+        event_stream(
+            token, user.id, queue, resume_after, change_feed.cursor,
+            (as_utc(expires_at) - now_utc()).total_seconds(),
+        ),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+_prune_watermark: list[int] = []
+
+
+@periodic(CHANGE_LOG_RETENTION_SECONDS)
+def prune_change_log() -> None:
+    """Drop changes older than one retention interval.
+
+    Each run deletes up to the newest id seen by the previous run, so every change is
+    kept for at least one full interval without storing a timestamp per row.
+    """
+    with SessionLocal() as db:
+        if _prune_watermark:
+            db.execute(delete(HoldingChange).where(HoldingChange.id <= _prune_watermark[0]))
+            db.commit()
+        _prune_watermark[:] = [db.scalar(select(func.max(HoldingChange.id))) or 0]
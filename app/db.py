@@ -1,18 +1,82 @@
+import os
 from pathlib import Path
 
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, event
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
 from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import AsyncAdaptedQueuePool, QueuePool
+
+from app.portfolio_utils import merge_tags, tag_key
 
 BASE_DIR = Path(__file__).resolve().parent.parent
-DB_PATH = BASE_DIR / "portfolio.db"
+DB_PATH = Path(os.environ.get("PORTFOLIO_DB_PATH", BASE_DIR / "portfolio.db"))
+
+# PRAGMAs applied to every new connection. "legacy" keeps SQLite's defaults
+# (rollback journal, no busy timeout), which is what the app ran with originally.
+STORAGE_PROFILES: dict[str, dict[str, str | int]] = {
+    "legacy": {},
+    "wal": {
+        "journal_mode": "WAL",
+        "synchronous": "NORMAL",
+        "busy_timeout": 5000,
+        "cache_size": -16384,
+        "mmap_size": 134217728,
+        "temp_store": "MEMORY",
+    },
+    "durable": {
+        "journal_mode": "WAL",
+        "synchronous": "FULL",
+        "busy_timeout": 10000,
+        "cache_size": -16384,
+        "mmap_size": 0,
+    },
+}
+STORAGE_PROFILE = os.environ.get("PORTFOLIO_STORAGE_PROFILE", "wal")
+if STORAGE_PROFILE not in STORAGE_PROFILES:
+    raise RuntimeError(
+        f"Unknown PORTFOLIO_STORAGE_PROFILE {STORAGE_PROFILE!r}; "
+        f"expected one of {', '.join(STORAGE_PROFILES)}."
+    )
+POOL_SIZE = int(os.environ.get("PORTFOLIO_DB_POOL_SIZE", "5"))
+POOL_MAX_OVERFLOW = int(os.environ.get("PORTFOLIO_DB_POOL_MAX_OVERFLOW", "10"))
+POOL_TIMEOUT_SECONDS = float(os.environ.get("PORTFOLIO_DB_POOL_TIMEOUT", "30"))
 
-engine = create_engine(f"sqlite:///{DB_PATH}", echo=False, future=True)
+engine = create_engine(
+    f"sqlite:///{DB_PATH}",
+    echo=False,
+    future=True,
+    poolclass=QueuePool,
+    pool_size=POOL_SIZE,
+    max_overflow=POOL_MAX_OVERFLOW,
+    pool_timeout=POOL_TIMEOUT_SECONDS,
+)
 SessionLocal = sessionmaker(bind=engine, expire_on_commit=False)
 
+# Request handlers use the async engine so a request waiting on SQLite does not hold
+# one of Starlette's threadpool slots. CLIs, migrations and background jobs stay sync.
+async_engine = create_async_engine(
+    f"sqlite+aiosqlite:///{DB_PATH}",
+    echo=False,
+    poolclass=AsyncAdaptedQueuePool,
+    pool_size=POOL_SIZE,
+    max_overflow=POOL_MAX_OVERFLOW,
+    pool_timeout=POOL_TIMEOUT_SECONDS,
+)
+AsyncSessionLocal = async_sessionmaker(bind=async_engine, expire_on_commit=False)
+
+
+@event.listens_for(engine, "connect")
+@event.listens_for(async_engine.sync_engine, "connect")
+def configure_connection(dbapi_connection, _connection_record) -> None:
+    cursor = dbapi_connection.cursor()
+    for pragma, value in STORAGE_PROFILES[STORAGE_PROFILE].items():
+        cursor.execute(f"PRAGMA {pragma} = {value}")
+    cursor.close()
+    dbapi_connection.create_function("merge_tags", 2, merge_tags, deterministic=True)
+    # SQLite's lower() folds ASCII only; tag keys must match the Python side.
+    dbapi_connection.create_function("casefold", 1, tag_key, deterministic=True)
+
 
-def get_db():
-    db = SessionLocal()
-    try:
+async def get_async_db():
+    async with AsyncSessionLocal() as db:
         yield db
-    finally:
-        db.close()
@@ -0,0 +1,85 @@
+import argparse
+import csv
+import json
+import math
+from pathlib import Path
+
+from fastapi import HTTPException, status
+from sqlalchemy import select
+from sqlalchemy.dialects.sqlite import insert
+
+from app.auth import now_utc
+from app.db import DB_PATH, SessionLocal
+from app.models import FxRate
+from app.portfolio_utils import normalize_currency
+from app.signals import GenerationCounter
+
+FX_GENERATION_PATH = DB_PATH.with_name(f"{DB_PATH.name}.fx")
+
+# Bumped on every import so each worker rebuilds its cached conversion matrix.
+fx_generation = GenerationCounter(FX_GENERATION_PATH)
+
+
+def load_rates(db) -> dict[str, float]:
+    rows = db.execute(select(FxRate.currency, FxRate.rate_to_usd)).all()
+    rates = {currency: rate for currency, rate in rows}
+    rates["USD"] = 1.0
+    return rates
+
+
+def import_rates(db, rates: dict[str, float]) -> int:
+    cleaned = {}
+    for raw_currency, raw_rate in rates.items():
+        currency = normalize_currency(str(raw_currency))
+        try:
+            rate = float(raw_rate)
+        except (TypeError, ValueError):
+            rate = 0.0
+        if not currency or not math.isfinite(rate) or rate <= 0:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST, detail=f"Invalid FX rate for {raw_currency}."
+            )
+        cleaned[currency] = rate
+    if not cleaned:
+        return 0
+    now = now_utc()
+    statement = insert(FxRate).values(
+        [{"currency": currency, "rate_to_usd": rate, "updated_at": now} for currency, rate in cleaned.items()]
+    )
+    db.execute(
+        statement.on_conflict_do_update(
+            index_elements=[FxRate.currency],
+            set_={"rate_to_usd": statement.excluded.rate_to_usd, "updated_at": statement.excluded.updated_at},
+        )
+    )
+    db.commit()
+    fx_generation.bump()
+    return len(cleaned)
+
+
+def read_rates_file(path: Path) -> dict[str, float]:
+    """Read ``{"EUR": 1.08, ...}`` JSON or a ``currency,rate_to_usd`` CSV."""
+    if path.suffix.lower() == ".json":
+        return json.loads(path.read_text(encoding="utf-8"))
+    with path.open(newline="", encoding="utf-8") as handle:
+        return {row["currency"]: row["rate_to_usd"] for row in csv.DictReader(handle)}
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Import FX rates (units of USD per unit of currency).")
+    parser.add_argument("path", type=Path, help="JSON object or CSV with currency,rate_to_usd columns")
+    args = parser.parse_args()
+
+    from app.main import startup
+
+    startup()
+    with SessionLocal() as db:
+        try:
+            count = import_rates(db, read_rates_file(args.path))
+        except HTTPException as exc:
+            raise SystemExit(exc.detail)
+    print(f"Imported {count} FX rates.")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,415 @@
+import argparse
+import math
+import time
+from collections import deque
+from dataclasses import dataclass, field
+from datetime import datetime, timezone
+
+from fastapi import HTTPException, status
+from sqlalchemy import bindparam, literal_column, select, text, update
+
+from app.auth import as_utc, now_utc
+from app.db import SessionLocal, engine
+from app.models import Holding, Transaction
+
+# Quantities within this of zero count as a closed position, absorbing float residue.
+QUANTITY_EPSILON = 1e-9
+REBUILD_TOLERANCE = 1e-6
+LOT_PAGE_SIZE = 32
+REBUILD_CHUNK_HOLDINGS = 1000
+MAX_REPORTED_MISMATCHES = 20
+
+# Literal so SQLite can match ix_transactions_open_lots, whose WHERE clause it must see verbatim.
+OPEN_LOT = Transaction.open_quantity > literal_column("0")
+
+# Records each imported or merged purchase against the holding it landed in; takes the
+# same parameters as ``upsert_holding_statement``, one row or many. ``updated_at`` is
+# bound through the column type so it is stored like the ORM's rows, without an offset.
+RECORD_BUY = text(
+    "INSERT INTO transactions (user_id, holding_id, kind, quantity, amount, realized_pnl, "
+    "open_quantity, open_cost, executed_at, created_at) "
+    "SELECT :user_id, id, 'buy', :quantity, :total_cost, 0, "
+    "CASE cost_method WHEN 'fifo' THEN :quantity END, CASE cost_method WHEN 'fifo' THEN :total_cost END, "
+    ":updated_at, :updated_at "
+    "FROM holdings WHERE user_id = :user_id AND name_key = :name_key"
+).bindparams(bindparam("updated_at", type_=Transaction.executed_at.type))
+
+
+def average_cost_of(quantity: float, total_cost: float, sold: float) -> float:
+    if sold >= quantity - QUANTITY_EPSILON:
+        return total_cost
+    return total_cost * sold / quantity
+
+
+def take_from_lots(lots, sold: float) -> tuple[float, list[tuple[int, float, float]]]:
+    """Consume ``sold`` from ``(id, open_quantity, open_cost)`` lots, oldest first.
+
+    Returns the cost removed and the lots' new open quantity and cost.
+    """
+    removed, remaining, changes = 0.0, sold, []
+    for lot_id, open_quantity, open_cost in lots:
+        if remaining <= QUANTITY_EPSILON:
+            break
+        if open_quantity <= remaining + QUANTITY_EPSILON:
+            removed += open_cost
+            remaining -= open_quantity
+            changes.append((lot_id, 0.0, 0.0))
+        else:
+            cost = open_cost * remaining / open_quantity
+            removed += cost
+            changes.append((lot_id, open_quantity - remaining, open_cost - cost))
+            remaining = 0.0
+    return removed, changes
+
+
+def after_sale(quantity: float, total_cost: float, sold: float, removed: float) -> tuple[float, float]:
+    left = quantity - sold
+    if left <= QUANTITY_EPSILON:
+        return 0.0, 0.0
+    return left, total_cost - removed
+
+
+@dataclass
+class Position:
+    """A holding replayed from its ledger, with the values each entry should carry."""
+
+    method: str
+    quantity: float = 0.0
+    total_cost: float = 0.0
+    realized_pnl: float = 0.0
+    lots: deque = field(default_factory=deque)
+    # transaction id -> (realized_pnl, open_quantity, open_cost)
+    entries: dict[int, tuple[float, float | None, float | None]] = field(default_factory=dict)
+
+    def apply(self, transaction_id: int, kind: str, quantity: float, amount: float) -> None:
+        fifo = self.method == "fifo"
+        realized = 0.0
+        if kind == "buy":
+            self.quantity += quantity
+            self.total_cost += amount
+            if fifo:
+                self.lots.append([transaction_id, quantity, amount])
+        elif kind == "sell":
+            if fifo:
+                removed, changes = take_from_lots(list(self.lots), quantity)
+                self._update_lots(changes)
+            else:
+                removed = average_cost_of(self.quantity, self.total_cost, quantity)
+            realized = amount - removed
+            self.quantity, self.total_cost = after_sale(self.quantity, self.total_cost, quantity, removed)
+        elif kind == "fee":
+            realized = -amount
+        elif kind == "adjust":
+            self.quantity += quantity
+            self.total_cost += amount
+            if fifo:
+                self._update_lots([(lot_id, 0.0, 0.0) for lot_id, _, _ in self.lots])
+                if self.quantity > QUANTITY_EPSILON:
+                    self.lots.append([transaction_id, self.quantity, self.total_cost])
+        self.realized_pnl += realized
+        self.entries[transaction_id] = (realized, None, None)
+
+    def _update_lots(self, changes: list[tuple[int, float, float]]) -> None:
+        open_lots = {lot[0]: lot for lot in self.lots}
+        for lot_id, open_quantity, open_cost in changes:
+            open_lots[lot_id][1:] = [open_quantity, open_cost]
+            realized = self.entries[lot_id][0]
+            self.entries[lot_id] = (realized, open_quantity, open_cost)
+        while self.lots and self.lots[0][1] <= QUANTITY_EPSILON:
+            self.lots.popleft()
+
+    def entry_values(self) -> list[dict]:
+        """Every entry's expected columns; open lots carry their remaining size."""
+        open_lots = {lot_id: (quantity, cost) for lot_id, quantity, cost in self.lots}
+        values = []
+        for transaction_id, (realized, open_quantity, open_cost) in self.entries.items():
+            if transaction_id in open_lots:
+                open_quantity, open_cost = open_lots[transaction_id]
+            values.append(
+                {
+                    "id": transaction_id,
+                    "realized_pnl": realized,
+                    "open_quantity": open_quantity,
+                    "open_cost": open_cost,
+                }
+            )
+        return values
+
+
+def check_trade(holding: Holding, kind: str, quantity: float, amount: float) -> None:
+    if not math.isfinite(quantity) or not math.isfinite(amount) or amount < 0:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid transaction.")
+    if kind in ("buy", "sell") and quantity <= 0:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid transaction.")
+    if kind == "sell" and quantity > holding.quantity + QUANTITY_EPSILON:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST, detail="Cannot sell more than the held quantity."
+        )
+
+
+async def consume_open_lots(db, holding_id: int, sold: float) -> float:
+    """Close FIFO lots for a sale, reading only as many of the oldest as it needs."""
+    lots, covered, after = [], 0.0, 0
+    while covered < sold - QUANTITY_EPSILON:
+        page = (await db.execute(
+            select(Transaction.id, Transaction.open_quantity, Transaction.open_cost)
+            .where(Transaction.holding_id == holding_id, OPEN_LOT, Transaction.id > after)
+            .order_by(Transaction.id)
+            .limit(LOT_PAGE_SIZE)
+        )).all()
+        if not page:
+            break
+        lots += page
+        covered += sum(open_quantity for _, open_quantity, _ in page)
+        after = page[-1][0]
+    removed, changes = take_from_lots(lots, sold)
+    if changes:
+        await db.execute(
+            update(Transaction),
+            [
+                {"id": lot_id, "open_quantity": open_quantity, "open_cost": open_cost}
+                for lot_id, open_quantity, open_cost in changes
+            ],
+        )
+    return removed
+
+
+async def record_trade(
+    db, holding: Holding, kind: str, quantity: float, amount: float, executed_at: datetime | None = None
+) -> Transaction:
+    """Append a buy, sell or fee and apply it to ``holding`` in the caller's transaction.
+
+    Touches the holding row, the new entry and, for FIFO sales, only the lots consumed.
+    """
+    check_trade(holding, kind, quantity, amount)
+    now = now_utc()
+    entry = Transaction(
+        user_id=holding.user_id,
+        holding_id=holding.id,
+        kind=kind,
+        quantity=quantity if kind != "fee" else 0.0,
+        amount=amount,
+        realized_pnl=0.0,
+        # Stored naive like every other timestamp, so an offset is converted, not dropped.
+        executed_at=as_utc(executed_at).astimezone(timezone.utc) if executed_at else now,
+        created_at=now,
+    )
+    if kind == "buy":
+        holding.quantity += quantity
+        holding.total_cost += amount
+        if holding.cost_method == "fifo":
+            entry.open_quantity, entry.open_cost = quantity, amount
+    elif kind == "sell":
+        if holding.cost_method == "fifo":
+            removed = await consume_open_lots(db, holding.id, quantity)
+        else:
+            removed = average_cost_of(holding.quantity, holding.total_cost, quantity)
+        entry.realized_pnl = amount - removed
+        holding.quantity, holding.total_cost = after_sale(holding.quantity, holding.total_cost, quantity, removed)
+    else:
+        entry.realized_pnl = -amount
+    holding.realized_pnl += entry.realized_pnl
+    holding.updated_at = now
+    db.add(entry)
+    return entry
+
+
+async def record_adjustment(db, holding: Holding, quantity: float, total_cost: float) -> None:
+    """Record an edit of quantity or cost as deltas; under FIFO it replaces the open lots."""
+    delta_quantity = quantity - holding.quantity
+    delta_cost = total_cost - holding.total_cost
+    if abs(delta_quantity) <= QUANTITY_EPSILON and abs(delta_cost) <= QUANTITY_EPSILON:
+        return
+    now = now_utc()
+    entry = Transaction(
+        user_id=holding.user_id,
+        holding_id=holding.id,
+        kind="adjust",
+        quantity=delta_quantity,
+        amount=delta_cost,
+        realized_pnl=0.0,
+        executed_at=now,
+        created_at=now,
+    )
+    if holding.cost_method == "fifo":
+        await db.execute(
+            update(Transaction)
+            .where(Transaction.holding_id == holding.id, OPEN_LOT)
+            .values(open_quantity=0.0, open_cost=0.0)
+        )
+        entry.open_quantity, entry.open_cost = quantity, total_cost
+    holding.quantity, holding.total_cost = quantity, total_cost
+    db.add(entry)
+
+
+async def change_cost_method(db, holding: Holding, method: str) -> None:
+    """Re-derive realized P&L and open lots from the ledger under ``method``."""
+    await db.flush()
+    position = Position(method)
+    for transaction_id, kind, quantity, amount in (await db.execute(
+        select(Transaction.id, Transaction.kind, Transaction.quantity, Transaction.amount)
+        .where(Transaction.holding_id == holding.id)
+        .order_by(Transaction.id)
+    )).all():
+        position.apply(transaction_id, kind, quantity, amount)
+    if position.entries:
+        await db.execute(update(Transaction), position.entry_values())
+    holding.cost_method = method
+    holding.quantity, holding.total_cost = position.quantity, position.total_cost
+    holding.realized_pnl = position.realized_pnl
+
+
+def differs(left: float | None, right: float | None) -> bool:
+    if left is None or right is None:
+        return (left is None) != (right is None)
+    return abs(left - right) > REBUILD_TOLERANCE * max(1.0, abs(left), abs(right))
+
+
+def verify_chunk(conn, first_id: int, last_id: int) -> tuple[int, list[tuple[int, Position | None]]]:
+    """Replay the ledger of holdings ``first_id..last_id`` in one ordered scan.
+
+    Returns the entry count and the holdings whose stored values disagree, with their
+    replayed position (``None`` for a holding that has no ledger at all).
+    """
+    rows = conn.execute(
+        text(
+            "SELECT h.id, h.cost_method, h.quantity, h.total_cost, h.realized_pnl, "
+            "t.id, t.kind, t.quantity, t.amount, t.realized_pnl, t.open_quantity, t.open_cost "
+            "FROM holdings AS h LEFT JOIN transactions AS t ON t.holding_id = h.id "
+            "WHERE h.id BETWEEN :first_id AND :last_id ORDER BY h.id, t.id"
+        ),
+        {"first_id": first_id, "last_id": last_id},
+    )
+    entries, mismatched = 0, []
+    current, position, stored, stored_entries = None, None, None, {}
+
+    def finish() -> None:
+        if current is None:
+            return
+        if not position.entries:
+            mismatched.append((current, None))
+            return
+        expected = {values["id"]: values for values in position.entry_values()}
+        if (
+            differs(stored[0], position.quantity)
+            or differs(stored[1], position.total_cost)
+            or differs(stored[2], position.realized_pnl)
+            or any(
+                differs(stored_entries[entry_id][0], values["realized_pnl"])
+                or differs(stored_entries[entry_id][1], values["open_quantity"])
+                or differs(stored_entries[entry_id][2], values["open_cost"])
+                for entry_id, values in expected.items()
+            )
+        ):
+            mismatched.append((current, position))
+
+    for (
+        holding_id, method, quantity, total_cost, realized_pnl,
+        entry_id, kind, entry_quantity, amount, entry_realized, open_quantity, open_cost,
+    ) in rows:
+        if holding_id != current:
+            finish()
+            current, position = holding_id, Position(method)
+            stored, stored_entries = (quantity, total_cost, realized_pnl), {}
+        if entry_id is not None:
+            entries += 1
+            position.apply(entry_id, kind, entry_quantity, amount)
+            stored_entries[entry_id] = (entry_realized, open_quantity, open_cost)
+    finish()
+    return entries, mismatched
+
+
+def repair(db, mismatched: list[tuple[int, Position | None]]) -> None:
+    """Rewrite holdings and entries from their replayed ledger.
+
+    A holding without a ledger gets an opening ``adjust`` for its current quantity and cost.
+    """
+    now = now_utc()
+    missing = [holding_id for holding_id, position in mismatched if position is None]
+    if missing:
+        db.execute(
+            text(
+                "INSERT INTO transactions (user_id, holding_id, kind, quantity, amount, realized_pnl, "
+                "open_quantity, open_cost, executed_at, created_at) "
+                "SELECT user_id, id, 'adjust', quantity, total_cost, 0, "
+                "CASE cost_method WHEN 'fifo' THEN quantity END, CASE cost_method WHEN 'fifo' THEN total_cost END, "
+                ":now, :now FROM holdings WHERE id = :holding_id"
+            ).bindparams(bindparam("now", type_=Transaction.executed_at.type)),
+            [{"holding_id": holding_id, "now": now} for holding_id in missing],
+        )
+    db.execute(
+        text(
+            "UPDATE users SET portfolio_version = portfolio_version + 1 "
+            "WHERE id = (SELECT user_id FROM holdings WHERE id = :holding_id)"
+        ),
+        [{"holding_id": holding_id} for holding_id, _ in mismatched],
+    )
+    replayed = [(holding_id, position) for holding_id, position in mismatched if position is not None]
+    if replayed:
+        db.execute(
+            update(Holding),
+            [
+                {
+                    "id": holding_id,
+                    "quantity": position.quantity,
+                    "total_cost": position.total_cost,
+                    "realized_pnl": position.realized_pnl,
+                }
+                for holding_id, position in replayed
+            ],
+        )
+        db.execute(
+            update(Transaction), [values for _, position in replayed for values in position.entry_values()]
+        )
+
+
+def rebuild(fix: bool) -> tuple[int, int, list[int]]:
+    """Verify every holding against its ledger, ``REBUILD_CHUNK_HOLDINGS`` at a time.
+
+    Returns holdings checked, entries replayed and the ids that disagreed (repaired when
+    ``fix`` is set).
+    """
+    with engine.connect() as conn:
+        last_id = conn.execute(text("SELECT max(id) FROM holdings")).scalar() or 0
+        holdings = conn.execute(text("SELECT count(*) FROM holdings")).scalar()
+    entries, mismatched_ids = 0, []
+    for first_id in range(1, last_id + 1, REBUILD_CHUNK_HOLDINGS):
+        with SessionLocal() as db:
+            chunk_entries, mismatched = verify_chunk(
+                db.connection(), first_id, min(first_id + REBUILD_CHUNK_HOLDINGS - 1, last_id)
+            )
+            entries += chunk_entries
+            mismatched_ids += [holding_id for holding_id, _ in mismatched]
+            if fix and mismatched:
+                repair(db, mismatched)
+                db.commit()
+    return holdings, entries, mismatched_ids
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Verify holdings against the transaction ledger.")
+    parser.add_argument("command", choices=["rebuild"])
+    parser.add_argument("--fix", action="store_true", help="rewrite holdings that disagree with their ledger")
+    args = parser.parse_args()
+
+    from app.main import startup
+
+    startup()
+    started = time.perf_counter()
+    holdings, entries, mismatched = rebuild(args.fix)
+    print(
+        f"Checked {holdings} holdings against {entries} transactions in "
+        f"{time.perf_counter() - started:.2f}s; {len(mismatched)} disagreed."
+    )
+    if mismatched:
+        shown = ", ".join(str(holding_id) for holding_id in mismatched[:MAX_REPORTED_MISMATCHES])
+        more = f" (+{len(mismatched) - MAX_REPORTED_MISMATCHES} more)" if len(mismatched) > MAX_REPORTED_MISMATCHES else ""
+        print(f"Holdings: {shown}{more}")
+        if args.fix:
+            print("Rewrote them from their ledger.")
+        else:
+            raise SystemExit("Run with --fix to rewrite them from their ledger.")
+
+
+if __name__ == "__main__":
+    main()
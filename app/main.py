@@ -1,13 +1,12 @@
 from pathlib import Path
 
-from fastapi import FastAPI
-from fastapi.responses import FileResponse
+from fastapi import FastAPI, Request
 from fastapi.staticfiles import StaticFiles
 
-from app import auth, portfolio
-from app.db import engine
+from app import assets, auth, backup, batch, changes, metrics, portfolio, prices, search, snapshots, transfer, valuation
 from app.migrations import run_migrations
-from app.models import Base
+from app.passwords import hashing_pool
+from app.tasks import start_periodic_jobs, stop_periodic_jobs
 
 BASE_DIR = Path(__file__).resolve().parent.parent
 
@@ -15,12 +14,39 @@ app = FastAPI(title="Portfolio Manager API")
 
 @app.on_event("startup")
 def startup() -> None:
-    Base.metadata.create_all(engine)
     run_migrations()
 
+
+@app.on_event("startup")
+async def start_background_jobs() -> None:
+    await metrics.start_metrics_flush()
+    await start_periodic_jobs()
+    await changes.change_feed.start()
+
+
+@app.on_event("shutdown")
+async def stop_background_jobs() -> None:
+    await changes.change_feed.stop()
+    await stop_periodic_jobs()
+    hashing_pool.shutdown()
+    await metrics.stop_metrics_flush()
+
+
+app.add_middleware(metrics.MetricsMiddleware)
+if assets.DIST_DIR.is_dir():
+    app.mount("/static/dist", assets.PrecompressedStaticFiles(directory=assets.DIST_DIR), name="dist")
 app.mount("/static", StaticFiles(directory=BASE_DIR / "static"), name="static")
 app.include_router(auth.router)
 app.include_router(portfolio.router)
+app.include_router(batch.router)
+app.include_router(changes.router)
+app.include_router(prices.router)
+app.include_router(search.router)
+app.include_router(snapshots.router)
+app.include_router(transfer.router)
+app.include_router(valuation.router)
+app.include_router(backup.router)
+app.include_router(metrics.router)
 
 
 @app.get("/healthz")
@@ -29,5 +55,5 @@ def healthcheck():
 
 
 @app.get("/")
-def app_index():
-    return FileResponse(BASE_DIR / "index.html")
+def app_index(request: Request):
+    return assets.index_document.response(request)
@@ -0,0 +1,345 @@
+import asyncio
+import fcntl
+import json
+import logging
+import os
+import threading
+import time
+from bisect import bisect_left
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+from pathlib import Path
+
+import anyio.to_thread
+from fastapi import APIRouter
+from fastapi.responses import PlainTextResponse
+from sqlalchemy import event
+from starlette.concurrency import run_in_threadpool
+
+from app.db import DB_PATH, async_engine, engine
+
+METRICS_DIR = Path(os.environ.get("PORTFOLIO_METRICS_DIR", DB_PATH.with_name(f"{DB_PATH.name}.metrics")))
+METRICS_FLUSH_SECONDS = float(os.environ.get("PORTFOLIO_METRICS_FLUSH_INTERVAL", "5"))
+# Requests slower than this are logged with the SQL they ran; 0 disables the log.
+SLOW_REQUEST_MS = float(os.environ.get("PORTFOLIO_SLOW_REQUEST_MS", "0"))
+SLOW_REQUEST_MAX_STATEMENTS = 50
+ARCHIVE_NAME = "exited.json"
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+STATEMENT_BUCKETS = (0, 1, 2, 3, 5, 10, 25, 50, 100)
+HASH_BUCKETS = (0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+
+HELP = {
+    "portfolio_http_requests_total": ("counter", "Requests handled, by route and status."),
+    "portfolio_http_request_duration_seconds": ("histogram", "Request latency until the last body byte."),
+    "portfolio_http_request_sql_statements": ("histogram", "SQL statements executed per request."),
+    "portfolio_http_request_sql_seconds_total": ("counter", "Time spent executing SQL, by route."),
+    "portfolio_password_hash_seconds": ("histogram", "Password hashing latency, including queueing."),
+    "portfolio_http_requests_in_flight": ("gauge", "Requests currently being handled."),
+    "portfolio_threadpool_threads_busy": ("gauge", "Threadpool tokens in use by sync handlers."),
+    "portfolio_threadpool_threads_total": ("gauge", "Threadpool size available to sync handlers."),
+    "portfolio_db_connections_checked_out": ("gauge", "Pooled SQLite connections in use."),
+}
+
+logger = logging.getLogger(__name__)
+
+router = APIRouter()
+
+
+@dataclass
+class RequestStats:
+    statements: int = 0
+    sql_seconds: float = 0.0
+    capture: bool = False
+    queries: list[tuple[float, str]] = field(default_factory=list)
+
+
+_request_stats: ContextVar[RequestStats | None] = ContextVar("request_stats", default=None)
+
+
+class MetricsRegistry:
+    """Counters and histograms for this worker, flushed to ``METRICS_DIR/<pid>.json``."""
+
+    def __init__(self):
+        self.counters: dict[tuple[str, tuple], float] = {}
+        self.histograms: dict[tuple[str, tuple], list] = {}
+        self.in_flight = 0
+        self._lock = threading.Lock()
+
+    def inc(self, name: str, labels: dict, amount: float = 1.0) -> None:
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            self.counters[key] = self.counters.get(key, 0.0) + amount
+
+    def observe(self, name: str, labels: dict, value: float, buckets: tuple) -> None:
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            histogram = self.histograms.get(key)
+            if histogram is None:
+                histogram = self.histograms[key] = [list(buckets), [0] * (len(buckets) + 1), 0.0]
+            histogram[1][bisect_left(buckets, value)] += 1
+            histogram[2] += value
+
+    def gauges(self) -> list[tuple[str, dict, float]]:
+        limiter = anyio.to_thread.current_default_thread_limiter()
+        return [
+            ("portfolio_http_requests_in_flight", {}, self.in_flight),
+            ("portfolio_threadpool_threads_busy", {}, limiter.borrowed_tokens),
+            ("portfolio_threadpool_threads_total", {}, limiter.total_tokens),
+            ("portfolio_db_connections_checked_out", {"engine": "sync"}, engine.pool.checkedout()),
+            ("portfolio_db_connections_checked_out", {"engine": "async"}, async_engine.pool.checkedout()),
+        ]
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            return {
+                "pid": os.getpid(),
+                "counters": [[name, dict(labels), value] for (name, labels), value in self.counters.items()],
+                "histograms": [
+                    [name, dict(labels), buckets, counts[:], total]
+                    for (name, labels), (buckets, counts, total) in self.histograms.items()
+                ],
+                "gauges": [[name, labels, value] for name, labels, value in self.gauges()],
+            }
+
+    def flush(self, snapshot: dict | None = None) -> None:
+        """Write ``snapshot``, or a fresh one; off the event loop, pass one taken on it."""
+        METRICS_DIR.mkdir(parents=True, exist_ok=True)
+        path = METRICS_DIR / f"{os.getpid()}.json"
+        staging = path.with_suffix(".tmp")
+        staging.write_text(json.dumps(snapshot or self.snapshot()), encoding="utf-8")
+        os.replace(staging, path)
+
+
+registry = MetricsRegistry()
+
+
+@event.listens_for(engine, "before_cursor_execute")
+@event.listens_for(async_engine.sync_engine, "before_cursor_execute")
+def _before_cursor_execute(_conn, _cursor, _statement, _parameters, context, _executemany) -> None:
+    if context is not None:
+        context.metrics_started = time.perf_counter()
+
+
+@event.listens_for(engine, "after_cursor_execute")
+@event.listens_for(async_engine.sync_engine, "after_cursor_execute")
+def _after_cursor_execute(_conn, _cursor, statement, _parameters, context, _executemany) -> None:
+    stats = _request_stats.get()
+    if stats is None or context is None:
+        return
+    elapsed = time.perf_counter() - context.metrics_started
+    stats.statements += 1
+    stats.sql_seconds += elapsed
+    if stats.capture and len(stats.queries) < SLOW_REQUEST_MAX_STATEMENTS:
+        stats.queries.append((elapsed, statement))
+
+
+class MetricsMiddleware:
+    """Times each request and counts the SQL it runs, labelled by route template.
+
+    Event streams are timed until their headers are sent, since their body lasts as
+    long as the client stays connected.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        started = time.perf_counter()
+        stats = RequestStats(capture=SLOW_REQUEST_MS > 0)
+        token = _request_stats.set(stats)
+        status_code = 500
+        finished = False
+
+        def finish() -> None:
+            nonlocal finished
+            if finished:
+                return
+            finished = True
+            elapsed = time.perf_counter() - started
+            route = getattr(scope.get("route"), "path", None) or "other"
+            labels = {"method": scope["method"], "route": route}
+            registry.inc("portfolio_http_requests_total", {**labels, "status": str(status_code)})
+            registry.observe("portfolio_http_request_duration_seconds", labels, elapsed, LATENCY_BUCKETS)
+            registry.observe("portfolio_http_request_sql_statements", labels, stats.statements, STATEMENT_BUCKETS)
+            registry.inc("portfolio_http_request_sql_seconds_total", labels, stats.sql_seconds)
+            if stats.capture and elapsed * 1000 >= SLOW_REQUEST_MS:
+                log_slow_request(scope, route, status_code, elapsed, stats)
+
+        async def send_with_metrics(message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+                for name, value in message.get("headers", ()):
+                    if name == b"content-type" and value.startswith(b"text/event-stream"):
+                        finish()
+            await send(message)
+            if message["type"] == "http.response.body" and not message.get("more_body", False):
+                finish()
+
+        registry.in_flight += 1
+        try:
+            await self.app(scope, receive, send_with_metrics)
+        finally:
+            registry.in_flight -= 1
+            finish()
+            _request_stats.reset(token)
+
+
+def log_slow_request(scope, route: str, status_code: int, elapsed: float, stats: RequestStats) -> None:
+    lines = [
+        f"Slow request {scope['method']} {scope['path']} ({route}) -> {status_code} "
+        f"in {elapsed * 1000:.1f} ms; {stats.statements} SQL statements, {stats.sql_seconds * 1000:.1f} ms"
+    ]
+    lines += [f"  {seconds * 1000:8.2f} ms  {' '.join(statement.split())}" for seconds, statement in stats.queries]
+    if stats.statements > len(stats.queries):
+        lines.append(f"  ... {stats.statements - len(stats.queries)} more")
+    logger.warning("\n".join(lines))
+
+
+def observe_password_hash(operation: str, seconds: float) -> None:
+    registry.observe("portfolio_password_hash_seconds", {"operation": operation}, seconds, HASH_BUCKETS)
+
+
+def _pid_alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+def _merge(totals: dict, snapshot: dict) -> None:
+    for name, labels, value in snapshot["counters"]:
+        key = (name, tuple(sorted(labels.items())))
+        totals["counters"][key] = totals["counters"].get(key, 0.0) + value
+    for name, labels, buckets, counts, total in snapshot["histograms"]:
+        key = (name, tuple(sorted(labels.items())))
+        merged = totals["histograms"].setdefault(key, [buckets, [0] * len(counts), 0.0])
+        merged[1] = [left + right for left, right in zip(merged[1], counts)]
+        merged[2] += total
+
+
+def collect(snapshot: dict | None = None) -> dict:
+    """Merge every worker's last flush, this worker's from ``snapshot`` when given.
+
+    Counters and histograms of exited workers are folded into ``exited.json`` so totals
+    never go backwards; their gauges are dropped.
+    """
+    registry.flush(snapshot)
+    totals = {"counters": {}, "histograms": {}, "gauges": []}
+    with open(METRICS_DIR / f"{ARCHIVE_NAME}.lock", "a") as lock:
+        fcntl.flock(lock, fcntl.LOCK_EX)
+        archive_path = METRICS_DIR / ARCHIVE_NAME
+        archive = {"counters": [], "histograms": []}
+        if archive_path.exists():
+            archive = json.loads(archive_path.read_text(encoding="utf-8"))
+        exited = []
+        for path in METRICS_DIR.glob("*.json"):
+            if not path.stem.isdigit():
+                continue
+            try:
+                snapshot = json.loads(path.read_text(encoding="utf-8"))
+            except (OSError, ValueError):
+                continue
+            if _pid_alive(int(path.stem)):
+                _merge(totals, snapshot)
+                totals["gauges"] += [[name, {**labels, "pid": path.stem}, value] for name, labels, value in snapshot["gauges"]]
+            else:
+                exited.append((path, snapshot))
+        if exited:
+            folded = {"counters": {}, "histograms": {}}
+            _merge(folded, archive)
+            for _, snapshot in exited:
+                _merge(folded, snapshot)
+            archive = {
+                "counters": [[name, dict(labels), value] for (name, labels), value in folded["counters"].items()],
+                "histograms": [
+                    [name, dict(labels), buckets, counts, total]
+                    for (name, labels), (buckets, counts, total) in folded["histograms"].items()
+                ],
+            }
+            staging = archive_path.with_suffix(".tmp")
+            staging.write_text(json.dumps(archive), encoding="utf-8")
+            os.replace(staging, archive_path)
+            for path, _ in exited:
+                path.unlink(missing_ok=True)
+        _merge(totals, archive)
+    return totals
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_labels(labels) -> str:
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{key}="{_escape(value)}"' for key, value in labels) + "}"
+
+
+def _format_value(value: float) -> str:
+    return repr(float(value)) if value != int(value) else str(int(value))
+
+
+def render(totals: dict) -> str:
+    samples: dict[str, list[str]] = {name: [] for name in HELP}
+    for (name, labels), value in sorted(totals["counters"].items()):
+        samples[name].append(f"{name}{_format_labels(labels)} {_format_value(value)}")
+    for (name, labels), (buckets, counts, total) in sorted(totals["histograms"].items()):
+        cumulative = 0
+        for bound, count in zip([*buckets, "+Inf"], counts):
+            cumulative += count
+            bucket_labels = (*labels, ("le", bound if bound == "+Inf" else _format_value(bound)))
+            samples[name].append(f"{name}_bucket{_format_labels(bucket_labels)} {cumulative}")
+        samples[name].append(f"{name}_sum{_format_labels(labels)} {_format_value(total)}")
+        samples[name].append(f"{name}_count{_format_labels(labels)} {cumulative}")
+    for name, labels, value in totals["gauges"]:
+        samples[name].append(f"{name}{_format_labels(sorted(labels.items()))} {_format_value(value)}")
+    lines = []
+    for name, (kind, description) in HELP.items():
+        if samples[name]:
+            lines += [f"# HELP {name} {description}", f"# TYPE {name} {kind}", *samples[name]]
+    return "\n".join(lines) + "\n"
+
+
+@router.get("/metrics", include_in_schema=False)
+async def metrics():
+    """Prometheus text format, summed over every worker on this host.
+
+    Other workers' numbers are at most ``PORTFOLIO_METRICS_FLUSH_INTERVAL`` seconds old.
+    """
+    # The gauges read the event loop's thread limiter; the locked file merge runs off it.
+    totals = await run_in_threadpool(collect, registry.snapshot())
+    return PlainTextResponse(render(totals), media_type="text/plain; version=0.0.4")
+
+
+_flush_task: list[asyncio.Task] = []
+
+
+async def _flush_forever() -> None:
+    while True:
+        await asyncio.sleep(METRICS_FLUSH_SECONDS)
+        try:
+            await run_in_threadpool(registry.flush, registry.snapshot())
+        except OSError:
+            logger.exception("Could not write metrics to %s", METRICS_DIR)
+
+
+async def start_metrics_flush() -> None:
+    registry.flush()
+    if METRICS_FLUSH_SECONDS > 0:
+        _flush_task.append(asyncio.create_task(_flush_forever()))
+
+
+async def stop_metrics_flush() -> None:
+    for task in _flush_task:
+        task.cancel()
+    await asyncio.gather(*_flush_task, return_exceptions=True)
+    _flush_task.clear()
+    registry.flush()
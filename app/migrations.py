@@ -1,79 +1,423 @@
+import fcntl
+import os
+from collections.abc import Callable, Iterator
+from contextlib import contextmanager
+
 from sqlalchemy import text
+from sqlalchemy.engine import Connection
+from sqlalchemy.exc import OperationalError
 
-from app.db import engine
+from app.db import DB_PATH, engine
+from app.models import (
+    Base,
+    HoldingChange,
+    HoldingSnapshot,
+    HoldingTag,
+    IdempotencyKey,
+    PortfolioSnapshot,
+    SnapshotRun,
+    StreamTicket,
+    Transaction,
+)
+from app.portfolio_utils import decode_tags, encode_tags, holding_name_key
 
+MIGRATION_LOCK_PATH = DB_PATH.with_name(f"{DB_PATH.name}.migrate.lock")
 
-def ensure_holdings_category() -> None:
-    with engine.begin() as conn:
-        columns = {row[1] for row in conn.execute(text("PRAGMA table_info(holdings)")).fetchall()}
-        if "category" not in columns:
-            conn.execute(
-                text("ALTER TABLE holdings ADD COLUMN category VARCHAR NOT NULL DEFAULT '股票'")
-            )
-            conn.execute(text("UPDATE holdings SET category = '股票' WHERE category IS NULL"))
+
+def holdings_columns(conn: Connection) -> set[str]:
+    return {row[1] for row in conn.execute(text("PRAGMA table_info(holdings)")).fetchall()}
+
+
+def create_missing_tables(conn: Connection) -> None:
+    Base.metadata.create_all(conn)
+
+
+def ensure_holdings_category(conn: Connection) -> None:
+    if "category" not in holdings_columns(conn):
+        conn.execute(
+            text("ALTER TABLE holdings ADD COLUMN category VARCHAR NOT NULL DEFAULT '股票'")
+        )
+        conn.execute(text("UPDATE holdings SET category = '股票' WHERE category IS NULL"))
+
+
+def ensure_holdings_note(conn: Connection) -> None:
+    if "note" not in holdings_columns(conn):
+        conn.execute(text("ALTER TABLE holdings ADD COLUMN note VARCHAR"))
+
+
+def ensure_holdings_tags(conn: Connection) -> None:
+    if "tags" not in holdings_columns(conn):
+        conn.execute(text("ALTER TABLE holdings ADD COLUMN tags VARCHAR"))
+
+
+def ensure_holdings_currency(conn: Connection) -> None:
+    if "currency" not in holdings_columns(conn):
+        conn.execute(
+            text("ALTER TABLE holdings ADD COLUMN currency VARCHAR NOT NULL DEFAULT 'USD'")
+        )
+        conn.execute(text("UPDATE holdings SET currency = 'USD' WHERE currency IS NULL"))
 
 
-def ensure_holdings_note() -> None:
-    with engine.begin() as conn:
-        columns = {row[1] for row in conn.execute(text("PRAGMA table_info(holdings)")).fetchall()}
-        if "note" not in columns:
-            conn.execute(text("ALTER TABLE holdings ADD COLUMN note VARCHAR"))
+def ensure_holdings_current_price(conn: Connection) -> None:
+    if "current_price" not in holdings_columns(conn):
+        conn.execute(text("ALTER TABLE holdings ADD COLUMN current_price FLOAT"))
 
 
-def ensure_holdings_tags() -> None:
-    with engine.begin() as conn:
-        columns = {row[1] for row in conn.execute(text("PRAGMA table_info(holdings)")).fetchall()}
-        if "tags" not in columns:
-            conn.execute(text("ALTER TABLE holdings ADD COLUMN tags VARCHAR"))
+def ensure_holdings_risk_level(conn: Connection) -> None:
+    if "risk_level" not in holdings_columns(conn):
+        conn.execute(
+            text("ALTER TABLE holdings ADD COLUMN risk_level VARCHAR NOT NULL DEFAULT 'medium'")
+        )
+        conn.execute(text("UPDATE holdings SET risk_level = 'medium' WHERE risk_level IS NULL"))
 
 
-def ensure_holdings_currency() -> None:
-    with engine.begin() as conn:
-        columns = {row[1] for row in conn.execute(text("PRAGMA table_info(holdings)")).fetchall()}
-        if "currency" not in columns:
+def ensure_holdings_strategy(conn: Connection) -> None:
+    if "strategy" not in holdings_columns(conn):
+        conn.execute(text("ALTER TABLE holdings ADD COLUMN strategy VARCHAR"))
+
+
+def ensure_holdings_sentiment(conn: Connection) -> None:
+    if "sentiment" not in holdings_columns(conn):
+        conn.execute(text("ALTER TABLE holdings ADD COLUMN sentiment VARCHAR"))
+
+
+def ensure_sessions_expires_at_index(conn: Connection) -> None:
+    conn.execute(text("CREATE INDEX IF NOT EXISTS ix_sessions_expires_at ON sessions (expires_at)"))
+
+
+def ensure_holdings_user_updated_index(conn: Connection) -> None:
+    conn.execute(
+        text(
+            "CREATE INDEX IF NOT EXISTS ix_holdings_user_updated_id "
+            "ON holdings (user_id, updated_at, id)"
+        )
+    )
+
+
+def ensure_holdings_name_key(conn: Connection) -> None:
+    if "name_key" not in holdings_columns(conn):
+        conn.execute(text("ALTER TABLE holdings ADD COLUMN name_key VARCHAR"))
+    pending = conn.execute(
+        text("SELECT id, user_id, name FROM holdings WHERE name_key IS NULL ORDER BY id")
+    ).fetchall()
+    if pending:
+        taken = set(
             conn.execute(
-                text("ALTER TABLE holdings ADD COLUMN currency VARCHAR NOT NULL DEFAULT 'USD'")
+                text("SELECT user_id, name_key FROM holdings WHERE name_key IS NOT NULL")
+            ).fetchall()
+        )
+        updates = []
+        for holding_id, user_id, name in pending:
+            key = holding_name_key(name)
+            # Case-variant duplicates from before the unique index keep a distinct key.
+            if (user_id, key) in taken:
+                key = f"{key}#{holding_id}"
+            taken.add((user_id, key))
+            updates.append({"id": holding_id, "name_key": key})
+        conn.execute(text("UPDATE holdings SET name_key = :name_key WHERE id = :id"), updates)
+    conn.execute(
+        text(
+            "CREATE UNIQUE INDEX IF NOT EXISTS uq_holdings_user_name_key "
+            "ON holdings (user_id, name_key)"
+        )
+    )
+
+
+# Only JSON tag lists are expanded here, so the migrations that install these triggers
+# first rewrite rows still holding the older comma-separated format as JSON.
+HOLDING_TAG_ROWS = """
+    INSERT OR IGNORE INTO holding_tags (holding_id, user_id, tag, tag_key)
+    SELECT NEW.id, NEW.user_id, value, casefold(value)
+    FROM json_each(CASE WHEN json_valid(NEW.tags) THEN NEW.tags ELSE '[]' END)
+    WHERE trim(value) != '';
+"""
+HOLDING_TAG_TRIGGERS = [
+    f"""
+    CREATE TRIGGER IF NOT EXISTS holding_tags_after_insert AFTER INSERT ON holdings
+    BEGIN {HOLDING_TAG_ROWS} END
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS holding_tags_after_update AFTER UPDATE OF tags ON holdings
+    WHEN NEW.tags IS NOT OLD.tags
+    BEGIN
+        DELETE FROM holding_tags WHERE holding_id = OLD.id;
+        {HOLDING_TAG_ROWS}
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS holding_tags_after_delete AFTER DELETE ON holdings
+    BEGIN
+        DELETE FROM holding_tags WHERE holding_id = OLD.id;
+    END
+    """,
+]
+
+
+def rewrite_legacy_tags(conn: Connection) -> None:
+    rows = [
+        {"id": holding_id, "tags": encode_tags(decode_tags(raw_tags))}
+        for holding_id, raw_tags in conn.execute(
+            text(
+                "SELECT id, tags FROM holdings WHERE tags IS NOT NULL "
+                "AND CASE WHEN json_valid(tags) THEN json_type(tags) END IS NOT 'array'"
             )
-            conn.execute(text("UPDATE holdings SET currency = 'USD' WHERE currency IS NULL"))
+        )
+    ]
+    if rows:
+        conn.execute(text("UPDATE holdings SET tags = :tags WHERE id = :id"), rows)
 
 
-def ensure_holdings_current_price() -> None:
-    with engine.begin() as conn:
-        columns = {row[1] for row in conn.execute(text("PRAGMA table_info(holdings)")).fetchall()}
-        if "current_price" not in columns:
-            conn.execute(text("ALTER TABLE holdings ADD COLUMN current_price FLOAT"))
+def create_holding_tags(conn: Connection) -> None:
+    HoldingTag.__table__.create(conn, checkfirst=True)
+    rewrite_legacy_tags(conn)
+    rows = [
+        {"holding_id": holding_id, "user_id": user_id, "tag": tag}
+        for holding_id, user_id, raw_tags in conn.execute(
+            text("SELECT id, user_id, tags FROM holdings WHERE tags IS NOT NULL")
+        )
+        for tag in decode_tags(raw_tags)
+    ]
+    if rows:
+        conn.execute(
+            text(
+                "INSERT OR IGNORE INTO holding_tags (holding_id, user_id, tag, tag_key) "
+                "VALUES (:holding_id, :user_id, :tag, casefold(:tag))"
+            ),
+            rows,
+        )
+    for trigger in HOLDING_TAG_TRIGGERS:
+        conn.execute(text(trigger))
 
 
-def ensure_holdings_risk_level() -> None:
-    with engine.begin() as conn:
-        columns = {row[1] for row in conn.execute(text("PRAGMA table_info(holdings)")).fetchall()}
-        if "risk_level" not in columns:
-            conn.execute(
-                text("ALTER TABLE holdings ADD COLUMN risk_level VARCHAR NOT NULL DEFAULT 'medium'")
+def create_snapshot_tables(conn: Connection) -> None:
+    for model in (HoldingSnapshot, PortfolioSnapshot, SnapshotRun):
+        model.__table__.create(conn, checkfirst=True)
+
+
+def ensure_holdings_name_key_index(conn: Connection) -> None:
+    conn.execute(text("CREATE INDEX IF NOT EXISTS ix_holdings_name_key ON holdings (name_key)"))
+
+
+def create_idempotency_keys(conn: Connection) -> None:
+    IdempotencyKey.__table__.create(conn, checkfirst=True)
+
+
+HOLDING_CHANGE_TRIGGERS = [
+    """
+    CREATE TRIGGER IF NOT EXISTS holding_changes_after_insert AFTER INSERT ON holdings
+    BEGIN
+        INSERT INTO holding_changes (user_id, holding_id, kind) VALUES (NEW.user_id, NEW.id, 'created');
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS holding_changes_after_update AFTER UPDATE ON holdings
+    BEGIN
+        INSERT INTO holding_changes (user_id, holding_id, kind) VALUES (NEW.user_id, NEW.id, 'updated');
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS holding_changes_after_delete AFTER DELETE ON holdings
+    BEGIN
+        INSERT INTO holding_changes (user_id, holding_id, kind) VALUES (OLD.user_id, OLD.id, 'deleted');
+    END
+    """,
+]
+
+
+def create_holding_changes(conn: Connection) -> None:
+    HoldingChange.__table__.create(conn, checkfirst=True)
+    for trigger in HOLDING_CHANGE_TRIGGERS:
+        conn.execute(text(trigger))
+
+
+def create_transactions(conn: Connection) -> None:
+    columns = holdings_columns(conn)
+    if "cost_method" not in columns:
+        conn.execute(text("ALTER TABLE holdings ADD COLUMN cost_method VARCHAR NOT NULL DEFAULT 'average'"))
+    if "realized_pnl" not in columns:
+        conn.execute(text("ALTER TABLE holdings ADD COLUMN realized_pnl FLOAT NOT NULL DEFAULT 0"))
+    Transaction.__table__.create(conn, checkfirst=True)
+    # Every existing holding opens its ledger with its current quantity and cost.
+    conn.execute(
+        text(
+            "INSERT INTO transactions (user_id, holding_id, kind, quantity, amount, realized_pnl, "
+            "executed_at, created_at) "
+            "SELECT user_id, id, 'adjust', quantity, total_cost, 0, created_at, created_at FROM holdings "
+            "WHERE NOT EXISTS (SELECT 1 FROM transactions WHERE transactions.holding_id = holdings.id)"
+        )
+    )
+    conn.execute(
+        text(
+            """
+            CREATE TRIGGER IF NOT EXISTS transactions_after_holding_delete AFTER DELETE ON holdings
+            BEGIN
+                DELETE FROM transactions WHERE holding_id = OLD.id;
+            END
+            """
+        )
+    )
+
+
+# holdings_fts indexes this view rather than ``holdings`` so every row carries an
+# ``owner`` token, letting a search stay within one user's holdings inside FTS5.
+HOLDINGS_SEARCH_DDL = [
+    """
+    CREATE VIEW IF NOT EXISTS holdings_search_content AS
+    SELECT id, 'u' || user_id AS owner, name, note, strategy, sentiment, tags FROM holdings
+    """,
+    """
+    CREATE VIRTUAL TABLE IF NOT EXISTS holdings_fts USING fts5(
+        owner, name, note, strategy, sentiment, tags,
+        content='holdings_search_content', content_rowid='id',
+        tokenize='unicode61 remove_diacritics 2', prefix='2 3'
+    )
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS holdings_fts_after_insert AFTER INSERT ON holdings
+    BEGIN
+        INSERT INTO holdings_fts (rowid, owner, name, note, strategy, sentiment, tags)
+        VALUES (NEW.id, 'u' || NEW.user_id, NEW.name, NEW.note, NEW.strategy, NEW.sentiment, NEW.tags);
+    END
+    """,
+    # Only the indexed columns, so price refreshes never touch the index.
+    """
+    CREATE TRIGGER IF NOT EXISTS holdings_fts_after_update
+    AFTER UPDATE OF user_id, name, note, strategy, sentiment, tags ON holdings
+    BEGIN
+        INSERT INTO holdings_fts (holdings_fts, rowid, owner, name, note, strategy, sentiment, tags)
+        VALUES ('delete', OLD.id, 'u' || OLD.user_id, OLD.name, OLD.note, OLD.strategy, OLD.sentiment, OLD.tags);
+        INSERT INTO holdings_fts (rowid, owner, name, note, strategy, sentiment, tags)
+        VALUES (NEW.id, 'u' || NEW.user_id, NEW.name, NEW.note, NEW.strategy, NEW.sentiment, NEW.tags);
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS holdings_fts_after_delete AFTER DELETE ON holdings
+    BEGIN
+        INSERT INTO holdings_fts (holdings_fts, rowid, owner, name, note, strategy, sentiment, tags)
+        VALUES ('delete', OLD.id, 'u' || OLD.user_id, OLD.name, OLD.note, OLD.strategy, OLD.sentiment, OLD.tags);
+    END
+    """,
+]
+
+
+def create_holdings_search(conn: Connection) -> None:
+    for statement in HOLDINGS_SEARCH_DDL:
+        conn.execute(text(statement))
+    conn.execute(text("INSERT INTO holdings_fts (holdings_fts) VALUES ('rebuild')"))
+
+
+def ensure_users_portfolio_version(conn: Connection) -> None:
+    columns = {row[1] for row in conn.execute(text("PRAGMA table_info(users)")).fetchall()}
+    if "portfolio_version" not in columns:
+        conn.execute(text("ALTER TABLE users ADD COLUMN portfolio_version INTEGER NOT NULL DEFAULT 0"))
+
+
+def normalize_legacy_tags(conn: Connection) -> None:
+    """Databases indexed before legacy tags were rewritten: the old update trigger
+    emptied ``holding_tags`` for such rows whenever an upsert merge touched them."""
+    conn.execute(text("DROP TRIGGER IF EXISTS holding_tags_after_update"))
+    conn.execute(text(HOLDING_TAG_TRIGGERS[1]))
+    # Fires the new trigger, which re-indexes each rewritten row from its JSON.
+    rewrite_legacy_tags(conn)
+
+
+def create_stream_tickets(conn: Connection) -> None:
+    StreamTicket.__table__.create(conn, checkfirst=True)
+
+
+def casefold_tag_keys(conn: Connection) -> None:
+    # Tag keys were built with SQLite's lower(), which leaves non-ASCII letters as they are.
+    conn.execute(text("DROP TRIGGER IF EXISTS holding_tags_after_insert"))
+    conn.execute(text("DROP TRIGGER IF EXISTS holding_tags_after_update"))
+    conn.execute(text(HOLDING_TAG_TRIGGERS[0]))
+    conn.execute(text(HOLDING_TAG_TRIGGERS[1]))
+    conn.execute(text("DELETE FROM holding_tags"))
+    conn.execute(
+        text(
+            "INSERT OR IGNORE INTO holding_tags (holding_id, user_id, tag, tag_key) "
+            "SELECT holdings.id, holdings.user_id, value, casefold(value) "
+            "FROM holdings, json_each(CASE WHEN json_valid(holdings.tags) THEN holdings.tags ELSE '[]' END) "
+            "WHERE holdings.tags IS NOT NULL AND trim(value) != ''"
+        )
+    )
+
+
+def normalize_transaction_timestamps(conn: Connection) -> None:
+    # Purchases and repairs recorded through raw SQL stored their UTC offset, unlike the ORM.
+    for column in ("executed_at", "created_at"):
+        conn.execute(
+            text(
+                f"UPDATE transactions SET {column} = substr({column}, 1, length({column}) - 6) "
+                f"WHERE {column} LIKE '%+00:00'"
             )
-            conn.execute(text("UPDATE holdings SET risk_level = 'medium' WHERE risk_level IS NULL"))
+        )
+
+
+# Ordered registry; a database at version N has applied the first N entries.
+# Append only. Every step must also be a no-op on a fresh database, because the
+# first step creates tables straight from the current models.
+MIGRATIONS: list[Callable[[Connection], None]] = [
+    create_missing_tables,
+    ensure_holdings_category,
+    ensure_holdings_note,
+    ensure_holdings_tags,
+    ensure_holdings_currency,
+    ensure_holdings_current_price,
+    ensure_holdings_risk_level,
+    ensure_holdings_strategy,
+    ensure_holdings_sentiment,
+    ensure_sessions_expires_at_index,
+    ensure_holdings_user_updated_index,
+    ensure_holdings_name_key,
+    create_holding_tags,
+    create_snapshot_tables,
+    ensure_holdings_name_key_index,
+    create_idempotency_keys,
+    create_holding_changes,
+    create_transactions,
+    create_holdings_search,
+    ensure_users_portfolio_version,
+    create_stream_tickets,
+    normalize_legacy_tags,
+    normalize_transaction_timestamps,
+    casefold_tag_keys,
+]
+SCHEMA_VERSION = len(MIGRATIONS)
+
+
+def schema_version(conn: Connection) -> int:
+    try:
+        return conn.execute(text("SELECT version FROM schema_version")).scalar() or 0
+    except OperationalError:
+        return 0
 
 
-def ensure_holdings_strategy() -> None:
-    with engine.begin() as conn:
-        columns = {row[1] for row in conn.execute(text("PRAGMA table_info(holdings)")).fetchall()}
-        if "strategy" not in columns:
-            conn.execute(text("ALTER TABLE holdings ADD COLUMN strategy VARCHAR"))
+@contextmanager
+def migration_lock() -> Iterator[None]:
+    fd = os.open(MIGRATION_LOCK_PATH, os.O_RDWR | os.O_CREAT, 0o600)
+    try:
+        fcntl.flock(fd, fcntl.LOCK_EX)
+        yield
+    finally:
+        os.close(fd)
 
 
-def ensure_holdings_sentiment() -> None:
-    with engine.begin() as conn:
-        columns = {row[1] for row in conn.execute(text("PRAGMA table_info(holdings)")).fetchall()}
-        if "sentiment" not in columns:
-            conn.execute(text("ALTER TABLE holdings ADD COLUMN sentiment VARCHAR"))
+def apply_migrations(conn: Connection, start: int) -> None:
+    for migration in MIGRATIONS[start:]:
+        migration(conn)
+    conn.execute(text("CREATE TABLE IF NOT EXISTS schema_version (version INTEGER NOT NULL)"))
+    conn.execute(text("DELETE FROM schema_version"))
+    conn.execute(text("INSERT INTO schema_version (version) VALUES (:version)"), {"version": SCHEMA_VERSION})
 
 
 def run_migrations() -> None:
-    ensure_holdings_category()
-    ensure_holdings_note()
-    ensure_holdings_tags()
-    ensure_holdings_currency()
-    ensure_holdings_current_price()
-    ensure_holdings_risk_level()
-    ensure_holdings_strategy()
-    ensure_holdings_sentiment()
+    with engine.connect() as conn:
+        if schema_version(conn) >= SCHEMA_VERSION:
+            return
+    # One worker migrates while the others wait on the lock, then find the work done.
+    with migration_lock(), engine.begin() as conn:
+        # pysqlite does not open a transaction for DDL on its own.
+        conn.exec_driver_sql("BEGIN IMMEDIATE")
+        current = schema_version(conn)
+        if current < SCHEMA_VERSION:
+            apply_migrations(conn, current)
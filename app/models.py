@@ -2,7 +2,7 @@ from __future__ import annotations
 
 from datetime import datetime
 
-from sqlalchemy import DateTime, Float, ForeignKey, Integer, String, UniqueConstraint
+from sqlalchemy import DateTime, Float, ForeignKey, Index, Integer, String, UniqueConstraint, text
 from sqlalchemy.orm import DeclarativeBase, Mapped, mapped_column, relationship
 
 
@@ -17,6 +17,8 @@ class User(Base):
     email: Mapped[str] = mapped_column(String, unique=True, nullable=False)
     password_hash: Mapped[str] = mapped_column(String, nullable=False)
     created_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), nullable=False)
+    # Bumped with every change to the user's holdings; the ETag of portfolio reads.
+    portfolio_version: Mapped[int] = mapped_column(Integer, nullable=False, default=0, server_default=text("0"))
 
     holdings: Mapped[list["Holding"]] = relationship("Holding", back_populates="user")
     sessions: Mapped[list["Session"]] = relationship("Session", back_populates="user")
@@ -24,11 +26,17 @@ class User(Base):
 
 class Holding(Base):
     __tablename__ = "holdings"
-    __table_args__ = (UniqueConstraint("user_id", "name", name="uq_holdings_user_name"),)
+    __table_args__ = (
+        UniqueConstraint("user_id", "name", name="uq_holdings_user_name"),
+        Index("ix_holdings_user_updated_id", "user_id", "updated_at", "id"),
+        Index("uq_holdings_user_name_key", "user_id", "name_key", unique=True),
+        Index("ix_holdings_name_key", "name_key"),
+    )
 
     id: Mapped[int] = mapped_column(Integer, primary_key=True, autoincrement=True)
     user_id: Mapped[int] = mapped_column(ForeignKey("users.id"), nullable=False)
     name: Mapped[str] = mapped_column(String, nullable=False)
+    name_key: Mapped[str] = mapped_column(String, nullable=False)
     category: Mapped[str] = mapped_column(String, nullable=False, default="股票")
     quantity: Mapped[float] = mapped_column(Float, nullable=False)
     total_cost: Mapped[float] = mapped_column(Float, nullable=False)
@@ -39,19 +47,150 @@ class Holding(Base):
     sentiment: Mapped[str | None] = mapped_column(String, nullable=True)
     tags: Mapped[str | None] = mapped_column(String, nullable=True)
     note: Mapped[str | None] = mapped_column(String, nullable=True)
+    cost_method: Mapped[str] = mapped_column(String, nullable=False, default="average", server_default="average")
+    realized_pnl: Mapped[float] = mapped_column(Float, nullable=False, default=0.0, server_default=text("0"))
     created_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), nullable=False)
     updated_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), nullable=False)
 
     user: Mapped["User"] = relationship("User", back_populates="holdings")
 
 
+class Transaction(Base):
+    """Ledger entry behind a holding's quantity, cost and realized P&L.
+
+    ``buy``/``sell``/``fee`` are trades; ``adjust`` records an edit or opening balance
+    as quantity and cost deltas. Under FIFO, buys and adjustments with
+    ``open_quantity > 0`` are the holding's open lots.
+    """
+
+    __tablename__ = "transactions"
+    __table_args__ = (
+        Index("ix_transactions_holding_id", "holding_id", "id"),
+        # Covers the FIFO lot lookup, so a sale never reads a holding's closed entries.
+        Index(
+            "ix_transactions_open_lots",
+            "holding_id",
+            "id",
+            "open_quantity",
+            "open_cost",
+            sqlite_where=text("open_quantity > 0"),
+        ),
+    )
+
+    id: Mapped[int] = mapped_column(Integer, primary_key=True, autoincrement=True)
+    user_id: Mapped[int] = mapped_column(ForeignKey("users.id"), nullable=False)
+    holding_id: Mapped[int] = mapped_column(ForeignKey("holdings.id"), nullable=False)
+    kind: Mapped[str] = mapped_column(String, nullable=False)
+    quantity: Mapped[float] = mapped_column(Float, nullable=False)
+    amount: Mapped[float] = mapped_column(Float, nullable=False)
+    realized_pnl: Mapped[float] = mapped_column(Float, nullable=False, default=0.0)
+    open_quantity: Mapped[float | None] = mapped_column(Float, nullable=True)
+    open_cost: Mapped[float | None] = mapped_column(Float, nullable=True)
+    executed_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), nullable=False)
+    created_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), nullable=False)
+
+
+class HoldingTag(Base):
+    """One row per tag of a holding, kept in sync with ``holdings.tags`` by triggers."""
+
+    __tablename__ = "holding_tags"
+    __table_args__ = (
+        Index("ix_holding_tags_user_tag", "user_id", "tag_key"),
+        {"sqlite_with_rowid": False},
+    )
+
+    holding_id: Mapped[int] = mapped_column(ForeignKey("holdings.id"), primary_key=True)
+    tag_key: Mapped[str] = mapped_column(String, primary_key=True)
+    user_id: Mapped[int] = mapped_column(ForeignKey("users.id"), nullable=False)
+    tag: Mapped[str] = mapped_column(String, nullable=False)
+
+
 class Session(Base):
     __tablename__ = "sessions"
 
     id: Mapped[int] = mapped_column(Integer, primary_key=True, autoincrement=True)
     user_id: Mapped[int] = mapped_column(ForeignKey("users.id"), nullable=False)
     token: Mapped[str] = mapped_column(String, unique=True, nullable=False)
-    expires_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), nullable=False)
+    expires_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), nullable=False, index=True)
     created_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), nullable=False)
 
     user: Mapped["User"] = relationship("User", back_populates="sessions")
+
+
+class StreamTicket(Base):
+    """Single-use, short-lived stand-in for a session token in the change stream's URL."""
+
+    __tablename__ = "stream_tickets"
+
+    ticket: Mapped[str] = mapped_column(String, primary_key=True)
+    session_token: Mapped[str] = mapped_column(String, nullable=False)
+    expires_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), nullable=False, index=True)
+
+
+class IdempotencyKey(Base):
+    """Stored response of a batch request, replayed when the client retries with the same key."""
+
+    __tablename__ = "idempotency_keys"
+
+    user_id: Mapped[int] = mapped_column(ForeignKey("users.id"), primary_key=True)
+    key: Mapped[str] = mapped_column(String, primary_key=True)
+    request_hash: Mapped[str] = mapped_column(String, nullable=False)
+    response_body: Mapped[str] = mapped_column(String, nullable=False)
+    created_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), nullable=False, index=True)
+
+
+class FxRate(Base):
+    __tablename__ = "fx_rates"
+
+    currency: Mapped[str] = mapped_column(String, primary_key=True)
+    rate_to_usd: Mapped[float] = mapped_column(Float, nullable=False)
+    updated_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), nullable=False)
+
+
+class HoldingChange(Base):
+    """Append-only log of holding mutations, written by triggers and tailed by the change stream."""
+
+    __tablename__ = "holding_changes"
+    __table_args__ = (
+        Index("ix_holding_changes_user_id", "user_id", "id"),
+        {"sqlite_autoincrement": True},
+    )
+
+    id: Mapped[int] = mapped_column(Integer, primary_key=True, autoincrement=True)
+    user_id: Mapped[int] = mapped_column(Integer, nullable=False)
+    holding_id: Mapped[int] = mapped_column(Integer, nullable=False)
+    kind: Mapped[str] = mapped_column(String, nullable=False)
+
+
+class HoldingSnapshot(Base):
+    """Append-only per-holding history; ``taken_at`` is a Unix timestamp, amounts are USD."""
+
+    __tablename__ = "holding_snapshots"
+    __table_args__ = ({"sqlite_with_rowid": False},)
+
+    user_id: Mapped[int] = mapped_column(Integer, primary_key=True)
+    holding_id: Mapped[int] = mapped_column(Integer, primary_key=True)
+    taken_at: Mapped[int] = mapped_column(Integer, primary_key=True)
+    value: Mapped[float] = mapped_column(Float, nullable=False)
+    cost: Mapped[float] = mapped_column(Float, nullable=False)
+
+
+class PortfolioSnapshot(Base):
+    """Per-user totals of one snapshot run, so history reads do not scale with holdings."""
+
+    __tablename__ = "portfolio_snapshots"
+    __table_args__ = ({"sqlite_with_rowid": False},)
+
+    user_id: Mapped[int] = mapped_column(Integer, primary_key=True)
+    taken_at: Mapped[int] = mapped_column(Integer, primary_key=True)
+    value: Mapped[float] = mapped_column(Float, nullable=False)
+    cost: Mapped[float] = mapped_column(Float, nullable=False)
+    holding_count: Mapped[int] = mapped_column(Integer, nullable=False)
+
+
+class SnapshotRun(Base):
+    __tablename__ = "snapshot_runs"
+
+    taken_at: Mapped[int] = mapped_column(Integer, primary_key=True)
+    holding_count: Mapped[int] = mapped_column(Integer, nullable=False)
+    duration_ms: Mapped[float] = mapped_column(Float, nullable=False)
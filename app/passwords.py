@@ -0,0 +1,100 @@
+import asyncio
+import hashlib
+import multiprocessing
+import os
+import secrets
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from fastapi import HTTPException, status
+
+from app.metrics import observe_password_hash
+
+HASH_SCHEME = "pbkdf2_sha256"
+PBKDF2_ITERATIONS = int(os.environ.get("PORTFOLIO_PBKDF2_ITERATIONS", "100000"))
+LEGACY_ITERATIONS = 100_000
+HASH_WORKERS = int(os.environ.get("PORTFOLIO_HASH_WORKERS", str(min(2, os.cpu_count() or 1))))
+HASH_QUEUE_DEPTH = int(os.environ.get("PORTFOLIO_HASH_QUEUE_DEPTH", "8"))
+HASH_RETRY_AFTER_SECONDS = 1
+
+
+def _pbkdf2(password: str, salt: str, iterations: int) -> str:
+    return hashlib.pbkdf2_hmac("sha256", password.encode(), salt.encode(), iterations).hex()
+
+
+def hash_password(password: str, iterations: int = PBKDF2_ITERATIONS) -> str:
+    salt = secrets.token_hex(16)
+    return f"{HASH_SCHEME}${iterations}${salt}${_pbkdf2(password, salt, iterations)}"
+
+
+def parse_hash(stored: str) -> tuple[int, str, str] | None:
+    """Return ``(iterations, salt, hex digest)``; bare ``salt$hash`` values predate the scheme prefix."""
+    parts = stored.split("$")
+    if len(parts) == 2:
+        return LEGACY_ITERATIONS, parts[0], parts[1]
+    if len(parts) == 4 and parts[0] == HASH_SCHEME and parts[1].isdigit():
+        return int(parts[1]), parts[2], parts[3]
+    return None
+
+
+def verify_password(password: str, stored: str) -> bool:
+    parsed = parse_hash(stored)
+    if not parsed:
+        return False
+    iterations, salt, hashed = parsed
+    return secrets.compare_digest(_pbkdf2(password, salt, iterations), hashed)
+
+
+def needs_rehash(stored: str) -> bool:
+    parsed = parse_hash(stored)
+    return parsed is None or parsed[0] != PBKDF2_ITERATIONS or not stored.startswith(f"{HASH_SCHEME}$")
+
+
+class HashingPool:
+    """Runs PBKDF2 in a bounded process pool so hashing bursts cannot stall the event loop.
+
+    At most ``workers`` hashes run at once and ``queue_depth`` more may wait; anything beyond
+    that is rejected immediately with 503 and ``Retry-After``.
+    """
+
+    def __init__(self, workers: int, queue_depth: int):
+        self.workers = workers
+        self.queue_depth = queue_depth
+        self._slots = threading.BoundedSemaphore(max(1, workers + queue_depth))
+        self._executor: ProcessPoolExecutor | None = None
+        self._lock = threading.Lock()
+
+    def _get_executor(self) -> ProcessPoolExecutor:
+        if self._executor is None:
+            with self._lock:
+                if self._executor is None:
+                    self._executor = ProcessPoolExecutor(
+                        max_workers=self.workers, mp_context=multiprocessing.get_context("spawn")
+                    )
+        return self._executor
+
+    async def run(self, fn, *args):
+        if not self._slots.acquire(blocking=False):
+            raise HTTPException(
+                status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                detail="Server is busy, please retry shortly.",
+                headers={"Retry-After": str(HASH_RETRY_AFTER_SECONDS)},
+            )
+        started = time.perf_counter()
+        try:
+            if self.workers <= 0:
+                return await asyncio.to_thread(fn, *args)
+            return await asyncio.wrap_future(self._get_executor().submit(fn, *args))
+        finally:
+            self._slots.release()
+            observe_password_hash(fn.__name__, time.perf_counter() - started)
+
+    def shutdown(self) -> None:
+        with self._lock:
+            if self._executor is not None:
+                self._executor.shutdown(wait=False, cancel_futures=True)
+                self._executor = None
+
+
+hashing_pool = HashingPool(HASH_WORKERS, HASH_QUEUE_DEPTH)
@@ -1,43 +1,248 @@
-from fastapi import APIRouter, Depends, HTTPException, status
-from sqlalchemy import func, select
+import hashlib
 
-from app.auth import now_utc, require_user
-from app.db import get_db
-from app.models import Holding, User
-from app.portfolio_utils import decode_tags, encode_tags, normalize_portfolio_payload
-from app.schemas import HoldingResponse, PortfolioPayload
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response, status
+from fastapi.responses import JSONResponse
+from sqlalchemy import func, select, tuple_, update
+from sqlalchemy.dialects.sqlite import insert
+from sqlalchemy.exc import IntegrityError
+
+from app.auth import as_utc, now_utc, require_user
+from app.db import get_async_db
+from app.ledger import RECORD_BUY, change_cost_method, record_adjustment, record_trade
+from app.models import Holding, HoldingTag, Transaction, User
+from app.portfolio_utils import (
+    decode_cursor,
+    decode_tags,
+    encode_cursor,
+    encode_tags,
+    holding_name_key,
+    normalize_portfolio_payload,
+)
+from app.schemas import (
+    BreakdownEntry,
+    HoldingResponse,
+    PortfolioPayload,
+    PortfolioSummary,
+    TagFacet,
+    TradePayload,
+    TradeResponse,
+    TransactionResponse,
+)
+
+MAX_PAGE_SIZE = 500
+NEXT_CURSOR_HEADER = "X-Next-Cursor"
+# Browsers keep portfolio reads but revalidate them with If-None-Match every time.
+PORTFOLIO_CACHE_CONTROL = "private, no-cache"
+# Selected in ``HoldingResponse`` field order.
+HOLDING_COLUMNS = (
+    Holding.id,
+    Holding.name,
+    Holding.category,
+    Holding.quantity,
+    Holding.total_cost,
+    Holding.currency,
+    Holding.current_price,
+    Holding.risk_level,
+    Holding.strategy,
+    Holding.sentiment,
+    Holding.tags,
+    Holding.note,
+    Holding.cost_method,
+    Holding.realized_pnl,
+)
 
 router = APIRouter()
 
 
+def holding_document(row) -> dict:
+    """``HoldingResponse`` as a plain dict, built from a row of ``HOLDING_COLUMNS``.
+
+    Handlers return it in a ``JSONResponse``, which renders exactly what FastAPI would
+    produce from the model without validating every row a second time.
+    """
+    (
+        holding_id,
+        name,
+        category,
+        quantity,
+        total_cost,
+        currency,
+        current_price,
+        risk_level,
+        strategy,
+        sentiment,
+        tags,
+        note,
+        cost_method,
+        realized_pnl,
+        *_,
+    ) = row
+    return {
+        "id": holding_id,
+        "name": name,
+        "category": category,
+        "quantity": float(quantity),
+        "totalCost": float(total_cost),
+        "currency": currency,
+        "currentPrice": None if current_price is None else float(current_price),
+        "riskLevel": risk_level,
+        "strategy": strategy,
+        "sentiment": sentiment,
+        "tags": decode_tags(tags) if tags else [],
+        "note": note,
+        "costMethod": cost_method,
+        "realizedPnl": float(realized_pnl),
+    }
+
+
+def holding_row(holding: Holding) -> tuple:
+    return tuple(getattr(holding, column.key) for column in HOLDING_COLUMNS)
+
+
+def bump_portfolio_version(user_id: int):
+    """Run in the same transaction as any change to the user's holdings."""
+    return (
+        update(User)
+        .where(User.id == user_id)
+        .values(portfolio_version=User.portfolio_version + 1)
+        .execution_options(synchronize_session=False)
+    )
+
+
+async def portfolio_cache_headers(request: Request, db, user_id: int) -> tuple[dict[str, str], Response | None]:
+    """ETag headers for a read of the user's holdings, plus a 304 to return instead of
+    running the read when ``If-None-Match`` already names the current version.
+
+    The ETag covers the user, their ``portfolio_version`` and the path and query. The
+    version is read first: a write landing before the holdings are read only leaves the
+    ETag older than the body, costing a refetch later but never a stale 304. It is
+    not taken from the cached session user, which can be out of date.
+    """
+    version = (await db.execute(select(User.portfolio_version).where(User.id == user_id))).scalar_one()
+    query = f"{request.url.path}?{sorted(request.query_params.multi_items())}"
+    digest = hashlib.sha256(query.encode()).hexdigest()[:16]
+    etag = f'"{user_id}.{version}.{digest}"'
+    headers = {"ETag": etag, "Cache-Control": PORTFOLIO_CACHE_CONTROL}
+    if_none_match = request.headers.get("if-none-match", "")
+    if if_none_match and etag in (tag.strip().removeprefix("W/") for tag in if_none_match.split(",")):
+        return headers, Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+    return headers, None
+
+
+def tagged_holding_ids(user_id: int, tag: str):
+    """Ids of the user's holdings carrying ``tag`` (case-insensitive), from the tag index."""
+    return select(HoldingTag.holding_id).where(
+        HoldingTag.user_id == user_id, HoldingTag.tag_key == func.casefold(tag.strip())
+    )
+
+
+def with_tags(query, user_id: int, tags: list[str]):
+    for tag in tags:
+        query = query.where(Holding.id.in_(tagged_holding_ids(user_id, tag)))
+    return query
+
+
 @router.get("/api/portfolio", response_model=list[HoldingResponse])
-def list_portfolio(user: User = Depends(require_user), db=Depends(get_db)):
-    holdings = (
-        db.execute(select(Holding).where(Holding.user_id == user.id).order_by(Holding.updated_at.desc()))
-        .scalars()
-        .all()
+async def list_portfolio(
+    request: Request,
+    limit: int | None = Query(default=None, ge=1, le=MAX_PAGE_SIZE),
+    cursor: str | None = None,
+    tag: list[str] = Query(default=[]),
+    user: User = Depends(require_user),
+    db=Depends(get_async_db),
+):
+    headers, not_modified = await portfolio_cache_headers(request, db, user.id)
+    if not_modified:
+        return not_modified
+    query = (
+        select(*HOLDING_COLUMNS, Holding.updated_at)
+        .where(Holding.user_id == user.id)
+        .order_by(Holding.updated_at.desc(), Holding.id.desc())
     )
-    return [
-        HoldingResponse(
-            id=holding.id,
-            name=holding.name,
-            category=holding.category,
-            quantity=holding.quantity,
-            totalCost=holding.total_cost,
-            currency=holding.currency,
-            currentPrice=holding.current_price,
-            riskLevel=holding.risk_level,
-            strategy=holding.strategy,
-            sentiment=holding.sentiment,
-            tags=decode_tags(holding.tags),
-            note=holding.note,
+    query = with_tags(query, user.id, tag)
+    if cursor:
+        updated_at, holding_id = decode_cursor(cursor)
+        query = query.where(tuple_(Holding.updated_at, Holding.id) < tuple_(updated_at, holding_id))
+    if limit is not None:
+        query = query.limit(limit + 1)
+    rows = (await db.execute(query)).all()
+    if limit is not None and len(rows) > limit:
+        rows = rows[:limit]
+        last = rows[-1]
+        headers[NEXT_CURSOR_HEADER] = encode_cursor(last.updated_at, last.id)
+    return JSONResponse([holding_document(row) for row in rows], headers=headers)
+
+
+async def breakdown(db, user_id: int, column) -> list[BreakdownEntry]:
+    rows = (await db.execute(
+        select(column, func.count(Holding.id), func.coalesce(func.sum(Holding.total_cost), 0.0))
+        .where(Holding.user_id == user_id)
+        .group_by(column)
+        .order_by(func.sum(Holding.total_cost).desc())
+    )).all()
+    return [BreakdownEntry(key=key, count=count, totalCost=total) for key, count, total in rows]
+
+
+async def tag_breakdown(db, user_id: int) -> list[BreakdownEntry]:
+    rows = (await db.execute(
+        select(func.min(HoldingTag.tag), func.count(), func.sum(Holding.total_cost))
+        .join(Holding, Holding.id == HoldingTag.holding_id)
+        .where(HoldingTag.user_id == user_id)
+        .group_by(HoldingTag.tag_key)
+        .order_by(func.sum(Holding.total_cost).desc())
+    )).all()
+    return [BreakdownEntry(key=key, count=count, totalCost=total) for key, count, total in rows]
+
+
+@router.get("/api/portfolio/summary", response_model=PortfolioSummary)
+async def portfolio_summary(
+    request: Request, response: Response, user: User = Depends(require_user), db=Depends(get_async_db)
+):
+    headers, not_modified = await portfolio_cache_headers(request, db, user.id)
+    if not_modified:
+        return not_modified
+    response.headers.update(headers)
+    asset_count, total_cost = (await db.execute(
+        select(func.count(Holding.id), func.coalesce(func.sum(Holding.total_cost), 0.0)).where(
+            Holding.user_id == user.id
         )
-        for holding in holdings
-    ]
+    )).one()
+    return PortfolioSummary(
+        assetCount=asset_count,
+        totalCost=total_cost,
+        byCategory=await breakdown(db, user.id, Holding.category),
+        byCurrency=await breakdown(db, user.id, Holding.currency),
+        byRiskLevel=await breakdown(db, user.id, Holding.risk_level),
+        byTag=await tag_breakdown(db, user.id),
+    )
 
 
-@router.post("/api/portfolio", response_model=HoldingResponse)
-def add_portfolio(payload: PortfolioPayload, user: User = Depends(require_user), db=Depends(get_db)):
+@router.get("/api/portfolio/tags", response_model=list[TagFacet])
+async def portfolio_tags(
+    request: Request,
+    response: Response,
+    tag: list[str] = Query(default=[]),
+    user: User = Depends(require_user),
+    db=Depends(get_async_db),
+):
+    """Holding count per tag, among the holdings that carry every ``tag`` given."""
+    headers, not_modified = await portfolio_cache_headers(request, db, user.id)
+    if not_modified:
+        return not_modified
+    response.headers.update(headers)
+    query = (
+        select(func.min(HoldingTag.tag), func.count())
+        .where(HoldingTag.user_id == user.id)
+        .group_by(HoldingTag.tag_key)
+        .order_by(func.count().desc(), HoldingTag.tag_key)
+    )
+    for selected in tag:
+        query = query.where(HoldingTag.holding_id.in_(tagged_holding_ids(user.id, selected)))
+    rows = (await db.execute(query)).all()
+    return [TagFacet(tag=name, count=count) for name, count in rows]
+
+
+def holding_values(user_id: int, payload: PortfolioPayload, now) -> dict:
     (
         name,
         category,
@@ -49,85 +254,76 @@ def add_portfolio(payload: PortfolioPayload, user: User = Depends(require_user),
         strategy,
         sentiment,
     ) = normalize_portfolio_payload(payload)
+    return {
+        "user_id": user_id,
+        "name": name,
+        "name_key": holding_name_key(name),
+        "category": category,
+        "quantity": payload.quantity,
+        "total_cost": payload.cost,
+        "currency": currency,
+        "current_price": current_price,
+        "risk_level": risk_level,
+        "strategy": strategy,
+        "sentiment": sentiment,
+        "tags": encode_tags(tags),
+        "note": note,
+        "cost_method": payload.costMethod or "average",
+        "created_at": now,
+        "updated_at": now,
+    }
 
-    holding = db.execute(
-        select(Holding).where(
-            Holding.user_id == user.id, func.lower(Holding.name) == name.lower()
-        )
-    ).scalar_one_or_none()
-    now = now_utc()
-
-    if holding:
-        holding.quantity += payload.quantity
-        holding.total_cost += payload.cost
-        holding.category = category
-        holding.currency = currency
-        holding.current_price = current_price
-        holding.risk_level = risk_level
-        holding.strategy = strategy
-        holding.sentiment = sentiment
-        if tags:
-            merged_tags = {tag.lower(): tag for tag in decode_tags(holding.tags)}
-            for tag in tags:
-                merged_tags[tag.lower()] = tag
-            holding.tags = encode_tags(list(merged_tags.values()))
-        holding.note = note
-        holding.updated_at = now
-        db.commit()
-        return HoldingResponse(
-            id=holding.id,
-            name=holding.name,
-            category=holding.category,
-            quantity=holding.quantity,
-            totalCost=holding.total_cost,
-            currency=holding.currency,
-            currentPrice=holding.current_price,
-            riskLevel=holding.risk_level,
-            strategy=holding.strategy,
-            sentiment=holding.sentiment,
-            tags=decode_tags(holding.tags),
-            note=holding.note,
-        )
 
-    holding = Holding(
-        user_id=user.id,
-        name=name,
-        category=category,
-        quantity=payload.quantity,
-        total_cost=payload.cost,
-        currency=currency,
-        current_price=current_price,
-        risk_level=risk_level,
-        strategy=strategy,
-        sentiment=sentiment,
-        tags=encode_tags(tags),
-        note=note,
-        created_at=now,
-        updated_at=now,
-    )
-    db.add(holding)
-    db.commit()
-    db.refresh(holding)
-    return HoldingResponse(
-        id=holding.id,
-        name=holding.name,
-        category=holding.category,
-        quantity=holding.quantity,
-        totalCost=holding.total_cost,
-        currency=holding.currency,
-        currentPrice=holding.current_price,
-        riskLevel=holding.risk_level,
-        strategy=holding.strategy,
-        sentiment=holding.sentiment,
-        tags=decode_tags(holding.tags),
-        note=holding.note,
+def upsert_holding_statement():
+    """INSERT a holding, or merge the purchase into the existing one with the same name key."""
+    statement = insert(Holding)
+    excluded = statement.excluded
+    return statement.on_conflict_do_update(
+        index_elements=[Holding.user_id, Holding.name_key],
+        set_={
+            "quantity": Holding.quantity + excluded.quantity,
+            "total_cost": Holding.total_cost + excluded.total_cost,
+            "category": excluded.category,
+            "currency": excluded.currency,
+            "current_price": excluded.current_price,
+            "risk_level": excluded.risk_level,
+            "strategy": excluded.strategy,
+            "sentiment": excluded.sentiment,
+            "tags": func.merge_tags(Holding.tags, excluded.tags),
+            "note": excluded.note,
+            "updated_at": excluded.updated_at,
+        },
     )
 
 
-@router.put("/api/portfolio/{holding_id}", response_model=HoldingResponse)
-def update_portfolio(
-    holding_id: int, payload: PortfolioPayload, user: User = Depends(require_user), db=Depends(get_db)
+async def add_holding(db, user_id: int, payload: PortfolioPayload) -> Holding:
+    """Create the holding or merge the purchase into an existing one with the same name.
+
+    The caller owns the transaction; nothing is committed here.
+    """
+    values = holding_values(user_id, payload, now_utc())
+    holding = (
+        await db.scalars(
+            upsert_holding_statement().values(**values).returning(Holding),
+            execution_options={"populate_existing": True},
+        )
+    ).one()
+    await db.execute(RECORD_BUY, values)
+    await db.execute(bump_portfolio_version(user_id))
+    return holding
+
+
+@router.post("/api/portfolio", response_model=HoldingResponse)
+async def add_portfolio(
+    payload: PortfolioPayload, user: User = Depends(require_user), db=Depends(get_async_db)
 ):
+    holding = await add_holding(db, user.id, payload)
+    await db.commit()
+    return JSONResponse(holding_document(holding_row(holding)))
+
+
+async def update_holding(db, user_id: int, holding_id: int, payload: PortfolioPayload) -> Holding:
+    """Overwrite a holding from ``payload``. The caller owns the transaction."""
     (
         next_name,
         category,
@@ -140,29 +336,29 @@ def update_portfolio(
         sentiment,
     ) = normalize_portfolio_payload(payload)
 
-    holding = db.execute(
-        select(Holding).where(Holding.id == holding_id, Holding.user_id == user.id)
-    ).scalar_one_or_none()
+    holding = (await db.execute(
+        select(Holding).where(Holding.id == holding_id, Holding.user_id == user_id)
+    )).scalar_one_or_none()
     if not holding:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Holding not found.")
 
-    if next_name != holding.name:
-        conflict = db.execute(
-            select(Holding).where(
-                Holding.user_id == user.id,
-                func.lower(Holding.name) == next_name.lower(),
-                Holding.id != holding.id,
-            )
-        ).scalar_one_or_none()
+    # Compared by name: rows the migration keyed as ``key#id`` keep that key until renamed.
+    next_name_key = holding_name_key(next_name)
+    if next_name_key != holding_name_key(holding.name):
+        conflict = (await db.execute(
+            select(Holding.id).where(Holding.user_id == user_id, Holding.name_key == next_name_key)
+        )).scalar_one_or_none()
         if conflict:
             raise HTTPException(
                 status_code=status.HTTP_409_CONFLICT, detail="Holding name already exists."
             )
+        holding.name_key = next_name_key
 
     holding.name = next_name
     holding.category = category
-    holding.quantity = payload.quantity
-    holding.total_cost = payload.cost
+    if payload.costMethod and payload.costMethod != holding.cost_method:
+        await change_cost_method(db, holding, payload.costMethod)
+    await record_adjustment(db, holding, payload.quantity, payload.cost)
     holding.currency = currency
     holding.current_price = current_price
     holding.risk_level = risk_level
@@ -171,29 +367,86 @@ def update_portfolio(
     holding.tags = encode_tags(tags)
     holding.note = note
     holding.updated_at = now_utc()
-    db.commit()
-    return HoldingResponse(
-        id=holding.id,
-        name=holding.name,
-        category=holding.category,
-        quantity=holding.quantity,
-        totalCost=holding.total_cost,
-        currency=holding.currency,
-        currentPrice=holding.current_price,
-        riskLevel=holding.risk_level,
-        strategy=holding.strategy,
-        sentiment=holding.sentiment,
-        tags=decode_tags(holding.tags),
-        note=holding.note,
-    )
+    await db.execute(bump_portfolio_version(user_id))
+    return holding
+
+
+async def delete_holding(db, user_id: int, holding_id: int) -> bool:
+    holding = (await db.execute(
+        select(Holding).where(Holding.id == holding_id, Holding.user_id == user_id)
+    )).scalar_one_or_none()
+    if not holding:
+        return False
+    await db.delete(holding)
+    await db.execute(bump_portfolio_version(user_id))
+    return True
+
+
+@router.put("/api/portfolio/{holding_id}", response_model=HoldingResponse)
+async def update_portfolio(
+    holding_id: int, payload: PortfolioPayload, user: User = Depends(require_user), db=Depends(get_async_db)
+):
+    try:
+        # The ledger queries autoflush the renamed row, so a concurrent rename can fail before commit.
+        holding = await update_holding(db, user.id, holding_id, payload)
+        await db.commit()
+    except IntegrityError:
+        await db.rollback()
+        raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail="Holding name already exists.")
+    return JSONResponse(holding_document(holding_row(holding)))
 
 
 @router.delete("/api/portfolio/{holding_id}")
-def delete_portfolio(holding_id: int, user: User = Depends(require_user), db=Depends(get_db)):
-    holding = db.execute(
-        select(Holding).where(Holding.id == holding_id, Holding.user_id == user.id)
-    ).scalar_one_or_none()
-    if holding:
-        db.delete(holding)
-        db.commit()
+async def delete_portfolio(holding_id: int, user: User = Depends(require_user), db=Depends(get_async_db)):
+    if await delete_holding(db, user.id, holding_id):
+        await db.commit()
     return {"ok": True}
+
+
+def transaction_document(entry: Transaction) -> dict:
+    return {
+        "id": entry.id,
+        "kind": entry.kind,
+        "quantity": entry.quantity,
+        "amount": entry.amount,
+        "realizedPnl": entry.realized_pnl,
+        "executedAt": as_utc(entry.executed_at).isoformat(),
+    }
+
+
+@router.post("/api/portfolio/{holding_id}/transactions", response_model=TradeResponse)
+async def add_transaction(
+    holding_id: int, payload: TradePayload, user: User = Depends(require_user), db=Depends(get_async_db)
+):
+    holding = (await db.execute(
+        select(Holding).where(Holding.id == holding_id, Holding.user_id == user.id)
+    )).scalar_one_or_none()
+    if not holding:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Holding not found.")
+    entry = await record_trade(db, holding, payload.kind, payload.quantity, payload.amount, payload.executedAt)
+    await db.execute(bump_portfolio_version(user.id))
+    await db.commit()
+    return JSONResponse({"holding": holding_document(holding_row(holding)), "transaction": transaction_document(entry)})
+
+
+@router.get("/api/portfolio/{holding_id}/transactions", response_model=list[TransactionResponse])
+async def list_transactions(
+    request: Request,
+    holding_id: int,
+    after: int | None = Query(default=None, ge=0),
+    limit: int = Query(default=100, ge=1, le=MAX_PAGE_SIZE),
+    user: User = Depends(require_user),
+    db=Depends(get_async_db),
+):
+    """The holding's ledger, oldest first; ``X-Next-Cursor`` is the ``after`` of the next page."""
+    headers, not_modified = await portfolio_cache_headers(request, db, user.id)
+    if not_modified:
+        return not_modified
+    query = select(Transaction).where(Transaction.holding_id == holding_id, Transaction.user_id == user.id)
+    if after is not None:
+        query = query.where(Transaction.id > after)
+    entries = (await db.scalars(query.order_by(Transaction.id).limit(limit + 1))).all()
+    if len(entries) > limit:
+        entries = entries[:limit]
+        headers[NEXT_CURSOR_HEADER] = str(entries[-1].id)
+    return JSONResponse([transaction_document(entry) for entry in entries], headers=headers)
@@ -1,4 +1,6 @@
+import base64
 import json
+from datetime import datetime
 
 from fastapi import HTTPException, status
 
@@ -26,6 +28,10 @@ def normalize_name(name: str) -> str:
     return " ".join(name.strip().split())
 
 
+def holding_name_key(name: str) -> str:
+    return normalize_name(name).lower()
+
+
 def normalize_category(raw_category: str) -> str | None:
     raw_category = raw_category.strip()
     return CATEGORY_MAP.get(raw_category) or CATEGORY_MAP.get(raw_category.lower())
@@ -59,6 +65,11 @@ def normalize_sentiment(raw_sentiment: str | None) -> str | None:
     return cleaned
 
 
+def tag_key(tag: str) -> str:
+    """Case-insensitive form of a tag, registered as the ``casefold`` SQL function for the tag index."""
+    return tag.casefold()
+
+
 def normalize_tags(tags: list[str]) -> list[str]:
     if not tags:
         return []
@@ -70,7 +81,7 @@ def normalize_tags(tags: list[str]) -> list[str]:
             continue
         if len(cleaned) > MAX_TAG_LENGTH:
             raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid tag.")
-        key = cleaned.lower()
+        key = tag_key(cleaned)
         if key in seen:
             continue
         seen.add(key)
@@ -98,6 +109,33 @@ def decode_tags(raw: str | None) -> list[str]:
     return [tag.strip() for tag in raw.split(",") if tag.strip()]
 
 
+def merge_tags(existing: str | None, incoming: str | None) -> str | None:
+    """Union of two encoded tag lists, case-insensitive, incoming spelling wins.
+
+    Registered as the ``merge_tags`` SQL function so upserts can merge tags in one statement.
+    """
+    if not incoming:
+        return existing
+    merged = {tag_key(tag): tag for tag in decode_tags(existing)}
+    for tag in decode_tags(incoming):
+        merged[tag_key(tag)] = tag
+    return encode_tags(list(merged.values()))
+
+
+def encode_cursor(updated_at: datetime, holding_id: int) -> str:
+    raw = f"{updated_at.isoformat()}|{holding_id}".encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> tuple[datetime, int]:
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)).decode()
+        updated_at, holding_id = raw.rsplit("|", 1)
+        return datetime.fromisoformat(updated_at), int(holding_id)
+    except ValueError:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid cursor.")
+
+
 def normalize_portfolio_payload(
     payload: PortfolioPayload,
 ) -> tuple[str, str, str | None, list[str], str, float | None, str, str | None, str | None]:
@@ -0,0 +1,122 @@
+import argparse
+import csv
+import json
+import math
+from pathlib import Path
+
+from fastapi import APIRouter, Depends, HTTPException, status
+from sqlalchemy import text
+
+from app.auth import require_admin
+from app.db import SessionLocal, get_async_db
+from app.portfolio_utils import holding_name_key, normalize_name
+from app.schemas import PriceUpdatePayload, PriceUpdateResponse
+
+# Small price maps update through ix_holdings_name_key lookups; past this many names a
+# single scan of holdings is cheaper (crossover measured at ~200 names on 1M holdings).
+PRICE_SCAN_THRESHOLD = 200
+PRICE_LOOKUP_UPDATE = (
+    "UPDATE holdings SET current_price = "
+    "(SELECT price FROM temp.price_updates AS updates WHERE updates.name_key = holdings.name_key) "
+    "WHERE name_key IN (SELECT name_key FROM temp.price_updates) "
+    "AND current_price IS NOT "
+    "(SELECT price FROM temp.price_updates AS updates WHERE updates.name_key = holdings.name_key)"
+)
+PRICE_SCAN_UPDATE = (
+    "UPDATE holdings SET current_price = updates.price "
+    "FROM temp.price_updates AS updates "
+    "WHERE holdings.name_key = updates.name_key AND holdings.current_price IS NOT updates.price"
+)
+# The holding_changes triggers log every holding the price UPDATE touched, with its
+# owner; reading them back by id range is cheaper than re-joining holdings.
+PRICE_VERSION_BUMP = (
+    "UPDATE users SET portfolio_version = portfolio_version + 1 WHERE id IN "
+    "(SELECT user_id FROM holding_changes WHERE id > :last_change_id)"
+)
+
+router = APIRouter()
+
+
+def import_prices(db, prices: dict[str, float]) -> PriceUpdateResponse:
+    """Set ``current_price`` on every user's holdings with a matching name, in one transaction.
+
+    ``updated_at`` is left alone so price refreshes do not reorder portfolio listings.
+    """
+    cleaned = {}
+    for raw_name, raw_price in prices.items():
+        name = normalize_name(str(raw_name))
+        try:
+            price = float(raw_price)
+        except (TypeError, ValueError):
+            price = -1.0
+        if not name or not math.isfinite(price) or price < 0:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST, detail=f"Invalid price for {raw_name}."
+            )
+        cleaned[holding_name_key(name)] = (name, price)
+    if not cleaned:
+        return PriceUpdateResponse(updated=0, unmatched=[])
+
+    # Write-lock before reading the last change id: in a deferred transaction another
+    # price update could commit in between, and its changes would be bumped again here.
+    db.connection().exec_driver_sql("BEGIN IMMEDIATE")
+    db.execute(
+        text(
+            "CREATE TEMP TABLE IF NOT EXISTS price_updates "
+            "(name_key VARCHAR PRIMARY KEY, name VARCHAR NOT NULL, price FLOAT NOT NULL)"
+        )
+    )
+    db.execute(text("DELETE FROM temp.price_updates"))
+    db.execute(
+        text("INSERT INTO temp.price_updates (name_key, name, price) VALUES (:name_key, :name, :price)"),
+        [{"name_key": key, "name": name, "price": price} for key, (name, price) in cleaned.items()],
+    )
+    statement = PRICE_LOOKUP_UPDATE if len(cleaned) <= PRICE_SCAN_THRESHOLD else PRICE_SCAN_UPDATE
+    last_change_id = db.scalar(text("SELECT coalesce(max(id), 0) FROM holding_changes"))
+    updated = db.execute(text(statement)).rowcount
+    if updated:
+        db.execute(text(PRICE_VERSION_BUMP), {"last_change_id": last_change_id})
+    unmatched = db.scalars(
+        text(
+            "SELECT name FROM temp.price_updates AS updates WHERE NOT EXISTS "
+            "(SELECT 1 FROM holdings WHERE holdings.name_key = updates.name_key) ORDER BY name"
+        )
+    ).all()
+    db.execute(text("DROP TABLE temp.price_updates"))
+    db.commit()
+    return PriceUpdateResponse(updated=updated, unmatched=unmatched)
+
+
+@router.post(
+    "/api/admin/prices", response_model=PriceUpdateResponse, dependencies=[Depends(require_admin)]
+)
+async def update_prices(payload: PriceUpdatePayload, db=Depends(get_async_db)):
+    return await db.run_sync(import_prices, payload.prices)
+
+
+def read_prices_file(path: Path) -> dict[str, float]:
+    """Read ``{"AAPL": 189.5, ...}`` JSON or a ``name,price`` CSV."""
+    if path.suffix.lower() == ".json":
+        return json.loads(path.read_text(encoding="utf-8"))
+    with path.open(newline="", encoding="utf-8") as handle:
+        return {row["name"]: row["price"] for row in csv.DictReader(handle)}
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Set current prices for every holding by name.")
+    parser.add_argument("path", type=Path, help="JSON object or CSV with name,price columns")
+    args = parser.parse_args()
+
+    from app.main import startup
+
+    startup()
+    with SessionLocal() as db:
+        try:
+            result = import_prices(db, read_prices_file(args.path))
+        except HTTPException as exc:
+            raise SystemExit(exc.detail)
+    print(f"Updated {result.updated} holdings; {len(result.unmatched)} names matched no holding.")
+
+
+if __name__ == "__main__":
+    main()
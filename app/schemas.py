@@ -1,3 +1,6 @@
+from datetime import datetime
+from typing import Literal
+
 from pydantic import BaseModel, EmailStr, Field
 
 
@@ -18,6 +21,8 @@ class PortfolioPayload(BaseModel):
     sentiment: str | None = None
     tags: list[str] = Field(default_factory=list)
     note: str | None = None
+    # New holdings default to "average"; omitted on update keeps the current method.
+    costMethod: Literal["average", "fifo"] | None = None
 
 
 class HoldingResponse(BaseModel):
@@ -33,3 +38,123 @@ class HoldingResponse(BaseModel):
     sentiment: str | None = None
     tags: list[str] = Field(default_factory=list)
     note: str | None = None
+    costMethod: str = "average"
+    realizedPnl: float = 0.0
+
+
+class TradePayload(BaseModel):
+    kind: Literal["buy", "sell", "fee"]
+    quantity: float = 0.0
+    amount: float
+    executedAt: datetime | None = None
+
+
+class TransactionResponse(BaseModel):
+    id: int
+    kind: str
+    quantity: float
+    amount: float
+    realizedPnl: float
+    executedAt: datetime
+
+
+class TradeResponse(BaseModel):
+    holding: HoldingResponse
+    transaction: TransactionResponse
+
+
+class BatchOperation(BaseModel):
+    op: Literal["add", "update", "delete"]
+    id: int | None = None
+    payload: PortfolioPayload | None = None
+
+
+class BatchPayload(BaseModel):
+    operations: list[BatchOperation] = Field(min_length=1)
+
+
+class BatchResult(BaseModel):
+    status: int
+    holding: HoldingResponse | None = None
+    detail: str | None = None
+
+
+class BatchResponse(BaseModel):
+    results: list[BatchResult]
+
+
+class BreakdownEntry(BaseModel):
+    key: str
+    count: int
+    totalCost: float
+
+
+class TagFacet(BaseModel):
+    tag: str
+    count: int
+
+
+class PortfolioSummary(BaseModel):
+    assetCount: int
+    totalCost: float
+    byCategory: list[BreakdownEntry] = Field(default_factory=list)
+    byCurrency: list[BreakdownEntry] = Field(default_factory=list)
+    byRiskLevel: list[BreakdownEntry] = Field(default_factory=list)
+    byTag: list[BreakdownEntry] = Field(default_factory=list)
+
+
+class FxRateEntry(BaseModel):
+    currency: str
+    rateToUsd: float
+
+
+class HoldingValuation(BaseModel):
+    id: int
+    name: str
+    currency: str
+    marketValue: float | None = None
+    cost: float | None = None
+    unrealizedPnl: float | None = None
+    weight: float | None = None
+
+
+class ValuationResponse(BaseModel):
+    baseCurrency: str
+    totalValue: float
+    totalCost: float
+    unrealizedPnl: float
+    missingRates: list[str] = Field(default_factory=list)
+    holdings: list[HoldingValuation] = Field(default_factory=list)
+
+
+class HistoryPoint(BaseModel):
+    takenAt: datetime
+    value: float
+    cost: float
+
+
+class PriceUpdatePayload(BaseModel):
+    prices: dict[str, float]
+
+
+class PriceUpdateResponse(BaseModel):
+    updated: int
+    unmatched: list[str]
+
+
+class StreamTicketResponse(BaseModel):
+    ticket: str
+    expiresAt: datetime
+
+
+class BackupStatus(BaseModel):
+    state: Literal["idle", "running", "done", "failed"]
+    path: str | None = None
+    totalPages: int = 0
+    remainingPages: int = 0
+    restarts: int = 0
+    bytes: int | None = None
+    integrity: str | None = None
+    error: str | None = None
+    startedAt: datetime | None = None
+    finishedAt: datetime | None = None
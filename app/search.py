@@ -0,0 +1,79 @@
+import re
+
+from fastapi import APIRouter, Depends, Query, Request
+from fastapi.responses import JSONResponse
+from sqlalchemy import Float, Integer, select, text
+
+from app.auth import require_user
+from app.db import get_async_db
+from app.models import Holding, User
+from app.portfolio import (
+    HOLDING_COLUMNS,
+    MAX_PAGE_SIZE,
+    NEXT_CURSOR_HEADER,
+    holding_document,
+    portfolio_cache_headers,
+)
+from app.schemas import HoldingResponse
+
+MAX_SEARCH_TERMS = 8
+DEFAULT_SEARCH_LIMIT = 50
+SEARCH_TERM = re.compile(r"\w+")
+SEARCH_COLUMNS = "{name note strategy sentiment tags}"
+
+# bm25 weights in holdings_fts column order: owner, name, note, strategy, sentiment, tags.
+# Spelled out rather than set as the table's ``rank``, which re-parses it on every query.
+SEARCH_MATCHES = (
+    text(
+        "SELECT rowid AS id, bm25(holdings_fts, 0.0, 10.0, 1.0, 2.0, 2.0, 5.0) AS rank "
+        "FROM holdings_fts WHERE holdings_fts MATCH :match ORDER BY rank LIMIT :limit OFFSET :offset"
+    )
+    .columns(id=Integer, rank=Float)
+    .subquery("matches")
+)
+
+router = APIRouter()
+
+
+def search_expression(user_id: int, query: str) -> str | None:
+    """FTS5 query matching every word of ``query`` as a prefix, within one user's rows.
+
+    Words are re-quoted, so FTS5 operators and column filters typed by the user are
+    searched for as text rather than interpreted.
+    """
+    terms = SEARCH_TERM.findall(query)[:MAX_SEARCH_TERMS]
+    if not terms:
+        return None
+    words = " ".join(f'"{term}"*' for term in terms)
+    return f"owner:u{user_id} AND {SEARCH_COLUMNS}: ({words})"
+
+
+@router.get("/api/portfolio/search", response_model=list[HoldingResponse])
+async def search_portfolio(
+    request: Request,
+    q: str = Query(max_length=200),
+    limit: int = Query(default=DEFAULT_SEARCH_LIMIT, ge=1, le=MAX_PAGE_SIZE),
+    offset: int = Query(default=0, ge=0),
+    user: User = Depends(require_user),
+    db=Depends(get_async_db),
+):
+    """Holdings whose name, note, strategy, sentiment or tags contain words starting with
+    each word of ``q``, best match first. ``X-Next-Cursor`` is the ``offset`` of the next page.
+    """
+    headers, not_modified = await portfolio_cache_headers(request, db, user.id)
+    if not_modified:
+        return not_modified
+    match = search_expression(user.id, q)
+    if match is None:
+        return JSONResponse([], headers=headers)
+    rows = (await db.execute(
+        select(*HOLDING_COLUMNS)
+        .join(SEARCH_MATCHES, Holding.id == SEARCH_MATCHES.c.id)
+        .where(Holding.user_id == user.id)
+        .order_by(SEARCH_MATCHES.c.rank, Holding.id),
+        {"match": match, "limit": limit + 1, "offset": offset},
+    )).all()
+    if len(rows) > limit:
+        rows = rows[:limit]
+        headers[NEXT_CURSOR_HEADER] = str(offset + limit)
+    return JSONResponse([holding_document(row) for row in rows], headers=headers)
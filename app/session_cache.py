@@ -0,0 +1,80 @@
+import os
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime
+
+from app.db import DB_PATH
+from app.models import User
+from app.signals import GenerationCounter
+
+SESSION_CACHE_SIZE = int(os.environ.get("PORTFOLIO_SESSION_CACHE_SIZE", "2048"))
+SESSION_CACHE_TTL_SECONDS = float(os.environ.get("PORTFOLIO_SESSION_CACHE_TTL", "60"))
+GENERATION_PATH = DB_PATH.with_name(f"{DB_PATH.name}.sessions")
+
+
+class SessionCache:
+    """Bounded LRU of token -> user with a TTL capped by the session's expiry.
+
+    Entries are dropped wholesale whenever the shared generation changes, which is
+    how a logout handled by one worker reaches the others.
+    """
+
+    def __init__(self, maxsize: int, ttl_seconds: float, generation: GenerationCounter):
+        self.maxsize = maxsize
+        self.ttl_seconds = ttl_seconds
+        self.generation = generation
+        self._entries: OrderedDict[str, tuple[User, float]] = OrderedDict()
+        self._seen_generation = 0
+        self._lock = threading.Lock()
+
+    def _sync_generation(self) -> None:
+        current = self.generation.read()
+        if current != self._seen_generation:
+            self._entries.clear()
+            self._seen_generation = current
+
+    def get(self, token: str) -> User | None:
+        if self.maxsize <= 0:
+            return None
+        with self._lock:
+            self._sync_generation()
+            entry = self._entries.get(token)
+            if entry is None:
+                return None
+            user, valid_until = entry
+            if time.time() >= valid_until:
+                del self._entries[token]
+                return None
+            self._entries.move_to_end(token)
+            return user
+
+    def put(self, token: str, user: User, expires_at: datetime) -> None:
+        if self.maxsize <= 0:
+            return
+        valid_until = min(time.time() + self.ttl_seconds, expires_at.timestamp())
+        with self._lock:
+            self._sync_generation()
+            self._entries[token] = (user, valid_until)
+            self._entries.move_to_end(token)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, token: str) -> None:
+        with self._lock:
+            self._entries.pop(token, None)
+            previous = self._seen_generation
+            current = self.generation.bump()
+            # Only our own bump happened in between: the local entry is already gone,
+            # so there is no need to drop the rest of this worker's cache.
+            if current == previous + 1:
+                self._seen_generation = current
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+
+session_cache = SessionCache(
+    SESSION_CACHE_SIZE, SESSION_CACHE_TTL_SECONDS, GenerationCounter(GENERATION_PATH)
+)
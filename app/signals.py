@@ -0,0 +1,50 @@
+import fcntl
+import mmap
+import os
+import struct
+import threading
+from pathlib import Path
+
+_COUNTER = struct.Struct("<Q")
+
+
+class GenerationCounter:
+    """Shared 8-byte counter in an mmap'd file, visible to every worker on the host.
+
+    Reading is a plain memory load, so checking it on every request costs nothing
+    compared to a database round-trip.
+    """
+
+    def __init__(self, path: Path):
+        self.path = path
+        self._mm: mmap.mmap | None = None
+        self._lock = threading.Lock()
+
+    def _map(self) -> mmap.mmap:
+        if self._mm is None:
+            with self._lock:
+                if self._mm is None:
+                    fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o600)
+                    try:
+                        fcntl.flock(fd, fcntl.LOCK_EX)
+                        if os.fstat(fd).st_size < _COUNTER.size:
+                            os.ftruncate(fd, _COUNTER.size)
+                        fcntl.flock(fd, fcntl.LOCK_UN)
+                        self._mm = mmap.mmap(fd, _COUNTER.size)
+                    finally:
+                        os.close(fd)
+        return self._mm
+
+    def read(self) -> int:
+        return _COUNTER.unpack_from(self._map(), 0)[0]
+
+    def bump(self) -> int:
+        mm = self._map()
+        fd = os.open(self.path, os.O_RDWR)
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX)
+            value = _COUNTER.unpack_from(mm, 0)[0] + 1
+            _COUNTER.pack_into(mm, 0, value)
+        finally:
+            os.close(fd)
+        return value
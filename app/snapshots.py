@@ -0,0 +1,164 @@
+import argparse
+import os
+import time
+from datetime import datetime, timezone
+
+import numpy as np
+from fastapi import APIRouter, Depends, Query
+from sqlalchemy import case, func, insert, literal, select
+
+from app.auth import as_utc, now_utc, require_user
+from app.db import SessionLocal, get_async_db
+from app.models import FxRate, Holding, HoldingSnapshot, PortfolioSnapshot, SnapshotRun, User
+from app.schemas import HistoryPoint
+from app.tasks import periodic
+
+SNAPSHOT_INTERVAL_SECONDS = float(os.environ.get("PORTFOLIO_SNAPSHOT_INTERVAL", "86400"))
+SNAPSHOT_CHUNK_USERS = int(os.environ.get("PORTFOLIO_SNAPSHOT_CHUNK_USERS", "500"))
+# How often the leader checks whether a snapshot is due, so restarts do not delay one
+# by up to a whole interval.
+SNAPSHOT_CHECK_SECONDS = 300
+DEFAULT_HISTORY_POINTS = 500
+MAX_HISTORY_POINTS = 5000
+
+router = APIRouter()
+
+# Holdings are valued like /api/portfolio/valuation: at the current price when known,
+# at cost otherwise, converted to USD. Currencies without a USD rate are skipped.
+usd_rate = case((Holding.currency == "USD", 1.0), else_=FxRate.rate_to_usd)
+usd_value = func.coalesce(Holding.quantity * Holding.current_price, Holding.total_cost) * usd_rate
+usd_cost = Holding.total_cost * usd_rate
+
+
+def valued_holdings(query, first_user_id: int, last_user_id: int):
+    return query.outerjoin(FxRate, FxRate.currency == Holding.currency).where(
+        Holding.user_id.between(first_user_id, last_user_id), usd_rate.is_not(None)
+    )
+
+
+def snapshot_chunk(db, taken_at: int, first_user_id: int, last_user_id: int) -> int:
+    holdings = valued_holdings(
+        select(Holding.user_id, literal(taken_at), Holding.id, usd_value, usd_cost), first_user_id, last_user_id
+    )
+    inserted = db.execute(
+        insert(HoldingSnapshot)
+        .prefix_with("OR REPLACE")
+        .from_select(["user_id", "taken_at", "holding_id", "value", "cost"], holdings)
+    ).rowcount
+    totals = valued_holdings(
+        select(Holding.user_id, literal(taken_at), func.sum(usd_value), func.sum(usd_cost), func.count()),
+        first_user_id,
+        last_user_id,
+    ).group_by(Holding.user_id)
+    db.execute(
+        insert(PortfolioSnapshot)
+        .prefix_with("OR REPLACE")
+        .from_select(["user_id", "taken_at", "value", "cost", "holding_count"], totals)
+    )
+    return inserted
+
+
+def take_snapshot(taken_at: int | None = None) -> int:
+    """Record every user's holdings, ``SNAPSHOT_CHUNK_USERS`` users per transaction."""
+    started = time.perf_counter()
+    taken_at = int(now_utc().timestamp()) if taken_at is None else taken_at
+    with SessionLocal() as db:
+        last_user_id = db.scalar(select(func.max(User.id))) or 0
+    holding_count = 0
+    for first_user_id in range(1, last_user_id + 1, SNAPSHOT_CHUNK_USERS):
+        with SessionLocal() as db:
+            holding_count += snapshot_chunk(
+                db, taken_at, first_user_id, min(first_user_id + SNAPSHOT_CHUNK_USERS - 1, last_user_id)
+            )
+            db.commit()
+    with SessionLocal() as db:
+        db.merge(
+            SnapshotRun(
+                taken_at=taken_at,
+                holding_count=holding_count,
+                duration_ms=(time.perf_counter() - started) * 1000,
+            )
+        )
+        db.commit()
+    return holding_count
+
+
+@periodic(min(SNAPSHOT_INTERVAL_SECONDS, SNAPSHOT_CHECK_SECONDS))
+def snapshot_if_due() -> None:
+    with SessionLocal() as db:
+        last_taken_at = db.scalar(select(func.max(SnapshotRun.taken_at)))
+    if last_taken_at is None or now_utc().timestamp() - last_taken_at >= SNAPSHOT_INTERVAL_SECONDS:
+        take_snapshot()
+
+
+def lttb(x: np.ndarray, y: np.ndarray, threshold: int) -> np.ndarray:
+    """Indices kept by Largest-Triangle-Three-Buckets downsampling to ``threshold`` points."""
+    count = len(x)
+    if threshold >= count or threshold < 3:
+        return np.arange(count)
+    # threshold - 2 buckets between the fixed first and last points.
+    edges = np.linspace(1, count - 1, threshold - 1).astype(np.intp)
+    keep = np.empty(threshold, dtype=np.intp)
+    keep[0], keep[-1] = 0, count - 1
+    anchor = 0
+    for bucket in range(threshold - 2):
+        start, stop = edges[bucket], edges[bucket + 1]
+        if bucket + 2 < len(edges):
+            next_start, next_stop = edges[bucket + 1], edges[bucket + 2]
+        else:
+            next_start, next_stop = count - 1, count
+        next_x, next_y = x[next_start:next_stop].mean(), y[next_start:next_stop].mean()
+        area = np.abs(
+            (x[anchor] - next_x) * (y[start:stop] - y[anchor])
+            - (x[anchor] - x[start:stop]) * (next_y - y[anchor])
+        )
+        anchor = start + int(np.argmax(area))
+        keep[bucket + 1] = anchor
+    return keep
+
+
+@router.get("/api/portfolio/history", response_model=list[HistoryPoint])
+async def portfolio_history(
+    start: datetime | None = None,
+    end: datetime | None = None,
+    points: int = Query(default=DEFAULT_HISTORY_POINTS, ge=3, le=MAX_HISTORY_POINTS),
+    holding_id: int | None = Query(default=None, alias="holdingId"),
+    user: User = Depends(require_user),
+    db=Depends(get_async_db),
+):
+    """Portfolio (or one holding's) USD value and cost over time, downsampled to ``points``."""
+    model = PortfolioSnapshot if holding_id is None else HoldingSnapshot
+    query = select(model.taken_at, model.value, model.cost).where(model.user_id == user.id)
+    if holding_id is not None:
+        query = query.where(HoldingSnapshot.holding_id == holding_id)
+    if start is not None:
+        query = query.where(model.taken_at >= int(as_utc(start).timestamp()))
+    if end is not None:
+        query = query.where(model.taken_at <= int(as_utc(end).timestamp()))
+    rows = (await db.execute(query.order_by(model.taken_at))).all()
+    if not rows:
+        return []
+    taken_at, value, cost = (np.array(column, dtype=np.float64) for column in zip(*rows))
+    return [
+        HistoryPoint(
+            takenAt=datetime.fromtimestamp(taken_at[index], timezone.utc),
+            value=value[index],
+            cost=cost[index],
+        )
+        for index in lttb(taken_at, value, points)
+    ]
+
+
+def main() -> None:
+    argparse.ArgumentParser(description="Record a portfolio snapshot for every user now.").parse_args()
+
+    from app.main import startup
+
+    startup()
+    started = time.perf_counter()
+    count = take_snapshot()
+    print(f"Snapshotted {count} holdings in {time.perf_counter() - started:.2f}s.")
+
+
+if __name__ == "__main__":
+    main()
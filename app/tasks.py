@@ -0,0 +1,85 @@
+import asyncio
+import fcntl
+import logging
+import os
+from collections.abc import Callable
+from pathlib import Path
+
+from app.db import DB_PATH
+
+LEADER_LOCK_PATH = DB_PATH.with_name(f"{DB_PATH.name}.leader")
+
+logger = logging.getLogger(__name__)
+
+
+class LeaderLock:
+    """Non-blocking exclusive file lock held for the life of the winning worker.
+
+    The kernel releases it when that process exits, so another worker takes over
+    on its next tick without any lease bookkeeping.
+    """
+
+    def __init__(self, path: Path):
+        self.path = path
+        self._fd: int | None = None
+
+    @property
+    def held(self) -> bool:
+        return self._fd is not None
+
+    def try_acquire(self) -> bool:
+        if self._fd is not None:
+            return True
+        fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o600)
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            os.close(fd)
+            return False
+        self._fd = fd
+        return True
+
+    def release(self) -> None:
+        if self._fd is not None:
+            os.close(self._fd)
+            self._fd = None
+
+
+leader = LeaderLock(LEADER_LOCK_PATH)
+
+PERIODIC_JOBS: list[tuple[str, float, Callable[[], object]]] = []
+_running: list[asyncio.Task] = []
+
+
+def periodic(interval_seconds: float):
+    """Register a sync job to run every ``interval_seconds`` on the leader worker only."""
+
+    def register(job: Callable[[], object]) -> Callable[[], object]:
+        PERIODIC_JOBS.append((job.__name__, interval_seconds, job))
+        return job
+
+    return register
+
+
+async def _run_forever(name: str, interval_seconds: float, job: Callable[[], object]) -> None:
+    while True:
+        if leader.try_acquire():
+            try:
+                await asyncio.to_thread(job)
+            except Exception:
+                logger.exception("Periodic job %s failed", name)
+        await asyncio.sleep(interval_seconds)
+
+
+async def start_periodic_jobs() -> None:
+    for name, interval_seconds, job in PERIODIC_JOBS:
+        if interval_seconds > 0:
+            _running.append(asyncio.create_task(_run_forever(name, interval_seconds, job)))
+
+
+async def stop_periodic_jobs() -> None:
+    for task in _running:
+        task.cancel()
+    await asyncio.gather(*_running, return_exceptions=True)
+    _running.clear()
+    leader.release()
@@ -0,0 +1,218 @@
+import codecs
+import csv
+import io
+import json
+from collections.abc import Iterator
+
+import anyio.from_thread
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, status
+from fastapi.responses import StreamingResponse
+from pydantic import ValidationError
+from sqlalchemy import select
+from starlette.concurrency import run_in_threadpool
+
+from app.auth import now_utc, require_user
+from app.db import SessionLocal
+from app.models import Holding, User
+from app.ledger import RECORD_BUY
+from app.portfolio import bump_portfolio_version, holding_values, upsert_holding_statement
+from app.portfolio_utils import decode_tags
+from app.schemas import PortfolioPayload
+
+IMPORT_BATCH_SIZE = 500
+EXPORT_BATCH_SIZE = 1000
+MAX_REPORTED_ERRORS = 1000
+TRANSFER_FORMATS = {"csv": "text/csv; charset=utf-8", "ndjson": "application/x-ndjson"}
+CSV_COLUMNS = [
+    "name",
+    "category",
+    "quantity",
+    "cost",
+    "currency",
+    "currentPrice",
+    "riskLevel",
+    "strategy",
+    "sentiment",
+    "tags",
+    "note",
+]
+
+router = APIRouter()
+
+
+def normalize_format(raw_format: str) -> str:
+    cleaned = raw_format.strip().lower()
+    if cleaned not in TRANSFER_FORMATS:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Unsupported format.")
+    return cleaned
+
+
+def blocking_body_chunks(request: Request) -> Iterator[bytes]:
+    """Pull the request body from a worker thread, one ASGI message at a time."""
+    stream = request.stream()
+
+    async def next_chunk() -> bytes | None:
+        try:
+            return await stream.__anext__()
+        except StopAsyncIteration:
+            return None
+
+    while (chunk := anyio.from_thread.run(next_chunk)) is not None:
+        if chunk:
+            yield chunk
+
+
+def iter_lines(chunks: Iterator[bytes]) -> Iterator[str]:
+    decoder = codecs.getincrementaldecoder("utf-8-sig")()
+    pending = ""
+    for chunk in chunks:
+        pending += decoder.decode(chunk)
+        *lines, pending = pending.split("\n")
+        for line in lines:
+            yield line + "\n"
+    pending += decoder.decode(b"", final=True)
+    if pending:
+        yield pending
+
+
+def csv_records(lines: Iterator[str]) -> Iterator[dict]:
+    for record in csv.DictReader(lines):
+        cleaned = {key: value.strip() for key, value in record.items() if key and value and value.strip()}
+        if not cleaned:
+            continue
+        if "tags" in cleaned:
+            cleaned["tags"] = decode_tags(cleaned["tags"])
+        yield cleaned
+
+
+def ndjson_records(lines: Iterator[str]) -> Iterator[dict | str]:
+    for line in lines:
+        if not line.strip():
+            continue
+        try:
+            record = json.loads(line)
+        except json.JSONDecodeError:
+            yield "Invalid JSON."
+            continue
+        yield record if isinstance(record, dict) else "Expected a JSON object."
+
+
+def parse_payload(record: dict | str) -> PortfolioPayload:
+    if isinstance(record, str):
+        raise ValueError(record)
+    try:
+        return PortfolioPayload.model_validate(record)
+    except ValidationError as exc:
+        error = exc.errors()[0]
+        field = ".".join(str(part) for part in error["loc"])
+        raise ValueError(f"{field}: {error['msg']}") from None
+
+
+def import_batch(user_id: int, batch: list[tuple[int, dict | str]], report: dict) -> None:
+    now = now_utc()
+    rows = []
+    for row_number, record in batch:
+        try:
+            rows.append(holding_values(user_id, parse_payload(record), now))
+        except (ValueError, HTTPException) as exc:
+            report["failed"] += 1
+            if len(report["errors"]) < MAX_REPORTED_ERRORS:
+                detail = exc.detail if isinstance(exc, HTTPException) else str(exc)
+                report["errors"].append({"row": row_number, "detail": detail})
+    if not rows:
+        return
+    with SessionLocal() as db:
+        db.execute(upsert_holding_statement(), rows)
+        db.execute(RECORD_BUY, rows)
+        db.execute(bump_portfolio_version(user_id))
+        db.commit()
+    report["imported"] += len(rows)
+
+
+def run_import(request: Request, user_id: int, data_format: str) -> dict:
+    lines = iter_lines(blocking_body_chunks(request))
+    records = csv_records(lines) if data_format == "csv" else ndjson_records(lines)
+    report = {"imported": 0, "failed": 0, "errors": []}
+    batch = []
+    for row_number, record in enumerate(records, start=1):
+        batch.append((row_number, record))
+        if len(batch) >= IMPORT_BATCH_SIZE:
+            import_batch(user_id, batch, report)
+            batch = []
+    if batch:
+        import_batch(user_id, batch, report)
+    return report
+
+
+@router.post("/api/portfolio/import")
+async def import_portfolio(
+    request: Request,
+    data_format: str = Query(default="csv", alias="format"),
+    user: User = Depends(require_user),
+):
+    data_format = normalize_format(data_format)
+    return await run_in_threadpool(run_import, request, user.id, data_format)
+
+
+def export_rows(user_id: int) -> Iterator[tuple]:
+    with SessionLocal() as db:
+        result = db.execute(
+            select(
+                Holding.name,
+                Holding.category,
+                Holding.quantity,
+                Holding.total_cost,
+                Holding.currency,
+                Holding.current_price,
+                Holding.risk_level,
+                Holding.strategy,
+                Holding.sentiment,
+                Holding.tags,
+                Holding.note,
+            )
+            .where(Holding.user_id == user_id)
+            .order_by(Holding.id)
+            .execution_options(yield_per=EXPORT_BATCH_SIZE)
+        )
+        yield from result
+
+
+def export_csv(user_id: int) -> Iterator[str]:
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(CSV_COLUMNS)
+    for count, row in enumerate(export_rows(user_id), start=1):
+        values = list(row)
+        values[9] = ", ".join(decode_tags(values[9]))
+        writer.writerow(["" if value is None else value for value in values])
+        if count % EXPORT_BATCH_SIZE == 0:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+    yield buffer.getvalue()
+
+
+def export_ndjson(user_id: int) -> Iterator[str]:
+    lines = []
+    for row in export_rows(user_id):
+        record = dict(zip(CSV_COLUMNS, row))
+        record["tags"] = decode_tags(record["tags"])
+        lines.append(json.dumps(record, ensure_ascii=False))
+        if len(lines) >= EXPORT_BATCH_SIZE:
+            yield "\n".join(lines) + "\n"
+            lines = []
+    if lines:
+        yield "\n".join(lines) + "\n"
+
+
+@router.get("/api/portfolio/export")
+def export_portfolio(
+    data_format: str = Query(default="csv", alias="format"), user: User = Depends(require_user)
+):
+    data_format = normalize_format(data_format)
+    rows = export_csv(user.id) if data_format == "csv" else export_ndjson(user.id)
+    return StreamingResponse(
+        rows,
+        media_type=TRANSFER_FORMATS[data_format],
+        headers={"Content-Disposition": f'attachment; filename="portfolio.{data_format}"'},
+    )
@@ -0,0 +1,124 @@
+import threading
+
+import numpy as np
+from fastapi import APIRouter, Depends, HTTPException, status
+from sqlalchemy import select
+
+from app.auth import require_user
+from app.db import get_async_db
+from app.fx import fx_generation, load_rates
+from app.models import Holding, User
+from app.portfolio_utils import SUPPORTED_CURRENCIES, normalize_currency
+from app.schemas import FxRateEntry, HoldingValuation, ValuationResponse
+
+CURRENCIES = tuple(sorted(SUPPORTED_CURRENCIES))
+CURRENCY_INDEX = {currency: index for index, currency in enumerate(CURRENCIES)}
+
+router = APIRouter()
+
+
+class ConversionMatrix:
+    """``matrix[i, j]`` converts one unit of ``CURRENCIES[i]`` into ``CURRENCIES[j]``.
+
+    Rebuilt only when the shared FX generation changes; missing rates stay NaN.
+    """
+
+    def __init__(self):
+        self._matrix: np.ndarray | None = None
+        self._generation = -1
+        self._lock = threading.Lock()
+
+    async def get(self, db) -> np.ndarray:
+        generation = fx_generation.read()
+        with self._lock:
+            if self._matrix is not None and generation == self._generation:
+                return self._matrix
+        rates = await db.run_sync(load_rates)
+        to_usd = np.array([rates.get(currency, np.nan) for currency in CURRENCIES])
+        matrix = to_usd[:, None] / to_usd[None, :]
+        np.fill_diagonal(matrix, 1.0)
+        with self._lock:
+            self._matrix, self._generation = matrix, generation
+        return matrix
+
+
+conversion_matrix = ConversionMatrix()
+
+
+def optional_float(value: float) -> float | None:
+    return None if np.isnan(value) else float(value)
+
+
+def value_holdings(rows, matrix: np.ndarray, base_currency: str) -> ValuationResponse:
+    count = len(rows)
+    ids, names, currencies, quantity, total_cost, current_price = zip(*rows) if rows else ((),) * 6
+    codes = np.fromiter((CURRENCY_INDEX.get(code, -1) for code in currencies), dtype=np.intp, count=count)
+    quantity = np.fromiter(quantity, dtype=np.float64, count=count)
+    cost_local = np.fromiter(total_cost, dtype=np.float64, count=count)
+    price = np.fromiter((np.nan if p is None else p for p in current_price), dtype=np.float64, count=count)
+
+    # Holdings without a current price are carried at cost.
+    value_local = np.where(np.isnan(price), cost_local, quantity * price)
+    rate = np.where(codes >= 0, matrix[codes, CURRENCY_INDEX[base_currency]], np.nan)
+    value = value_local * rate
+    cost = cost_local * rate
+    pnl = value - cost
+
+    priced = ~np.isnan(rate)
+    usd_rates = matrix[:, CURRENCY_INDEX["USD"]]
+    missing_rates = {
+        currency
+        for currency in {*currencies, base_currency}
+        if currency not in CURRENCY_INDEX or np.isnan(usd_rates[CURRENCY_INDEX[currency]])
+    }
+    total_value = float(value[priced].sum())
+    total_cost_base = float(cost[priced].sum())
+    weight = value / total_value if total_value > 0 else np.where(priced, 0.0, np.nan)
+
+    return ValuationResponse(
+        baseCurrency=base_currency,
+        totalValue=total_value,
+        totalCost=total_cost_base,
+        unrealizedPnl=total_value - total_cost_base,
+        missingRates=sorted(missing_rates),
+        holdings=[
+            HoldingValuation(
+                id=ids[index],
+                name=names[index],
+                currency=currencies[index],
+                marketValue=optional_float(value[index]),
+                cost=optional_float(cost[index]),
+                unrealizedPnl=optional_float(pnl[index]),
+                weight=optional_float(weight[index]),
+            )
+            for index in range(count)
+        ],
+    )
+
+
+@router.get("/api/portfolio/valuation", response_model=ValuationResponse)
+async def portfolio_valuation(
+    base: str = "USD", user: User = Depends(require_user), db=Depends(get_async_db)
+):
+    base_currency = normalize_currency(base)
+    if not base_currency:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid currency.")
+    rows = (await db.execute(
+        select(
+            Holding.id,
+            Holding.name,
+            Holding.currency,
+            Holding.quantity,
+            Holding.total_cost,
+            Holding.current_price,
+        )
+        .where(Holding.user_id == user.id)
+        .order_by(Holding.updated_at.desc(), Holding.id.desc())
+    )).all()
+    return value_holdings(rows, await conversion_matrix.get(db), base_currency)
+
+
+@router.get("/api/fx-rates", response_model=list[FxRateEntry])
+async def list_fx_rates(user: User = Depends(require_user), db=Depends(get_async_db)):
+    rates = await db.run_sync(load_rates)
+    return [FxRateEntry(currency=currency, rateToUsd=rate) for currency, rate in sorted(rates.items())]
@@ -0,0 +1 @@
+"""Benchmarks for Portfolio Manager. Run modules with ``python -m benchmarks.<name>``."""
@@ -0,0 +1,100 @@
+"""Run time and peak memory of ``python -m app.analytics report`` as holdings grow.
+
+Grows one database through each ``--holdings`` size (spread over ``--users`` users and
+``--tickers`` names, so only the holding count changes) and runs the report in a
+subprocess for every ``--workers`` count. Peak RSS is the largest of the report
+process and its workers: it should stay flat while holdings grow.
+"""
+import argparse
+import os
+import random
+import subprocess
+import sys
+import time
+
+from benchmarks.common import print_table, use_temp_database
+
+database_path = use_temp_database()
+
+from app.auth import now_utc  # noqa: E402
+from app.db import engine  # noqa: E402
+from app.main import startup  # noqa: E402
+
+SEED_BATCH_SIZE = 100_000
+CURRENCIES = ("USD", "USD", "USD", "CNY", "EUR")
+
+
+def grow(users: int, tickers: int, previous: int, holdings: int) -> None:
+    """Add holdings ``previous..holdings``, round-robin over users, each user's names distinct."""
+    now = now_utc().isoformat(sep=" ")
+    rng = random.Random(previous)
+    with engine.begin() as conn:
+        if previous == 0:
+            conn.exec_driver_sql(
+                "INSERT INTO users (id, email, password_hash, created_at) VALUES (?, ?, 'x', ?)",
+                [(user_id, f"a{user_id}@example.com", now) for user_id in range(1, users + 1)],
+            )
+            conn.exec_driver_sql(
+                "INSERT INTO fx_rates (currency, rate_to_usd, updated_at) VALUES ('CNY', 0.14, ?), ('EUR', 1.08, ?)",
+                (now, now),
+            )
+        for start in range(previous, holdings, SEED_BATCH_SIZE):
+            rows = []
+            for number in range(start, min(start + SEED_BATCH_SIZE, holdings)):
+                # Holding k of a user gets ticker k (mod tickers) and a unique suffix past that.
+                slot = number // users
+                name = f"TICK{slot % tickers:05d}" + (f"-{slot // tickers}" if slot >= tickers else "")
+                rows.append(
+                    (
+                        number % users + 1, name, name.lower(), rng.choice(("股票", "ETF", "虚拟币")),
+                        rng.randint(1, 500), rng.uniform(10, 10_000), rng.choice(CURRENCIES),
+                        rng.choice((None, rng.uniform(1, 500))), rng.choice(("low", "medium", "high")),
+                        rng.choice((None, "bullish", "bearish")), rng.choice((None, "value", "growth", "income")),
+                        now, now,
+                    )
+                )
+            conn.exec_driver_sql(
+                "INSERT INTO holdings (user_id, name, name_key, category, quantity, total_cost, currency, "
+                "current_price, risk_level, sentiment, strategy, created_at, updated_at) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                rows,
+            )
+
+
+def run_report(workers: int, chunk_size: int) -> dict[str, float]:
+    started = time.perf_counter()
+    process = subprocess.Popen(
+        [
+            sys.executable, "-m", "app.analytics", "report", "--workers", str(workers),
+            "--chunk-size", str(chunk_size), "--output", str(database_path.with_name("report.npz")),
+        ],
+        stdout=subprocess.DEVNULL,
+    )
+    # wait4's usage covers the report process and the workers it reaped.
+    _, exit_status, usage = os.wait4(process.pid, 0)
+    if exit_status:
+        raise SystemExit(f"report failed with status {exit_status}")
+    return {"seconds": time.perf_counter() - started, "peak_rss_mb": usage.ru_maxrss / 1024}
+
+
+def run(args) -> None:
+    startup()
+    rows, previous = {}, 0
+    for holdings in sorted(args.holdings):
+        started = time.perf_counter()
+        grow(args.users, args.tickers, previous, holdings)
+        print(f"Grew to {holdings} holdings in {time.perf_counter() - started:.1f}s")
+        previous = holdings
+        for workers in args.workers:
+            rows[f"{holdings} holdings, {workers} workers"] = run_report(workers, args.chunk_size)
+    print_table(f"[analytics report, {args.users} users, {args.tickers} tickers]", rows)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--holdings", type=int, nargs="+", default=[500_000, 2_000_000])
+    parser.add_argument("--users", type=int, default=20_000)
+    parser.add_argument("--tickers", type=int, default=5_000)
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 4])
+    parser.add_argument("--chunk-size", type=int, default=50_000)
+    run(parser.parse_args())
@@ -0,0 +1,148 @@
+"""Throughput and tail latency of the async portfolio read against the old sync path.
+
+Every client loops over authenticated ``GET`` requests through an in-process ASGI
+transport, so sync handlers queue for Starlette's threadpool exactly as they would
+under uvicorn while async handlers stay on the event loop.
+
+The sync reference opens its session inside the handler. Written the old way, with a
+``get_db`` yield dependency, it deadlocks at this concurrency: the dependency cleanup
+that returns the connection needs a threadpool slot, and every slot is taken by a
+handler waiting on the connection pool.
+"""
+import argparse
+import asyncio
+import secrets
+import time
+
+from benchmarks.common import print_table, summarize, use_temp_database
+
+use_temp_database()
+
+from datetime import timedelta  # noqa: E402
+
+import httpx  # noqa: E402
+from fastapi import HTTPException, Request, status  # noqa: E402
+from sqlalchemy import select  # noqa: E402
+
+from app.auth import extract_token, now_utc  # noqa: E402
+from app.db import SessionLocal  # noqa: E402
+from app.main import app, startup  # noqa: E402
+from app.models import Holding, Session, User  # noqa: E402
+from app.portfolio import holding_values, upsert_holding_statement  # noqa: E402
+from app.portfolio_utils import decode_tags  # noqa: E402
+from app.schemas import HoldingResponse, PortfolioPayload  # noqa: E402
+from app.session_cache import session_cache  # noqa: E402
+
+
+def sync_require_user(request: Request, db) -> User:
+    token = extract_token(request)
+    user = session_cache.get(token) if token else None
+    if user:
+        return user
+    row = db.execute(
+        select(User, Session.expires_at).join(Session, Session.user_id == User.id).where(Session.token == token)
+    ).one_or_none()
+    if not row:
+        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Not authenticated.")
+    session_cache.put(token, row[0], row[1])
+    return row[0]
+
+
+# The request path as it was before the async port, kept here only for comparison.
+@app.get("/bench/sync-portfolio", response_model=list[HoldingResponse])
+def sync_list_portfolio(request: Request):
+    with SessionLocal() as db:
+        user = sync_require_user(request, db)
+        holdings = db.execute(
+            select(Holding).where(Holding.user_id == user.id).order_by(Holding.updated_at.desc(), Holding.id.desc())
+        ).scalars().all()
+    return [
+        HoldingResponse(
+            id=holding.id,
+            name=holding.name,
+            category=holding.category,
+            quantity=holding.quantity,
+            totalCost=holding.total_cost,
+            currency=holding.currency,
+            currentPrice=holding.current_price,
+            riskLevel=holding.risk_level,
+            strategy=holding.strategy,
+            sentiment=holding.sentiment,
+            tags=decode_tags(holding.tags),
+            note=holding.note,
+        )
+        for holding in holdings
+    ]
+
+
+def seed(users: int, holdings: int) -> list[str]:
+    startup()
+    now = now_utc()
+    tokens = []
+    with SessionLocal() as db:
+        for index in range(users):
+            user = User(email=f"bench{index}@example.com", password_hash="x", created_at=now)
+            db.add(user)
+            db.flush()
+            token = secrets.token_urlsafe(32)
+            db.add(Session(user_id=user.id, token=token, expires_at=now + timedelta(days=1), created_at=now))
+            rows = [
+                holding_values(user.id, PortfolioPayload(name=f"T{n}", quantity=1, cost=10, tags=["bench"]), now)
+                for n in range(holdings)
+            ]
+            db.execute(upsert_holding_statement(), rows)
+            tokens.append(token)
+        db.commit()
+    return tokens
+
+
+async def run_clients(path: str, tokens: list[str], clients: int, requests_per_client: int) -> tuple[list[float], float]:
+    samples: list[float] = []
+    errors = 0
+    transport = httpx.ASGITransport(app=app)
+
+    async def client_loop(index: int) -> None:
+        nonlocal errors
+        headers = {"Authorization": f"Bearer {tokens[index % len(tokens)]}"}
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+            for _ in range(requests_per_client):
+                started = time.perf_counter()
+                response = await client.get(path, headers=headers)
+                samples.append(time.perf_counter() - started)
+                if response.status_code != 200:
+                    errors += 1
+
+    started = time.perf_counter()
+    await asyncio.gather(*(client_loop(index) for index in range(clients)))
+    elapsed = time.perf_counter() - started
+    if errors:
+        print(f"  {path}: {errors} non-200 responses")
+    return samples, elapsed
+
+
+async def compare(tokens: list[str], clients: int, requests_per_client: int) -> dict[str, dict[str, float]]:
+    # One event loop for both runs: the async engine's pool is bound to the loop that first used it.
+    rows = {}
+    for label, path in (("sync (threadpool)", "/bench/sync-portfolio"), ("async", "/api/portfolio")):
+        await run_clients(path, tokens, min(clients, 20), 5)
+        samples, elapsed = await run_clients(path, tokens, clients, requests_per_client)
+        stats = summarize(samples)
+        stats["requests_per_s"] = len(samples) / elapsed
+        rows[label] = stats
+    return rows
+
+
+def run(clients: int, requests_per_client: int, users: int, holdings: int) -> None:
+    tokens = seed(users, holdings)
+    rows = asyncio.run(compare(tokens, clients, requests_per_client))
+    print_table(f"[{clients} concurrent clients, {holdings} holdings each]", rows)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--clients", type=int, default=256)
+    parser.add_argument("--requests", type=int, default=20, help="requests per client")
+    parser.add_argument("--users", type=int, default=32)
+    parser.add_argument("--holdings", type=int, default=50)
+    args = parser.parse_args()
+    run(args.clients, args.requests, args.users, args.holdings)
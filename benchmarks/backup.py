@@ -0,0 +1,111 @@
+"""Write latency while the database is being backed up.
+
+Seeds ``--holdings`` holdings, then runs a writer thread committing single-row
+updates through the app's engine for each scenario: no backup, a one-step copy
+(what ``sqlite3 .backup`` does) and ``app.backup``'s incremental copy with
+``--pages`` per step and ``--pause-ms`` between steps. Reports writer latency
+percentiles, the worst stall, how long each backup took and how often writes made
+it start over (past ``--max-restarts`` it finishes in one step).
+
+Set ``PORTFOLIO_STORAGE_PROFILE=legacy`` to measure the rollback-journal mode, where
+a one-step copy blocks writers for its whole duration.
+"""
+import argparse
+import threading
+import time
+
+from benchmarks.common import print_table, summarize, use_temp_database
+
+database_path = use_temp_database()
+
+from sqlalchemy import text  # noqa: E402
+from sqlalchemy.exc import OperationalError  # noqa: E402
+
+from app.auth import now_utc  # noqa: E402
+from app.backup import copy_pages  # noqa: E402
+from app.db import STORAGE_PROFILE, SessionLocal, engine  # noqa: E402
+from app.main import startup  # noqa: E402
+
+IDLE_SECONDS = 3.0
+
+
+def seed(holdings: int) -> None:
+    now = now_utc().isoformat(sep=" ")
+    with engine.begin() as conn:
+        conn.exec_driver_sql("INSERT INTO users (id, email, password_hash, created_at) VALUES (1, 'b@example.com', 'x', ?)", (now,))
+        conn.exec_driver_sql(
+            "INSERT INTO holdings (user_id, name, name_key, category, quantity, total_cost, currency, "
+            "risk_level, note, created_at, updated_at) VALUES (1, ?, ?, '股票', 1, 10, 'USD', 'medium', ?, ?, ?)",
+            [(f"H{index:07d}", f"h{index:07d}", f"note {index} " * 8, now, now) for index in range(holdings)],
+        )
+
+
+def measure_writes(backup, interval: float) -> tuple[list[float], int, dict]:
+    samples, errors, stop = [], 0, threading.Event()
+
+    def writer() -> None:
+        nonlocal errors
+        number = 0
+        with SessionLocal() as db:
+            while not stop.is_set():
+                number += 1
+                started = time.perf_counter()
+                try:
+                    db.execute(text("UPDATE holdings SET current_price = :price WHERE id = :id"), {"price": number, "id": number % 1000 + 1})
+                    db.commit()
+                except OperationalError:
+                    db.rollback()
+                    errors += 1
+                samples.append(time.perf_counter() - started)
+                time.sleep(interval)
+
+    thread = threading.Thread(target=writer)
+    thread.start()
+    time.sleep(0.2)
+    info = backup()
+    stop.set()
+    thread.join()
+    return samples, errors, info
+
+
+def run(args) -> None:
+    startup()
+    started = time.perf_counter()
+    seed(args.holdings)
+    size_mb = database_path.stat().st_size / 1e6
+    print(f"Seeded {args.holdings} holdings ({size_mb:.0f} MB, profile {STORAGE_PROFILE}) in {time.perf_counter() - started:.1f}s")
+    target = database_path.with_name("copy.db")
+
+    def idle() -> dict:
+        time.sleep(IDLE_SECONDS)
+        return {}
+
+    def backup_with(pages: int, pause: float):
+        def backup() -> dict:
+            target.unlink(missing_ok=True)
+            started = time.perf_counter()
+            restarts = copy_pages(target, pages, pause, args.max_restarts, lambda *_: None)
+            return {"backup_s": time.perf_counter() - started, "restarts": restarts}
+
+        return backup
+
+    scenarios = {
+        "no backup": idle,
+        "one step (.backup)": backup_with(-1, 0.0),
+        f"incremental {args.pages} pages": backup_with(args.pages, args.pause_ms / 1000),
+    }
+    rows = {}
+    for name, backup in scenarios.items():
+        samples, errors, info = measure_writes(backup, args.write_interval_ms / 1000)
+        rows[name] = {**summarize(samples), "max_ms": max(samples) * 1000, "errors": errors, **info}
+    print_table(f"[writes during backup, {args.holdings} holdings]", rows)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--holdings", type=int, default=300_000)
+    parser.add_argument("--pages", type=int, default=256, help="pages per incremental step")
+    parser.add_argument("--pause-ms", type=float, default=10.0, help="pause between incremental steps")
+    parser.add_argument("--max-restarts", type=int, default=3)
+    parser.add_argument("--write-interval-ms", type=float, default=2.0, help="writer pause between commits")
+    run(parser.parse_args())
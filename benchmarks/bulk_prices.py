@@ -0,0 +1,93 @@
+"""End-of-day price refresh across every user's holdings.
+
+Seeds ``--users`` x ``--per-user`` holdings drawn from ``--tickers`` names, then prices
+tickers with ``import_prices`` (one set-based ``UPDATE`` joined to a temp table)
+and, for comparison, with one indexed ``UPDATE ... WHERE name_key = ?`` per ticker.
+``--priced`` limits each refresh to the first N tickers.
+"""
+import argparse
+import random
+import time
+
+from benchmarks.common import print_table, use_temp_database
+
+use_temp_database()
+
+from sqlalchemy import text  # noqa: E402
+
+from app.auth import now_utc  # noqa: E402
+from app.db import SessionLocal, engine  # noqa: E402
+from app.main import startup  # noqa: E402
+from app.prices import PRICE_LOOKUP_UPDATE, PRICE_SCAN_THRESHOLD, PRICE_SCAN_UPDATE, import_prices  # noqa: E402
+
+
+def seed(users: int, per_user: int, tickers: int) -> int:
+    startup()
+    now = now_utc().isoformat(sep=" ")
+    rng = random.Random(7)
+    names = [f"TICK{index:05d}" for index in range(tickers)]
+    with engine.begin() as conn:
+        conn.exec_driver_sql(
+            "INSERT INTO users (id, email, password_hash, created_at) VALUES (?, ?, 'x', ?)",
+            [(user_id, f"bench{user_id}@example.com", now) for user_id in range(1, users + 1)],
+        )
+        for user_id in range(1, users + 1):
+            conn.exec_driver_sql(
+                "INSERT INTO holdings (user_id, name, name_key, category, quantity, total_cost, "
+                "currency, risk_level, created_at, updated_at) "
+                "VALUES (?, ?, ?, '股票', 1, 10, 'USD', 'medium', ?, ?)",
+                [(user_id, name, name.lower(), now, now) for name in rng.sample(names, per_user)],
+            )
+    return users * per_user
+
+
+def price_map(priced: int, round_number: int) -> dict[str, float]:
+    return {f"TICK{index:05d}": 100 + index * 0.01 + round_number for index in range(priced)}
+
+
+def per_ticker_updates(prices: dict[str, float]) -> int:
+    with engine.begin() as conn:
+        return conn.exec_driver_sql(
+            "UPDATE holdings SET current_price = ? WHERE name_key = ?",
+            [(price, name.lower()) for name, price in prices.items()],
+        ).rowcount
+
+
+def run(users: int, per_user: int, tickers: int, priced: int, rounds: int) -> None:
+    started = time.perf_counter()
+    holdings = seed(users, per_user, tickers)
+    print(f"Seeded {holdings} holdings in {time.perf_counter() - started:.1f}s")
+    statement = PRICE_LOOKUP_UPDATE if min(priced, tickers) <= PRICE_SCAN_THRESHOLD else PRICE_SCAN_UPDATE
+    with engine.connect() as conn:
+        conn.execute(text("CREATE TEMP TABLE price_updates (name_key VARCHAR PRIMARY KEY, name VARCHAR, price FLOAT)"))
+        plan = conn.execute(text(f"EXPLAIN QUERY PLAN {statement}")).all()
+        print("plan:", "; ".join(row[-1] for row in plan))
+
+    rows = {}
+    round_number = 0
+    for label in ("import_prices", "UPDATE per ticker"):
+        durations = []
+        for _ in range(rounds):
+            round_number += 1
+            prices = price_map(min(priced, tickers), round_number)
+            started = time.perf_counter()
+            if label.startswith("import_prices"):
+                with SessionLocal() as db:
+                    updated = import_prices(db, prices).updated
+            else:
+                updated = per_ticker_updates(prices)
+            durations.append(time.perf_counter() - started)
+        best = min(durations)
+        rows[label] = {"updated": updated, "best_s": best, "holdings_per_s": updated / best}
+    print_table(f"[{holdings} holdings, {min(priced, tickers)} of {tickers} tickers priced]", rows)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--users", type=int, default=10_000)
+    parser.add_argument("--per-user", type=int, default=100)
+    parser.add_argument("--tickers", type=int, default=5_000)
+    parser.add_argument("--priced", type=int, default=5_000)
+    parser.add_argument("--rounds", type=int, default=3)
+    args = parser.parse_args()
+    run(args.users, args.per_user, args.tickers, args.priced, args.rounds)
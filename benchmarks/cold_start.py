@@ -0,0 +1,48 @@
+"""Startup cost of the migration runner: fresh database, already-current fast path, full replay."""
+import argparse
+import time
+
+from benchmarks.common import summarize, use_temp_database
+
+use_temp_database()
+
+from sqlalchemy import text  # noqa: E402
+
+from app.db import engine  # noqa: E402
+from app.migrations import apply_migrations, run_migrations  # noqa: E402
+
+
+def run(iterations: int) -> None:
+    started = time.perf_counter()
+    run_migrations()
+    print(f"fresh database          {1000 * (time.perf_counter() - started):.3f} ms")
+
+    samples = []
+    for _ in range(iterations):
+        engine.dispose()
+        started = time.perf_counter()
+        run_migrations()
+        samples.append(time.perf_counter() - started)
+    stats = summarize(samples)
+    print(f"current schema (fast)   p50={stats['p50_ms']:.3f} ms  p99={stats['p99_ms']:.3f} ms")
+
+    samples = []
+    for _ in range(iterations):
+        engine.dispose()
+        started = time.perf_counter()
+        with engine.begin() as conn:
+            conn.exec_driver_sql("BEGIN IMMEDIATE")
+            apply_migrations(conn, 0)
+        samples.append(time.perf_counter() - started)
+    stats = summarize(samples)
+    print(f"full introspection      p50={stats['p50_ms']:.3f} ms  p99={stats['p99_ms']:.3f} ms")
+
+    with engine.connect() as conn:
+        print("schema_version", conn.execute(text("SELECT version FROM schema_version")).scalar())
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--iterations", type=int, default=200)
+    args = parser.parse_args()
+    run(args.iterations)
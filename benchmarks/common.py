@@ -0,0 +1,69 @@
+import os
+import statistics
+import tempfile
+import time
+from contextlib import contextmanager
+from pathlib import Path
+
+
+def use_temp_database() -> Path:
+    """Point the app at a throwaway SQLite file. Must run before importing ``app``."""
+    directory = Path(tempfile.mkdtemp(prefix="pm-bench-"))
+    path = directory / "bench.db"
+    os.environ["PORTFOLIO_DB_PATH"] = str(path)
+    return path
+
+
+def percentile(samples: list[float], pct: float) -> float:
+    if not samples:
+        return 0.0
+    ordered = sorted(samples)
+    index = min(len(ordered) - 1, max(0, round(pct / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+def summarize(samples: list[float]) -> dict[str, float]:
+    return {
+        "count": len(samples),
+        "mean_ms": statistics.fmean(samples) * 1000 if samples else 0.0,
+        "p50_ms": percentile(samples, 50) * 1000,
+        "p95_ms": percentile(samples, 95) * 1000,
+        "p99_ms": percentile(samples, 99) * 1000,
+    }
+
+
+class QueryCounter:
+    """Counts statements sent to SQLite through an engine while active."""
+
+    def __init__(self, engine):
+        self.engine = engine
+        self.count = 0
+
+    def _on_execute(self, *_args, **_kwargs) -> None:
+        self.count += 1
+
+    @contextmanager
+    def active(self):
+        from sqlalchemy import event
+
+        event.listen(self.engine, "before_cursor_execute", self._on_execute)
+        try:
+            yield self
+        finally:
+            event.remove(self.engine, "before_cursor_execute", self._on_execute)
+
+
+def time_calls(fn, iterations: int) -> list[float]:
+    samples = []
+    for _ in range(iterations):
+        started = time.perf_counter()
+        fn()
+        samples.append(time.perf_counter() - started)
+    return samples
+
+
+def print_table(title: str, rows: dict[str, dict[str, float]]) -> None:
+    print(title)
+    for name, stats in rows.items():
+        formatted = "  ".join(f"{key}={value:.3f}" if isinstance(value, float) else f"{key}={value}" for key, value in stats.items())
+        print(f"  {name:<32} {formatted}")
@@ -0,0 +1,71 @@
+"""Compare two ``benchmarks.load`` result files and flag regressions.
+
+A run regresses when overall throughput drops, or an endpoint's p95 (or p99, with
+``--p99``) latency grows, by more than ``--threshold`` percent. Endpoints with fewer
+than ``--min-samples`` requests in either run are shown but not judged, since their
+tail percentiles are mostly noise. Exits with status 1 on any regression, so it can
+gate CI.
+"""
+import argparse
+import json
+from pathlib import Path
+
+
+def change(baseline: float, current: float) -> float:
+    return (current - baseline) / baseline * 100 if baseline else 0.0
+
+
+def compare(baseline: dict, current: dict, threshold: float, percentile: str, min_samples: int) -> list[str]:
+    regressions = []
+    for size, result in current["results"].items():
+        base_result = baseline["results"].get(size)
+        if base_result is None:
+            print(f"[{size} holdings] not in baseline, skipped")
+            continue
+        print(f"[{size} holdings]")
+        rows = {"all": (base_result, result)}
+        rows.update(
+            (name, (base_result["endpoints"][name], stats))
+            for name, stats in result["endpoints"].items()
+            if name in base_result["endpoints"]
+        )
+        for name, (before, after) in rows.items():
+            throughput = change(before["requests_per_s"], after["requests_per_s"])
+            line = f"  {name:<8} req/s {before['requests_per_s']:9.1f} -> {after['requests_per_s']:9.1f} ({throughput:+6.1f}%)"
+            flags = []
+            if name == "all":
+                if throughput < -threshold:
+                    flags.append("throughput")
+            else:
+                latency = change(before[percentile], after[percentile])
+                line += f"  {percentile} {before[percentile]:8.2f} -> {after[percentile]:8.2f} ms ({latency:+6.1f}%)"
+                if min(before["count"], after["count"]) < min_samples:
+                    line += "  (too few samples)"
+                elif latency > threshold:
+                    flags.append(percentile.removesuffix("_ms"))
+            if flags:
+                line += "  REGRESSION: " + ", ".join(flags)
+                regressions.append(f"{size}/{name}")
+            print(line)
+    return regressions
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("baseline", type=Path)
+    parser.add_argument("current", type=Path)
+    parser.add_argument("--threshold", type=float, default=10.0, help="allowed change in percent (default 10)")
+    parser.add_argument("--p99", action="store_true", help="judge latency on p99 instead of p95")
+    parser.add_argument("--min-samples", type=int, default=100, help="requests needed to judge an endpoint")
+    args = parser.parse_args()
+
+    baseline, current = (json.loads(path.read_text(encoding="utf-8")) for path in (args.baseline, args.current))
+    print(f"baseline {baseline['meta'].get('revision')} vs current {current['meta'].get('revision')}")
+    regressions = compare(baseline, current, args.threshold, "p99_ms" if args.p99 else "p95_ms", args.min_samples)
+    if regressions:
+        raise SystemExit(f"{len(regressions)} regressions: {', '.join(regressions)}")
+    print("No regressions.")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,58 @@
+"""Unchanged-portfolio reloads: full ``GET /api/portfolio`` versus a revalidation.
+
+Seeds one user with ``--holdings`` holdings through the API's import, then times
+plain reads and reads sending the ETag of the previous response in
+``If-None-Match`` (answered with a 304 from one ``users`` lookup), in-process.
+"""
+import argparse
+import asyncio
+import time
+
+from benchmarks.common import print_table, summarize, use_temp_database
+
+use_temp_database()
+
+import httpx  # noqa: E402
+
+from app.main import app, startup  # noqa: E402
+
+PASSWORD = "benchmark"
+
+
+async def run(args) -> dict[str, dict[str, float]]:
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=None) as client:
+        credentials = {"email": "etag@example.com", "password": PASSWORD}
+        (await client.post("/api/register", json=credentials)).raise_for_status()
+        token = (await client.post("/api/login", json=credentials)).json()["token"]
+        headers = {"Authorization": f"Bearer {token}"}
+        rows = "\n".join(f"T{index},{index % 97 + 1},{index * 1.1 + 3:.2f}" for index in range(args.holdings))
+        response = await client.post(
+            "/api/portfolio/import",
+            params={"format": "csv"},
+            content=f"name,quantity,cost\n{rows}\n",
+            headers={**headers, "Content-Type": "text/csv"},
+        )
+        response.raise_for_status()
+
+        etag = (await client.get("/api/portfolio", headers=headers)).headers["etag"]
+        conditional = {**headers, "If-None-Match": etag}
+        results = {}
+        for label, request_headers, expected in (("full read", headers, 200), ("revalidation", conditional, 304)):
+            samples = []
+            for _ in range(args.iterations):
+                started = time.perf_counter()
+                response = await client.get("/api/portfolio", headers=request_headers)
+                samples.append(time.perf_counter() - started)
+                assert response.status_code == expected, response.status_code
+            results[label] = {**summarize(samples), "bytes": len(response.content)}
+        return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--holdings", type=int, default=10_000)
+    parser.add_argument("--iterations", type=int, default=50)
+    args = parser.parse_args()
+    startup()
+    print_table(f"[GET /api/portfolio, {args.holdings} holdings]", asyncio.run(run(args)))
@@ -0,0 +1,102 @@
+"""Mixed read/write contention across worker processes, per storage profile.
+
+Each worker process plays the role of a gunicorn worker with its own engine and
+pool: it repeatedly lists a user's holdings or upserts one, and records latency
+and "database is locked" failures.
+"""
+import argparse
+import multiprocessing
+import os
+import random
+import tempfile
+import time
+from pathlib import Path
+
+from benchmarks.common import summarize
+
+USERS = 20
+
+
+def worker(profile: str, db_path: str, seconds: float, write_ratio: float, seed: int) -> dict:
+    os.environ["PORTFOLIO_DB_PATH"] = db_path
+    os.environ["PORTFOLIO_STORAGE_PROFILE"] = profile
+    from sqlalchemy import select
+    from sqlalchemy.exc import OperationalError
+
+    from app.db import SessionLocal
+    from app.models import Holding
+    from app.auth import now_utc
+    from app.portfolio import holding_values, upsert_holding_statement
+    from app.schemas import PortfolioPayload
+
+    rng = random.Random(seed)
+    reads, writes, errors = [], [], 0
+    deadline = time.perf_counter() + seconds
+    while time.perf_counter() < deadline:
+        user_id = rng.randint(1, USERS)
+        is_write = rng.random() < write_ratio
+        started = time.perf_counter()
+        try:
+            with SessionLocal() as db:
+                if is_write:
+                    payload = PortfolioPayload(name=f"T{rng.randint(0, 200)}", quantity=1, cost=1.5)
+                    db.execute(upsert_holding_statement().values(**holding_values(user_id, payload, now_utc())))
+                    db.commit()
+                else:
+                    db.execute(
+                        select(Holding).where(Holding.user_id == user_id).order_by(Holding.updated_at.desc())
+                    ).scalars().all()
+        except OperationalError:
+            errors += 1
+            continue
+        (writes if is_write else reads).append(time.perf_counter() - started)
+    return {"reads": reads, "writes": writes, "errors": errors}
+
+
+def seed_database(profile: str, db_path: str) -> None:
+    os.environ["PORTFOLIO_DB_PATH"] = db_path
+    os.environ["PORTFOLIO_STORAGE_PROFILE"] = profile
+    from datetime import datetime, timezone
+
+    from app.db import SessionLocal
+    from app.migrations import run_migrations
+    from app.models import User
+
+    run_migrations()
+    with SessionLocal() as db:
+        now = datetime.now(timezone.utc)
+        db.add_all(User(email=f"user{index}@example.com", password_hash="x", created_at=now) for index in range(USERS))
+        db.commit()
+
+
+def run_profile(profile: str, workers: int, seconds: float, write_ratio: float) -> None:
+    db_path = str(Path(tempfile.mkdtemp(prefix="pm-contention-")) / "bench.db")
+    context = multiprocessing.get_context("spawn")
+    with context.Pool(1) as pool:
+        pool.apply(seed_database, (profile, db_path))
+    with context.Pool(workers) as pool:
+        results = pool.starmap(
+            worker, [(profile, db_path, seconds, write_ratio, seed) for seed in range(workers)]
+        )
+    reads = [sample for result in results for sample in result["reads"]]
+    writes = [sample for result in results for sample in result["writes"]]
+    errors = sum(result["errors"] for result in results)
+    read_stats, write_stats = summarize(reads), summarize(writes)
+    print(
+        f"{profile:<8} ops/s={(len(reads) + len(writes)) / seconds:>8.0f}  locked={errors:<5} "
+        f"read p50/p99={read_stats['p50_ms']:.2f}/{read_stats['p99_ms']:.2f} ms  "
+        f"write p50/p99={write_stats['p50_ms']:.2f}/{write_stats['p99_ms']:.2f} ms"
+    )
+
+
+if __name__ == "__main__":
+    from app.db import STORAGE_PROFILES
+
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--seconds", type=float, default=5.0)
+    parser.add_argument("--write-ratio", type=float, default=0.2)
+    parser.add_argument("--profiles", nargs="+", default=list(STORAGE_PROFILES))
+    args = parser.parse_args()
+    for name in args.profiles:
+        run_profile(name, args.workers, args.seconds, args.write_ratio)
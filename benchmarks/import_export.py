@@ -0,0 +1,72 @@
+"""Throughput and peak memory of streaming CSV import/export.
+
+The in-process test client buffers the request body, so part of the RSS growth on
+import is the client rather than the server.
+"""
+import argparse
+import resource
+import time
+
+from benchmarks.common import use_temp_database
+
+use_temp_database()
+
+from fastapi.testclient import TestClient  # noqa: E402
+
+from app.main import app  # noqa: E402
+
+HEADER = "name,category,quantity,cost,currency,currentPrice,riskLevel,strategy,sentiment,tags,note\n"
+
+
+def csv_body(rows: int, chunk_rows: int = 1000):
+    lines = [HEADER]
+    for index in range(rows):
+        lines.append(f"T{index},stock,{index % 50 + 1},{index * 1.5:.2f},USD,12.5,medium,dca,bullish,\"core, long\",row {index}\n")
+        if len(lines) >= chunk_rows:
+            yield "".join(lines).encode()
+            lines = []
+    if lines:
+        yield "".join(lines).encode()
+
+
+def max_rss_mb() -> float:
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def run(rows: int) -> None:
+    with TestClient(app) as client:
+        client.post("/api/register", json={"email": "bench@example.com", "password": "benchmark"})
+        token = client.post(
+            "/api/login", json={"email": "bench@example.com", "password": "benchmark"}
+        ).json()["token"]
+        headers = {"Authorization": f"Bearer {token}"}
+
+        rss_before = max_rss_mb()
+        started = time.perf_counter()
+        report = client.post("/api/portfolio/import", content=csv_body(rows), headers=headers).json()
+        elapsed = time.perf_counter() - started
+        print(
+            f"import  rows={report['imported']} failed={report['failed']} "
+            f"seconds={elapsed:.2f} rows_per_s={report['imported'] / elapsed:,.0f} "
+            f"max_rss_mb={max_rss_mb():.1f} (before {rss_before:.1f})"
+        )
+
+        started = time.perf_counter()
+        exported_bytes = 0
+        exported_rows = -1
+        with client.stream("GET", "/api/portfolio/export", headers=headers) as response:
+            for chunk in response.iter_bytes():
+                exported_bytes += len(chunk)
+                exported_rows += chunk.count(b"\n")
+        elapsed = time.perf_counter() - started
+        print(
+            f"export  rows={exported_rows} bytes={exported_bytes:,} seconds={elapsed:.2f} "
+            f"rows_per_s={exported_rows / elapsed:,.0f} max_rss_mb={max_rss_mb():.1f}"
+        )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--rows", type=int, default=100_000)
+    args = parser.parse_args()
+    run(args.rows)
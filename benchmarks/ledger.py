@@ -0,0 +1,84 @@
+"""Per-trade write latency as a holding's ledger grows.
+
+One holding per cost method receives ``--trades`` trades (two buys for every sell,
+so FIFO keeps a growing backlog of open lots), each committed on its own through
+``record_trade``. Latency and statements per trade are reported for the first and
+last ``--window`` trades: flat numbers mean writes stay O(1) in ledger size. The
+run ends with ``python -m app.ledger rebuild``'s bulk verification over everything.
+"""
+import argparse
+import asyncio
+import random
+import time
+
+from benchmarks.common import QueryCounter, print_table, summarize, use_temp_database
+
+use_temp_database()
+
+from sqlalchemy import select  # noqa: E402
+
+from app.auth import now_utc  # noqa: E402
+from app.db import AsyncSessionLocal, async_engine  # noqa: E402
+from app.ledger import rebuild, record_trade  # noqa: E402
+from app.main import startup  # noqa: E402
+from app.models import Holding, User  # noqa: E402
+from app.portfolio import add_holding  # noqa: E402
+from app.schemas import PortfolioPayload  # noqa: E402
+
+
+async def run_method(method: str, trades: int, window: int) -> dict[str, dict[str, float]]:
+    rng = random.Random(11)
+    counter = QueryCounter(async_engine.sync_engine)
+    async with AsyncSessionLocal() as db:
+        user = User(email=f"ledger-{method}@example.com", password_hash="x", created_at=now_utc())
+        db.add(user)
+        await db.flush()
+        payload = PortfolioPayload(name=f"LEDGER-{method}", quantity=1, cost=10, costMethod=method)
+        holding_id = (await add_holding(db, user.id, payload)).id
+        await db.commit()
+
+    samples, statements = [], []
+    async with AsyncSessionLocal() as db:
+        for number in range(trades):
+            kind = "sell" if number % 3 == 2 else "buy"
+            started = time.perf_counter()
+            with counter.active():
+                before = counter.count
+                holding = (await db.execute(select(Holding).where(Holding.id == holding_id))).scalar_one()
+                await record_trade(db, holding, kind, 1.0, round(rng.uniform(5, 15), 2))
+                await db.commit()
+            samples.append(time.perf_counter() - started)
+            statements.append(counter.count - before)
+    rows = {}
+    for label, chunk in (("first", slice(0, window)), ("last", slice(-window, None))):
+        rows[f"{method} {label} {window}"] = {
+            **summarize(samples[chunk]),
+            "statements": sum(statements[chunk]) / len(statements[chunk]),
+        }
+    return rows
+
+
+async def run_all(methods: list[str], trades: int, window: int) -> dict[str, dict[str, float]]:
+    # One event loop throughout: the async engine's pool is bound to the loop that first used it.
+    rows = {}
+    for method in methods:
+        rows.update(await run_method(method, trades, window))
+    return rows
+
+
+def run(args) -> None:
+    startup()
+    rows = asyncio.run(run_all(args.methods, args.trades, min(args.window, args.trades)))
+    print_table(f"[{args.trades} trades per holding]", rows)
+    started = time.perf_counter()
+    holdings, entries, mismatched = rebuild(fix=False)
+    elapsed = time.perf_counter() - started
+    print(f"rebuild: {entries} transactions over {holdings} holdings in {elapsed:.2f}s, {len(mismatched)} disagreed")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--trades", type=int, default=20_000, help="trades per holding")
+    parser.add_argument("--window", type=int, default=1000, help="trades compared at each end")
+    parser.add_argument("--methods", nargs="+", choices=["average", "fifo"], default=["average", "fifo"])
+    run(parser.parse_args())
@@ -0,0 +1,232 @@
+"""Mixed login/list/add/update/delete load, per portfolio size, saved as JSON.
+
+For each ``--holdings`` size, ``--users`` synthetic users are seeded with that many
+holdings and ``--clients`` concurrent clients each send ``--requests`` requests
+picked from ``--mix`` with a fixed seed. Requests go through an in-process ASGI
+transport by default, or to a running server with ``--url`` (for example gunicorn
+with uvicorn workers), in which case users and holdings are seeded through the API.
+
+Throughput and p50/p95/p99 per endpoint are printed and, with ``--output``, written
+as JSON for ``python -m benchmarks.compare``.
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import random
+import secrets
+import sqlite3
+import subprocess
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+
+from benchmarks.common import print_table, summarize, use_temp_database
+
+use_temp_database()
+
+import httpx  # noqa: E402
+
+from app.auth import now_utc  # noqa: E402
+from app.db import engine  # noqa: E402
+from app.main import app, startup  # noqa: E402
+from app.passwords import hash_password  # noqa: E402
+
+PASSWORD = "benchmark"
+DEFAULT_MIX = "login=1,list=10,add=3,update=3,delete=2"
+SEED_BATCH_SIZE = 500
+# Holdings each client keeps as update targets, read once before measuring.
+TARGET_HOLDINGS = 500
+
+
+def parse_mix(text: str) -> dict[str, int]:
+    mix = {}
+    for part in text.split(","):
+        name, _, weight = part.partition("=")
+        if name.strip() not in ("login", "list", "add", "update", "delete"):
+            raise SystemExit(f"Unknown operation in --mix: {name!r}")
+        mix[name.strip()] = int(weight or 1)
+    return mix
+
+
+def holding_payload(name: str, rng: random.Random) -> dict:
+    return {
+        "name": name,
+        "quantity": rng.randint(1, 500),
+        "cost": round(rng.uniform(10, 10_000), 2),
+        "currentPrice": round(rng.uniform(1, 500), 2),
+        "riskLevel": rng.choice(("low", "medium", "high")),
+        "tags": rng.sample(("core", "growth", "income", "tech", "energy"), 2),
+    }
+
+
+def seed_database(emails: list[str], holdings: int) -> None:
+    """Insert users and holdings directly; used for in-process runs."""
+    now = now_utc().isoformat(sep=" ")
+    password_hash = hash_password(PASSWORD)
+    rng = random.Random(len(emails) * 7919 + holdings)
+    with engine.begin() as conn:
+        for email in emails:
+            user_id = conn.exec_driver_sql(
+                "INSERT INTO users (email, password_hash, created_at) VALUES (?, ?, ?)", (email, password_hash, now)
+            ).lastrowid
+            rows = []
+            for index in range(holdings):
+                payload = holding_payload(f"SEED{index:05d}", rng)
+                rows.append(
+                    (
+                        user_id, payload["name"], payload["name"].lower(), payload["quantity"],
+                        payload["cost"], payload["currentPrice"], payload["riskLevel"],
+                        json.dumps(payload["tags"]), now, now,
+                    )
+                )
+            conn.exec_driver_sql(
+                "INSERT INTO holdings (user_id, name, name_key, category, quantity, total_cost, currency, "
+                "current_price, risk_level, tags, created_at, updated_at) "
+                "VALUES (?, ?, ?, '股票', ?, ?, 'USD', ?, ?, ?, ?, ?)",
+                rows,
+            )
+
+
+async def seed_through_api(client: httpx.AsyncClient, emails: list[str], holdings: int) -> None:
+    rng = random.Random(len(emails) * 7919 + holdings)
+    for email in emails:
+        credentials = {"email": email, "password": PASSWORD}
+        (await client.post("/api/register", json=credentials)).raise_for_status()
+        token = (await client.post("/api/login", json=credentials)).json()["token"]
+        headers = {"Authorization": f"Bearer {token}"}
+        for start in range(0, holdings, SEED_BATCH_SIZE):
+            operations = [
+                {"op": "add", "payload": holding_payload(f"SEED{index:05d}", rng)}
+                for index in range(start, min(start + SEED_BATCH_SIZE, holdings))
+            ]
+            response = await client.post("/api/portfolio/batch", json={"operations": operations}, headers=headers)
+            response.raise_for_status()
+
+
+async def run_clients(
+    client: httpx.AsyncClient, emails: list[str], clients: int, requests_per_client: int, mix: dict[str, int], seed: int
+) -> tuple[dict[str, list[float]], dict[str, int], float]:
+    samples: dict[str, list[float]] = {name: [] for name in mix}
+    errors: dict[str, int] = {name: 0 for name in mix}
+    operations, weights = list(mix), list(mix.values())
+
+    async def client_loop(index: int) -> None:
+        rng = random.Random(seed * 1_000_003 + index)
+        credentials = {"email": emails[index % len(emails)], "password": PASSWORD}
+        token = (await client.post("/api/login", json=credentials)).json()["token"]
+        headers = {"Authorization": f"Bearer {token}"}
+        targets = (await client.get("/api/portfolio", params={"limit": TARGET_HOLDINGS}, headers=headers)).json()
+        added: list[int] = []
+        for number in range(requests_per_client):
+            operation = rng.choices(operations, weights)[0]
+            if operation == "delete" and not added:
+                operation = "add" if "add" in mix else "list"
+            if operation == "update" and not targets:
+                operation = "list"
+            started = time.perf_counter()
+            if operation == "login":
+                response = await client.post("/api/login", json=credentials)
+            elif operation == "list":
+                response = await client.get("/api/portfolio", headers=headers)
+            elif operation == "add":
+                name = f"LOAD{index}-{number}-{secrets.token_hex(3)}"
+                response = await client.post("/api/portfolio", json=holding_payload(name, rng), headers=headers)
+            elif operation == "update":
+                target = rng.choice(targets)
+                response = await client.put(
+                    f"/api/portfolio/{target['id']}", json=holding_payload(target["name"], rng), headers=headers
+                )
+            else:
+                response = await client.delete(f"/api/portfolio/{added.pop()}", headers=headers)
+            samples[operation].append(time.perf_counter() - started)
+            if response.status_code != 200:
+                errors[operation] += 1
+            elif operation == "add":
+                added.append(response.json()["id"])
+
+    started = time.perf_counter()
+    await asyncio.gather(*(client_loop(index) for index in range(clients)))
+    return samples, errors, time.perf_counter() - started
+
+
+async def run_size(
+    client: httpx.AsyncClient, holdings: int, args, mix: dict[str, int], in_process: bool
+) -> dict:
+    run_id = secrets.token_hex(4)
+    emails = [f"load-{run_id}-{holdings}-{index}@example.com" for index in range(args.users)]
+    started = time.perf_counter()
+    if in_process:
+        seed_database(emails, holdings)
+    else:
+        await seed_through_api(client, emails, holdings)
+    print(f"Seeded {args.users} users x {holdings} holdings in {time.perf_counter() - started:.1f}s")
+    await run_clients(client, emails, min(args.clients, 4), 5, mix, args.seed + 1)
+    samples, errors, elapsed = await run_clients(client, emails, args.clients, args.requests, mix, args.seed)
+    endpoints = {}
+    for name, values in samples.items():
+        if values:
+            endpoints[name] = {**summarize(values), "errors": errors[name], "requests_per_s": len(values) / elapsed}
+    total = sum(len(values) for values in samples.values())
+    return {"requests": total, "seconds": elapsed, "requests_per_s": total / elapsed, "endpoints": endpoints}
+
+
+async def run_all(args, mix: dict[str, int]) -> dict:
+    # One event loop for every size: the async engine's pool is bound to the loop that first used it.
+    in_process = args.url is None
+    if in_process:
+        startup()
+        transport = httpx.ASGITransport(app=app)
+        client = httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=None)
+    else:
+        limits = httpx.Limits(max_connections=args.clients, max_keepalive_connections=args.clients)
+        client = httpx.AsyncClient(base_url=args.url, timeout=None, limits=limits)
+    async with client:
+        return {str(holdings): await run_size(client, holdings, args, mix, in_process) for holdings in args.holdings}
+
+
+def git_revision() -> str | None:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True,
+            cwd=Path(__file__).resolve().parent,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run(args) -> None:
+    mix = parse_mix(args.mix)
+    results = asyncio.run(run_all(args, mix))
+    for holdings, result in results.items():
+        rows = {"all": {"requests_per_s": result["requests_per_s"]}, **result["endpoints"]}
+        print_table(f"[{holdings} holdings x {args.users} users, {args.clients} clients]", rows)
+    if args.output:
+        document = {
+            "meta": {
+                "recorded_at": datetime.now(timezone.utc).isoformat(),
+                "revision": git_revision(),
+                "target": args.url or "in-process",
+                "python": platform.python_version(),
+                "sqlite": sqlite3.sqlite_version,
+                "cpus": os.cpu_count(),
+                "args": {key: value for key, value in vars(args).items() if key != "output"},
+            },
+            "results": results,
+        }
+        Path(args.output).write_text(json.dumps(document, indent=2) + "\n", encoding="utf-8")
+        print(f"Wrote {args.output}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--holdings", type=int, nargs="+", default=[10, 1000, 10_000], help="portfolio sizes to test")
+    parser.add_argument("--users", type=int, default=4, help="users seeded per size")
+    parser.add_argument("--clients", type=int, default=16)
+    parser.add_argument("--requests", type=int, default=100, help="requests per client")
+    parser.add_argument("--mix", default=DEFAULT_MIX, help=f"operation weights (default {DEFAULT_MIX})")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--url", help="benchmark a running server instead of the in-process app")
+    parser.add_argument("--output", help="write results to this JSON file")
+    run(parser.parse_args())
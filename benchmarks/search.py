@@ -0,0 +1,94 @@
+"""Full-text search latency on large portfolios.
+
+Seeds ``--users`` users with ``--holdings`` holdings each (names, notes, strategies
+and tags drawn from a small vocabulary so common words match thousands of rows),
+then times ``GET /api/portfolio/search`` in-process for rare, common, prefix and
+multi-word queries.
+"""
+import argparse
+import asyncio
+import json
+import random
+import time
+
+from benchmarks.common import print_table, summarize, use_temp_database
+
+use_temp_database()
+
+import httpx  # noqa: E402
+
+from app.auth import now_utc  # noqa: E402
+from app.db import engine  # noqa: E402
+from app.main import app, startup  # noqa: E402
+
+PASSWORD = "benchmark"
+WORDS = (
+    "growth value income dividend energy solar battery semiconductor cloud bank insurer "
+    "pharma biotech retail logistics shipping mining gold silver oil gas utility telecom"
+).split()
+QUERIES = {
+    "rare name": "TICK01234",
+    "common word": "growth",
+    "prefix": "semi",
+    "two words": "solar battery",
+    "tag": "core",
+}
+
+
+def seed(users: int, holdings: int) -> None:
+    now = now_utc().isoformat(sep=" ")
+    rng = random.Random(5)
+    with engine.begin() as conn:
+        for user_id in range(2, users + 1):
+            conn.exec_driver_sql(
+                "INSERT INTO users (id, email, password_hash, created_at) VALUES (?, ?, 'x', ?)",
+                (user_id, f"search{user_id}@example.com", now),
+            )
+        for user_id in range(1, users + 1):
+            rows = []
+            for index in range(holdings):
+                name = f"TICK{index:05d} {rng.choice(WORDS).title()}"
+                note = " ".join(rng.sample(WORDS, 6))
+                tags = json.dumps(rng.sample(("core", "satellite", "hedge", "watch"), 2))
+                rows.append((user_id, name, name.lower(), note, rng.choice(WORDS), tags, now, now))
+            conn.exec_driver_sql(
+                "INSERT INTO holdings (user_id, name, name_key, category, quantity, total_cost, currency, "
+                "risk_level, note, strategy, tags, created_at, updated_at) "
+                "VALUES (?, ?, ?, '股票', 1, 10, 'USD', 'medium', ?, ?, ?, ?, ?)",
+                rows,
+            )
+
+
+async def run(args) -> dict[str, dict[str, float]]:
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        credentials = {"email": "search1@example.com", "password": PASSWORD}
+        (await client.post("/api/register", json=credentials)).raise_for_status()
+        token = (await client.post("/api/login", json=credentials)).json()["token"]
+        started = time.perf_counter()
+        seed(args.users, args.holdings)
+        print(f"Seeded {args.users} users x {args.holdings} holdings in {time.perf_counter() - started:.1f}s")
+        headers = {"Authorization": f"Bearer {token}"}
+        rows = {}
+        for label, query in QUERIES.items():
+            params = {"q": query, "limit": args.limit}
+            response = await client.get("/api/portfolio/search", params=params, headers=headers)
+            response.raise_for_status()
+            samples = []
+            for _ in range(args.iterations):
+                started = time.perf_counter()
+                await client.get("/api/portfolio/search", params=params, headers=headers)
+                samples.append(time.perf_counter() - started)
+            rows[f"{label} ({query})"] = {**summarize(samples), "results": len(response.json())}
+        return rows
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--users", type=int, default=4)
+    parser.add_argument("--holdings", type=int, default=50_000, help="holdings per user")
+    parser.add_argument("--limit", type=int, default=50)
+    parser.add_argument("--iterations", type=int, default=50)
+    args = parser.parse_args()
+    startup()
+    print_table(f"[search, {args.holdings} holdings per user, limit {args.limit}]", asyncio.run(run(args)))
@@ -0,0 +1,117 @@
+"""CPU cost of rendering ``GET /api/portfolio`` for one large portfolio.
+
+"orm + response_model" is the previous path: ORM instances, ``HoldingResponse`` built
+per row, then FastAPI's response validation and serialization. "column tuples" is the
+current one. Both bodies are compared byte for byte before timing.
+"""
+import argparse
+import asyncio
+import time
+
+from benchmarks.common import print_table, summarize, use_temp_database
+
+use_temp_database()
+
+from fastapi.responses import JSONResponse  # noqa: E402
+from fastapi.routing import serialize_response  # noqa: E402
+from sqlalchemy import select  # noqa: E402
+
+from app.auth import now_utc  # noqa: E402
+from app.db import SessionLocal  # noqa: E402
+from app.main import app, startup  # noqa: E402
+from app.models import Holding, User  # noqa: E402
+from app.portfolio import HOLDING_COLUMNS, holding_document, holding_values, upsert_holding_statement  # noqa: E402
+from app.portfolio_utils import decode_tags  # noqa: E402
+from app.schemas import HoldingResponse, PortfolioPayload  # noqa: E402
+
+RESPONSE_FIELD = next(route.response_field for route in app.routes if getattr(route, "path", None) == "/api/portfolio")
+
+
+def seed(holdings: int) -> int:
+    startup()
+    now = now_utc()
+    with SessionLocal() as db:
+        user = User(email="bench@example.com", password_hash="x", created_at=now)
+        db.add(user)
+        db.flush()
+        rows = [
+            holding_values(
+                user.id,
+                PortfolioPayload(
+                    name=f"T{index}",
+                    quantity=index % 97 + 0.5,
+                    cost=index * 1.1 + 3,
+                    currentPrice=None if index % 3 else index / 7,
+                    tags=["bench", f"g{index % 10}"] if index % 2 else [],
+                    note="日本 ✓" if index % 5 == 0 else None,
+                ),
+                now,
+            )
+            for index in range(holdings)
+        ]
+        db.execute(upsert_holding_statement(), rows)
+        db.commit()
+        return user.id
+
+
+def ordered(query, user_id: int):
+    return query.where(Holding.user_id == user_id).order_by(Holding.updated_at.desc(), Holding.id.desc())
+
+
+async def orm_response_model(user_id: int) -> bytes:
+    with SessionLocal() as db:
+        holdings = db.execute(ordered(select(Holding), user_id)).scalars().all()
+        content = [
+            HoldingResponse(
+                id=holding.id,
+                name=holding.name,
+                category=holding.category,
+                quantity=holding.quantity,
+                totalCost=holding.total_cost,
+                currency=holding.currency,
+                currentPrice=holding.current_price,
+                riskLevel=holding.risk_level,
+                strategy=holding.strategy,
+                sentiment=holding.sentiment,
+                tags=decode_tags(holding.tags),
+                note=holding.note,
+            )
+            for holding in holdings
+        ]
+    return JSONResponse(await serialize_response(field=RESPONSE_FIELD, response_content=content)).body
+
+
+async def column_tuples(user_id: int) -> bytes:
+    with SessionLocal() as db:
+        rows = db.execute(ordered(select(*HOLDING_COLUMNS, Holding.updated_at), user_id)).all()
+    return JSONResponse([holding_document(row) for row in rows]).body
+
+
+async def measure(user_id: int, iterations: int) -> tuple[dict[str, dict[str, float]], int]:
+    old_body, new_body = await orm_response_model(user_id), await column_tuples(user_id)
+    if old_body != new_body:
+        raise SystemExit("Response bodies differ between the two paths.")
+    rows = {}
+    for label, render in (("orm + response_model", orm_response_model), ("column tuples", column_tuples)):
+        samples = []
+        for _ in range(iterations):
+            started = time.perf_counter()
+            await render(user_id)
+            samples.append(time.perf_counter() - started)
+        rows[label] = summarize(samples)
+    rows["column tuples"]["speedup"] = rows["orm + response_model"]["mean_ms"] / rows["column tuples"]["mean_ms"]
+    return rows, len(new_body)
+
+
+def run(holdings: int, iterations: int) -> None:
+    user_id = seed(holdings)
+    rows, body_size = asyncio.run(measure(user_id, iterations))
+    print_table(f"[{holdings} holdings, identical {body_size}-byte bodies]", rows)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--holdings", type=int, default=10_000)
+    parser.add_argument("--iterations", type=int, default=20)
+    args = parser.parse_args()
+    run(args.holdings, args.iterations)
@@ -0,0 +1,49 @@
+"""Queries per request and latency of authenticated reads with and without the session cache."""
+import argparse
+
+from benchmarks.common import QueryCounter, print_table, summarize, time_calls, use_temp_database
+
+use_temp_database()
+
+from fastapi.testclient import TestClient  # noqa: E402
+
+from app.db import async_engine  # noqa: E402
+from app.main import app  # noqa: E402
+from app.session_cache import session_cache  # noqa: E402
+
+
+def run(iterations: int, holdings: int) -> None:
+    with TestClient(app) as client:
+        client.post("/api/register", json={"email": "bench@example.com", "password": "benchmark"})
+        token = client.post(
+            "/api/login", json={"email": "bench@example.com", "password": "benchmark"}
+        ).json()["token"]
+        headers = {"Authorization": f"Bearer {token}"}
+        for index in range(holdings):
+            client.post(
+                "/api/portfolio", json={"name": f"T{index}", "quantity": 1, "cost": 10}, headers=headers
+            )
+
+        configured_size = session_cache.maxsize
+        for label, size in (("no cache", 0), ("cache", configured_size or 2048)):
+            session_cache.maxsize = size
+            session_cache.clear()
+            rows = {}
+            for path in ("/api/profile", "/api/portfolio"):
+                client.get(path, headers=headers)
+                counter = QueryCounter(async_engine.sync_engine)
+                with counter.active():
+                    samples = time_calls(lambda: client.get(path, headers=headers), iterations)
+                stats = summarize(samples)
+                stats["queries_per_request"] = counter.count / iterations
+                rows[path] = stats
+            print_table(f"[{label}]", rows)
+        session_cache.maxsize = configured_size
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--iterations", type=int, default=2000)
+    parser.add_argument("--holdings", type=int, default=50)
+    args = parser.parse_args()
+    run(args.iterations, args.holdings)
@@ -1,5 +1,7 @@
 const { createApp } = Vue;
 
+const STREAM_RETRY_MS = 3000;
+
 createApp({
   data() {
     return {
@@ -440,6 +442,12 @@ createApp({
       activeSliceId: null,
       viewSheet: "dashboard",
       portfolio: [],
+      summary: null,
+      changeStream: null,
+      streamAttempt: 0,
+      streamRetryTimer: null,
+      lastChangeId: "",
+      summaryTimer: null,
       token: localStorage.getItem("pm_token") || "",
       userEmail: localStorage.getItem("pm_email") || "",
       editingId: null,
@@ -473,6 +481,12 @@ createApp({
       return this.locale.startsWith("zh") ? "CNY" : "USD";
     },
     stats() {
+      if (this.summary) {
+        return {
+          assetCount: this.summary.assetCount,
+          totalCost: this.currency(this.summary.totalCost || 0),
+        };
+      }
       const total = this.visiblePortfolio.reduce((sum, item) => sum + (item.totalCost || 0), 0);
       return {
         assetCount: this.visiblePortfolio.length,
@@ -663,6 +677,7 @@ createApp({
         this.loginForm.email = "";
         this.loginForm.password = "";
         await this.loadPortfolio();
+        this.openChangeStream();
         this.setNotice(this.t("loginSuccess"), "success");
       } catch (error) {
         this.setNotice(error.message || this.t("loginFailed"), "error");
@@ -692,7 +707,73 @@ createApp({
     },
     async loadPortfolio() {
       if (!this.token) return;
-      this.portfolio = await this.apiFetch("/api/portfolio");
+      const [portfolio] = await Promise.all([this.apiFetch("/api/portfolio"), this.loadSummary()]);
+      this.portfolio = portfolio;
+    },
+    async loadSummary() {
+      if (!this.token) return;
+      try {
+        this.summary = await this.apiFetch("/api/portfolio/summary");
+      } catch (error) {
+        this.summary = null;
+      }
+    },
+    async openChangeStream(resume = false) {
+      this.closeChangeStream();
+      if (!resume) this.lastChangeId = "";
+      if (!this.token || !window.EventSource) return;
+      const attempt = this.streamAttempt;
+      // EventSource cannot send headers, so the URL carries a single-use ticket, never the token.
+      let ticket;
+      try {
+        ({ ticket } = await this.apiFetch("/api/portfolio/stream/ticket", { method: "POST" }));
+      } catch (error) {
+        return;
+      }
+      if (!this.token || attempt !== this.streamAttempt) return;
+      const params = new URLSearchParams({ ticket });
+      if (this.lastChangeId) params.set("lastEventId", this.lastChangeId);
+      const stream = new EventSource(`/api/portfolio/stream?${params}`);
+      const track = (event) => {
+        if (event.lastEventId) this.lastChangeId = event.lastEventId;
+      };
+      stream.addEventListener("ready", track);
+      stream.addEventListener("holding", (event) => {
+        track(event);
+        this.applyHoldingChange(JSON.parse(event.data));
+      });
+      stream.addEventListener("reset", () => this.refreshPortfolio());
+      // The ticket is spent, so reconnect with a new one instead of letting EventSource retry it.
+      stream.addEventListener("error", () => {
+        if (this.changeStream !== stream) return;
+        this.closeChangeStream();
+        this.streamRetryTimer = setTimeout(() => this.openChangeStream(true), STREAM_RETRY_MS);
+      });
+      this.changeStream = stream;
+    },
+    closeChangeStream() {
+      this.streamAttempt += 1;
+      clearTimeout(this.streamRetryTimer);
+      if (this.changeStream) {
+        this.changeStream.close();
+        this.changeStream = null;
+      }
+      clearTimeout(this.summaryTimer);
+    },
+    applyHoldingChange(change) {
+      if (change.type === "deleted") {
+        this.portfolio = this.portfolio.filter((asset) => asset.id !== change.id);
+      } else {
+        const existingIndex = this.portfolio.findIndex((asset) => asset.id === change.holding.id);
+        if (existingIndex >= 0) {
+          this.portfolio.splice(existingIndex, 1, change.holding);
+        } else {
+          this.portfolio.unshift(change.holding);
+        }
+      }
+      // Bursts of changes (batch saves, price refreshes) share one summary reload.
+      clearTimeout(this.summaryTimer);
+      this.summaryTimer = setTimeout(() => this.loadSummary(), 500);
     },
     async saveAsset() {
       const errors = {
@@ -747,6 +828,7 @@ createApp({
         } else {
           this.portfolio.unshift(saved);
         }
+        this.loadSummary();
         this.resetAssetForm();
         this.closeAssetModal();
         this.setNotice(this.t(wasEditing ? "assetUpdated" : "assetSaved"), "success");
@@ -836,6 +918,7 @@ createApp({
       try {
         await this.apiFetch(`/api/portfolio/${id}`, { method: "DELETE" });
         this.portfolio = this.portfolio.filter((asset) => asset.id !== id);
+        this.loadSummary();
         this.setNotice(this.t("assetDeleted"), "success");
       } catch (error) {
         this.setNotice(error.message || this.t("deleteFailed"), "error");
@@ -853,11 +936,13 @@ createApp({
           this.setNotice(error.message || this.t("requestFailed"), "error");
         }
       }
+      this.closeChangeStream();
       this.token = "";
       this.userEmail = "";
       localStorage.removeItem("pm_token");
       localStorage.removeItem("pm_email");
       this.portfolio = [];
+      this.summary = null;
       this.resetAssetForm();
       if (!hasError) {
         this.setNotice(this.t("logoutSuccess"), "info");
@@ -874,6 +959,7 @@ createApp({
         this.userEmail = profile.email;
         localStorage.setItem("pm_email", profile.email);
         await this.loadPortfolio();
+        this.openChangeStream();
       } catch (error) {
         this.logout();
       }
@@ -0,0 +1,26 @@
+import os
+import secrets
+import tempfile
+
+os.environ["PORTFOLIO_DB_PATH"] = os.path.join(tempfile.mkdtemp(), "portfolio.db")
+os.environ.setdefault("PORTFOLIO_HASH_WORKERS", "0")
+
+import pytest  # noqa: E402
+from fastapi.testclient import TestClient  # noqa: E402
+
+from app.main import app  # noqa: E402
+
+
+@pytest.fixture(scope="session")
+def client():
+    with TestClient(app) as client:
+        yield client
+
+
+@pytest.fixture
+def headers(client):
+    """Authorization headers of a newly registered user."""
+    credentials = {"email": f"{secrets.token_hex(6)}@example.com", "password": "secret1"}
+    client.post("/api/register", json=credentials)
+    token = client.post("/api/login", json=credentials).json()["token"]
+    return {"Authorization": f"Bearer {token}"}
@@ -0,0 +1,9 @@
+def test_non_ascii_tags_match_case_insensitively(client, headers):
+    client.post("/api/portfolio", json={"name": "A", "quantity": 1, "cost": 10, "tags": ["Ärzte"]}, headers=headers)
+    client.post("/api/portfolio", json={"name": "B", "quantity": 1, "cost": 20, "tags": ["ärzte"]}, headers=headers)
+
+    holdings = client.get("/api/portfolio", params={"tag": "ÄRZTE"}, headers=headers).json()
+    assert sorted(holding["name"] for holding in holdings) == ["A", "B"]
+
+    facets = client.get("/api/portfolio/tags", headers=headers).json()
+    assert [facet["count"] for facet in facets] == [2]
@@ -0,0 +1,16 @@
+def test_transaction_serializes_the_same_on_post_and_get(client, headers):
+    holding = client.post("/api/portfolio", json={"name": "A", "quantity": 1, "cost": 10}, headers=headers).json()
+    path = f"/api/portfolio/{holding['id']}/transactions"
+
+    created = [
+        client.post(path, json={"kind": "buy", "quantity": 1, "amount": 10}, headers=headers).json()["transaction"],
+        client.post(
+            path,
+            json={"kind": "buy", "quantity": 1, "amount": 10, "executedAt": "2024-03-01T12:00:00+02:00"},
+            headers=headers,
+        ).json()["transaction"],
+    ]
+
+    listed = {entry["id"]: entry for entry in client.get(path, headers=headers).json()}
+    assert [listed[entry["id"]] for entry in created] == created
+    assert created[1]["executedAt"] == "2024-03-01T10:00:00+00:00"